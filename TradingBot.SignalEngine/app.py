@@ -1,7 +1,7 @@
 from flask import Flask, request, jsonify
 import openai
 import os
-from engine import generate_signal  # classic indicator-based
+from engine import generate_signals  # classic indicator-based
 
 app = Flask(__name__)
 
@@ -38,12 +38,13 @@ def generate_signal_ai():
 @app.route('/signal/classic', methods=['POST'])
 def generate_signal_classic():
     data = request.get_json()
-    symbol = data.get("symbols", [""])[0]  # Accepts array, uses first symbol
-    if not symbol:
+    symbols = [s for s in data.get("symbols", []) if s]
+    if not symbols:
         return jsonify({"error": "No symbol provided"}), 400
 
-    result = generate_signal(symbol)
-    return jsonify(result)
+    # One bulk download and vectorized indicators for the whole array
+    results = generate_signals(symbols)
+    return jsonify(results)
 
 @app.route('/health', methods=['GET'])
 def health_check():
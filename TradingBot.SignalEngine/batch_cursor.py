@@ -0,0 +1,83 @@
+"""
+Cursors for delta-only /signals/batch responses.
+
+A cursor names the set of signals a client last received: for every symbol,
+the fields that matter to a poller (action, target, stop_loss, confidence).
+Cursors are content hashes, so polling an unchanged watchlist yields the
+same cursor, which doubles as the response ETag.
+
+The state behind a cursor is kept in a small in-process LRU and, when the
+shared cache is enabled, in the shared cache so any worker can resolve it.
+An unknown or expired cursor simply gets a full response.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from shared_cache import SharedCache
+
+# Fields whose change makes a signal part of the delta
+DELTA_FIELDS = ("action", "target", "stop_loss", "confidence")
+
+
+def signal_fingerprint(signal) -> list:
+    return [getattr(signal, field) for field in DELTA_FIELDS]
+
+
+class CursorStore:
+    def __init__(self, cache: Optional[SharedCache] = None, max_entries: int = 1024, ttl: float = 3600.0):
+        self.cache = cache
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._states: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, cache: Optional[SharedCache] = None) -> "CursorStore":
+        return cls(
+            cache,
+            max_entries=int(os.getenv("BATCH_CURSOR_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("BATCH_CURSOR_TTL_SECONDS", "3600"))
+        )
+
+    def save(self, strategy: str, timeframe: str, period: str, fingerprints: Dict[str, list]) -> str:
+        """Record the signals (symbol -> fingerprint) a client now holds and return their cursor"""
+        state = {
+            "strategy": strategy,
+            "timeframe": timeframe,
+            "period": period,
+            "signals": fingerprints
+        }
+        encoded = json.dumps(state, sort_keys=True).encode()
+        cursor = hashlib.sha1(encoded).hexdigest()[:24]
+
+        with self._lock:
+            self._states[cursor] = state
+            self._states.move_to_end(cursor)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+        if self.cache is not None:
+            # Rewritten on every poll so active cursors do not expire
+            try:
+                self.cache.put_blob(("batch_cursor", cursor), encoded)
+            except OSError:
+                pass
+        return cursor
+
+    def load(self, cursor: str, strategy: str, timeframe: str, period: str) -> Optional[Dict[str, list]]:
+        """Fingerprints per symbol behind cursor, or None if unknown or for another request"""
+        with self._lock:
+            state = self._states.get(cursor)
+            if state is not None:
+                self._states.move_to_end(cursor)
+        if state is None and self.cache is not None:
+            data = self.cache.get_blob(("batch_cursor", cursor), ttl=self.ttl)
+            if data is not None:
+                state = json.loads(data)
+        if state is None or (state["strategy"], state["timeframe"], state["period"]) != (strategy, timeframe, period):
+            return None
+        return state["signals"]
@@ -1,60 +1,166 @@
+import os
+import threading
+import time
 import yfinance as yf
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
+from typing import Dict, List, Tuple
 
-def generate_signal(stock_symbol: str):
-    # Download last 90 days of 30 min data
-    df = yf.download(stock_symbol, period="90d", interval="30m")
-    if df.empty:
-        return {"prediction": "HOLD", "confidence": 0, "reason": "No data found."}
+PERIOD = "90d"
+INTERVAL = "30m"
+
+# Recently downloaded close series per symbol: symbol -> (fetched_at, closes)
+_close_cache: Dict[str, Tuple[float, pd.Series]] = {}
+_close_cache_lock = threading.Lock()  # Flask serves requests on several threads
+CACHE_TTL_SECONDS = float(os.getenv("CLASSIC_CACHE_TTL_SECONDS", "60"))
+
+
+def _download_closes(symbols: List[str]) -> Dict[str, pd.Series]:
+    """
+    Return the close series of every symbol, downloading
+    every stale or missing symbol in a single bulk yfinance call. Symbols
+    must already be upper case, as yfinance returns them.
+    """
+    now = time.monotonic()
+    with _close_cache_lock:
+        series = {s: _close_cache[s][1] for s in symbols
+                  if s in _close_cache and now - _close_cache[s][0] <= CACHE_TTL_SECONDS}
+    missing = [s for s in symbols if s not in series]
+
+    if missing:
+        data = yf.download(missing, period=PERIOD, interval=INTERVAL,
+                           group_by="column", progress=False)
+        closes = data["Close"] if not data.empty else pd.DataFrame()
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(missing[0])
+        for symbol in missing:
+            series[symbol] = closes[symbol].dropna() if symbol in closes else pd.Series(dtype=float)
+        with _close_cache_lock:
+            # Drop entries nobody asked for within the TTL so the cache stays bounded
+            for symbol in [s for s, (fetched_at, _) in _close_cache.items() if now - fetched_at > CACHE_TTL_SECONDS]:
+                del _close_cache[symbol]
+            for symbol in missing:
+                _close_cache[symbol] = (now, series[symbol])
+
+    return {s: series[s] for s in symbols}
+
+
+def _align_latest(series: Dict[str, pd.Series]) -> pd.DataFrame:
+    """
+    Stack each symbol's own bars as one column, aligned on its latest bar.
+    Symbols trading on different calendars (or cached over different
+    ranges) never see each other's timestamps, so no column has gaps and
+    every indicator is computed exactly as it would be for that symbol alone.
+    """
+    rows = max((len(s) for s in series.values()), default=0)
+    values = np.full((rows, len(series)), np.nan)
+    for column, closes in enumerate(series.values()):
+        if len(closes):
+            values[rows - len(closes):, column] = closes.to_numpy(dtype=float)
+    return pd.DataFrame(values, columns=list(series))
+
+
+def _ema(frame: pd.DataFrame, length: int) -> pd.DataFrame:
+    """
+    Column-wise EMA seeded with the SMA of the first `length` values, matching
+    pandas_ta.ema. Leading NaNs (columns with shorter history) are skipped.
+    """
+    sma = frame.rolling(window=length, min_periods=length).mean()
+    started = sma.notna().cummax()
+    seed = started & ~started.shift(fill_value=False)
+    seeded = frame.where(started).mask(seed, sma)
+    return seeded.ewm(span=length, adjust=False, ignore_na=True).mean()
+
+
+def _rsi(frame: pd.DataFrame, length: int = 14) -> pd.DataFrame:
+    """Column-wise RSI with Wilder (RMA) smoothing, matching pandas_ta.rsi"""
+    delta = frame.diff()
+    gain = delta.clip(lower=0)
+    loss = (-delta).clip(lower=0)
+    alpha = 1.0 / length
+    avg_gain = gain.ewm(alpha=alpha, min_periods=length, ignore_na=True).mean()
+    avg_loss = loss.ewm(alpha=alpha, min_periods=length, ignore_na=True).mean()
+    return 100 * avg_gain / (avg_gain + avg_loss)
 
-    # Calculate indicators
-    df["EMA20"] = ta.ema(df["Close"], length=20)
-    df["RSI14"] = ta.rsi(df["Close"], length=14)
-    macd = ta.macd(df["Close"])
-    df["MACD"] = macd["MACD_12_26_9"]
-    df["MACDh"] = macd["MACDh_12_26_9"]
 
-    # Use the last row for analysis
-    last = df.iloc[-1]
+def _macd(frame: pd.DataFrame, fast: int = 12, slow: int = 26, signal: int = 9) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Column-wise MACD line and histogram, matching pandas_ta.macd"""
+    macd = _ema(frame, fast) - _ema(frame, slow)
+    histogram = macd - _ema(macd, signal)
+    return macd, histogram
 
-    reasons = []
-    score = 0
+
+def generate_signals(symbols: List[str]) -> List[dict]:
+    """
+    Generate classic EMA/RSI/MACD signals for many symbols at once. Data is
+    fetched in one bulk download and indicators are computed across all
+    symbols in one pass; one result per input symbol is returned, in order.
+    """
+    # yfinance answers in upper case; results keep the caller's spelling
+    keys = [s.strip().upper() for s in symbols]
+    unique = list(dict.fromkeys(keys))
+    close = _align_latest(_download_closes(unique))
+    if close.dropna(how="all").empty:
+        return [{"symbol": s, "prediction": "HOLD", "confidence": 0, "reason": "No data found."} for s in symbols]
+
+    ema20 = _ema(close, 20)
+    rsi14 = _rsi(close, 14)
+    macd, macd_hist = _macd(close)
+
+    # Every column ends on that symbol's latest bar
+    last_close = close.iloc[-1]
+    last_ema = ema20.iloc[-1]
+    last_rsi = rsi14.iloc[-1]
+    last_macd = macd.iloc[-1]
+    last_hist = macd_hist.iloc[-1]
 
     # Sample logic: EMA crossover + RSI + MACD
-    if last["Close"] > last["EMA20"]:
-        reasons.append("Price above EMA20 (bullish).")
-        score += 1
-    else:
-        reasons.append("Price below EMA20 (bearish).")
-        score -= 1
-
-    if last["RSI14"] > 60:
-        reasons.append("RSI indicates strength.")
-        score += 1
-    elif last["RSI14"] < 40:
-        reasons.append("RSI indicates weakness.")
-        score -= 1
-
-    if last["MACD"] > 0 and last["MACDh"] > 0:
-        reasons.append("MACD bullish.")
-        score += 1
-    elif last["MACD"] < 0 and last["MACDh"] < 0:
-        reasons.append("MACD bearish.")
-        score -= 1
-
-    if score >= 2:
-        prediction = "BUY"
-        confidence = min(1.0, 0.7 + 0.1 * (score - 2))  # e.g., 0.7 - 0.9
-    elif score <= -2:
-        prediction = "SELL"
-        confidence = min(1.0, 0.7 + 0.1 * (abs(score) - 2))
-    else:
-        prediction = "HOLD"
-        confidence = 0.5
-
-    return {
-        "prediction": prediction,
-        "confidence": round(confidence, 2),
-        "reason": " ".join(reasons)
-    }
\ No newline at end of file
+    above_ema = last_close > last_ema
+    rsi_strong = last_rsi > 60
+    rsi_weak = last_rsi < 40
+    macd_bull = (last_macd > 0) & (last_hist > 0)
+    macd_bear = (last_macd < 0) & (last_hist < 0)
+    score = (above_ema.astype(int) * 2 - 1) + rsi_strong.astype(int) - rsi_weak.astype(int) \
+        + macd_bull.astype(int) - macd_bear.astype(int)
+
+    results = {}
+    for symbol in unique:
+        if close[symbol].isna().all():
+            results[symbol] = {"symbol": symbol, "prediction": "HOLD", "confidence": 0, "reason": "No data found."}
+            continue
+
+        reasons = ["Price above EMA20 (bullish)." if above_ema[symbol] else "Price below EMA20 (bearish)."]
+        if rsi_strong[symbol]:
+            reasons.append("RSI indicates strength.")
+        elif rsi_weak[symbol]:
+            reasons.append("RSI indicates weakness.")
+        if macd_bull[symbol]:
+            reasons.append("MACD bullish.")
+        elif macd_bear[symbol]:
+            reasons.append("MACD bearish.")
+
+        s = int(score[symbol])
+        if s >= 2:
+            prediction = "BUY"
+            confidence = min(1.0, 0.7 + 0.1 * (s - 2))  # e.g., 0.7 - 0.9
+        elif s <= -2:
+            prediction = "SELL"
+            confidence = min(1.0, 0.7 + 0.1 * (abs(s) - 2))
+        else:
+            prediction = "HOLD"
+            confidence = 0.5
+
+        results[symbol] = {
+            "symbol": symbol,
+            "prediction": prediction,
+            "confidence": round(confidence, 2),
+            "reason": " ".join(reasons)
+        }
+
+    return [dict(results[key], symbol=s) for s, key in zip(symbols, keys)]
+
+
+def generate_signal(stock_symbol: str):
+    result = generate_signals([stock_symbol])[0]
+    result.pop("symbol")
+    return result
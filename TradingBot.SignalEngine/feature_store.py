@@ -0,0 +1,487 @@
+"""
+Feature store of precomputed indicator columns for research and ML.
+
+Bars and indicator columns are materialized per (symbol, interval) as flat
+little-endian column files that are read through np.memmap, so a range
+read touches only the pages it needs and costs no parsing:
+
+    <FEATURE_STORE_DIR>/
+        manifest.json              indicator versions and formula fingerprints
+        <interval>/<SYMBOL>/
+            series.json            rows, timezone, materialized features
+            index.i64              bar timestamps (UTC nanoseconds)
+            Open.f64 ... Volume.f64
+            rsi(period=14).f64
+            macd(fast=12,signal=9,slow=26).signal.f64
+
+A feature is an indicator plus its parameters, e.g. "sma(window=20)". The
+indicator formulas are the functions in strategies/base.py that
+calculate_technical_indicators() calls, so stored columns match what the
+strategies compute. Every indicator has a fingerprint of its formula: an
+explicit version plus the AST of those shared functions. When a formula
+changes (say RSI moves from SMA to Wilder smoothing) the manifest records
+the new version and every stored column of that indicator is rebuilt from
+the stored bars before it is served again.
+
+update() merges bars by timestamp: new timestamps are inserted, existing
+ones are overwritten (a bar may still have been forming when it was
+stored) and nothing else is dropped, so backfilling older history keeps
+the newer rows. Each feature is then extended from just enough history to
+warm it up. A feature's first lookback rows are NaN, so a value never
+depends on where the stored history starts and incremental updates agree
+with a full rebuild (EMA-based columns to within FEATURE_STORE_EMA_PRECISION).
+
+Writers of the same series serialize on a lock file; readers take no lock.
+Columns are written to a temporary file that replaces the old one, so a
+reader's memory map keeps the previous contents, and series.json is
+replaced last, so a reader never sees rows that are not complete.
+
+    python feature_store.py update --symbols AAPL,MSFT --interval 1d --period 5y
+    python feature_store.py read --symbol AAPL --interval 1d --start 2024-01-01 --out aapl.csv
+"""
+
+import argparse
+import ast
+import fcntl
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import textwrap
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from strategies.base import bollinger_bands, ema_warmup_bars, macd, macd_lookback, rsi, rsi_lookback, sma
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT = "tradingbot-feature-store"
+STORE_VERSION = 1
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Weight an incrementally extended EMA may still give to bars before its warm-up
+DEFAULT_EMA_PRECISION = 1e-8
+DEFAULT_MAX_OPEN_MAPS = 256
+
+# Features materialized for a new series: what calculate_technical_indicators() adds
+DEFAULT_FEATURES = [
+    "sma(window=20)",
+    "sma(window=50)",
+    "sma(window=200)",
+    "rsi(period=14)",
+    "macd(fast=12,signal=9,slow=26)",
+    "bollinger(period=20,std_dev=2)"
+]
+
+# calculate_technical_indicators() column -> stored column
+STRATEGY_COLUMNS = {
+    "SMA_20": "sma(window=20)",
+    "SMA_50": "sma(window=50)",
+    "SMA_200": "sma(window=200)",
+    "RSI_14": "rsi(period=14)",
+    "MACD": "macd(fast=12,signal=9,slow=26).macd",
+    "MACD_Signal": "macd(fast=12,signal=9,slow=26).signal",
+    "MACD_Histogram": "macd(fast=12,signal=9,slow=26).histogram",
+    "BB_Upper": "bollinger(period=20,std_dev=2).upper",
+    "BB_Middle": "bollinger(period=20,std_dev=2).middle",
+    "BB_Lower": "bollinger(period=20,std_dev=2).lower"
+}
+
+
+class Indicator:
+    def __init__(self, name: str, outputs: Tuple[str, ...], compute: Callable, lookback: Callable,
+                 formulas: List[Callable], version: int = 1):
+        self.name = name
+        self.outputs = outputs     # column suffixes; a single output has none
+        self.compute = compute     # (close, **params) -> Series, or a tuple of them, one per output
+        self.lookback = lookback   # (precision, **params) -> bars before the first valid value
+        self.version = version     # bump to force a rebuild the fingerprint would not catch
+        source = "".join(ast.dump(ast.parse(textwrap.dedent(inspect.getsource(f)))) for f in formulas)
+        self.fingerprint = hashlib.sha1(f"{name}:{version}:{source}".encode()).hexdigest()
+
+
+INDICATORS: Dict[str, Indicator] = {
+    indicator.name: indicator for indicator in [
+        Indicator("sma", ("",), sma, lambda precision, window: window, [sma]),
+        Indicator("rsi", ("",), rsi, lambda precision, period: rsi_lookback(period), [rsi, rsi_lookback]),
+        Indicator("macd", ("macd", "signal", "histogram"), macd,
+                  lambda precision, fast, slow, signal: macd_lookback(precision, fast, slow, signal),
+                  [macd, macd_lookback, ema_warmup_bars]),
+        Indicator("bollinger", ("upper", "middle", "lower"), bollinger_bands,
+                  lambda precision, period, std_dev: period, [bollinger_bands, sma])
+    ]
+}
+
+_FEATURE_PATTERN = re.compile(r"^(\w+)\((.*)\)$")
+
+
+def parse_feature(feature: str) -> Tuple[str, Dict[str, float]]:
+    """'rsi(period=14)' -> ('rsi', {'period': 14})"""
+    match = _FEATURE_PATTERN.match(feature.replace(" ", ""))
+    if not match or match.group(1) not in INDICATORS:
+        raise ValueError(f"Unknown feature '{feature}'; indicators are {sorted(INDICATORS)}")
+    params = {}
+    for item in filter(None, match.group(2).split(",")):
+        name, _, value = item.partition("=")
+        number = float(value)
+        params[name] = int(number) if number.is_integer() else number
+    expected = set(list(inspect.signature(INDICATORS[match.group(1)].compute).parameters)[1:])
+    if set(params) != expected:
+        raise ValueError(f"Feature '{feature}' needs parameters {sorted(expected)}")
+    return match.group(1), params
+
+
+def feature_id(name: str, params: Dict[str, float]) -> str:
+    """Canonical feature name, parameters sorted"""
+    return f"{name}(" + ",".join(f"{k}={params[k]}" for k in sorted(params)) + ")"
+
+
+def _feature_of(column: str) -> str:
+    """Feature a stored column belongs to ('macd(...).signal' -> 'macd(...)')"""
+    return column[:column.rindex(")") + 1] if ")" in column else column
+
+
+def _timestamps_ns(index: pd.Index) -> Tuple[np.ndarray, Optional[str]]:
+    """UTC nanoseconds of a datetime index, and its timezone"""
+    index = pd.DatetimeIndex(index)
+    tz = str(index.tz) if index.tz is not None else None
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index.to_numpy(dtype="datetime64[ns]").view(np.int64), tz
+
+
+class FeatureStore:
+    def __init__(self, root: str, ema_precision: float = DEFAULT_EMA_PRECISION,
+                 max_open_maps: int = DEFAULT_MAX_OPEN_MAPS):
+        self.root = root
+        self.ema_precision = ema_precision
+        self.max_open_maps = max_open_maps
+        # Least recently read column first: path -> (inode, memmap)
+        self._maps: "OrderedDict[str, tuple]" = OrderedDict()
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._sync_manifest()
+
+    @classmethod
+    def from_env(cls) -> "FeatureStore":
+        return cls(
+            os.getenv("FEATURE_STORE_DIR", "feature_store"),
+            ema_precision=float(os.getenv("FEATURE_STORE_EMA_PRECISION", str(DEFAULT_EMA_PRECISION))),
+            max_open_maps=int(os.getenv("FEATURE_STORE_MAX_OPEN_MAPS", str(DEFAULT_MAX_OPEN_MAPS)))
+        )
+
+    # -- manifest ------------------------------------------------------------
+
+    def _sync_manifest(self) -> dict:
+        """Record the current indicator fingerprints, noting which formulas changed"""
+        path = os.path.join(self.root, "manifest.json")
+        with self._locked(self.root):
+            manifest = self._read_json(path) or {}
+            if manifest.get("format") != STORE_FORMAT or manifest.get("version") != STORE_VERSION:
+                manifest = {"format": STORE_FORMAT, "version": STORE_VERSION, "indicators": {}}
+            recorded = manifest["indicators"]
+            changed = False
+            for name, indicator in INDICATORS.items():
+                entry = recorded.get(name)
+                if entry is not None and entry["fingerprint"] == indicator.fingerprint:
+                    continue
+                if entry is not None:
+                    logger.warning(f"Indicator '{name}' formula changed; stored '{name}' features will be rebuilt")
+                recorded[name] = {
+                    "version": indicator.version,
+                    "fingerprint": indicator.fingerprint,
+                    "revision": entry["revision"] + 1 if entry else 1,
+                    "updated_at": time.time()
+                }
+                changed = True
+            if changed:
+                self._write_json(path, manifest)
+        return manifest
+
+    # -- files ---------------------------------------------------------------
+
+    def _series_dir(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, interval, symbol.upper())
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[dict]:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(temp_path, path)
+
+    @contextmanager
+    def _locked(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".lock"), "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_column(path: str, values: np.ndarray, start: int):
+        """
+        Replace the column with its first `start` values followed by values.
+        Written to a temporary file that is renamed over the old one, so
+        readers' memory maps are never changed or truncated under them.
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as out:
+            if start:
+                with open(path, "rb") as f:
+                    out.write(f.read(start * values.dtype.itemsize))
+            out.write(values.tobytes())
+        os.replace(temp_path, path)
+
+    def _column(self, path: str, dtype, rows: int) -> np.ndarray:
+        """
+        Read-only memory map of the first `rows` values, reusing the mapping
+        while it is current. Only the max_open_maps most recently read
+        columns stay mapped; arrays already handed out keep their mapping.
+        """
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        inode = os.stat(path).st_ino
+        cached = self._maps.get(path)
+        if cached is None or cached[0] != inode or len(cached[1]) < rows:
+            cached = (inode, np.memmap(path, dtype=dtype, mode="r"))
+            self._maps[path] = cached
+        self._maps.move_to_end(path)
+        while len(self._maps) > self.max_open_maps:
+            self._maps.popitem(last=False)
+        return cached[1][:rows]
+
+    # -- writing -------------------------------------------------------------
+
+    def update(self, symbol: str, interval: str, bars: pd.DataFrame,
+               features: Optional[List[str]] = None) -> dict:
+        """
+        Store bars (OHLCV with a datetime index) and bring features up to
+        date. Bars are merged by timestamp: stored bars with the same
+        timestamp are replaced, all others are kept. `features` adds to
+        what the series already stores (DEFAULT_FEATURES for a new series).
+        """
+        directory = self._series_dir(symbol, interval)
+        with self._locked(directory):
+            series = self._read_json(os.path.join(directory, "series.json")) or {
+                "symbol": symbol.upper(), "interval": interval, "rows": 0, "tz": None, "features": {}
+            }
+            rows = series["rows"]
+            stored_index = self._column(os.path.join(directory, "index.i64"), np.int64, rows)
+
+            index, tz = _timestamps_ns(bars.index)
+            merged = pd.DataFrame({column: bars[column].to_numpy(dtype=np.float64) for column in BAR_COLUMNS},
+                                  index=index)
+            start = int(np.searchsorted(stored_index, index.min())) if len(index) else rows
+            if start < rows:
+                # Stored bars from the first incoming timestamp on are merged, not dropped
+                kept = pd.DataFrame({column: self._column(os.path.join(directory, f"{column}.f64"),
+                                                          np.float64, rows)[start:] for column in BAR_COLUMNS},
+                                    index=stored_index[start:])
+                merged = pd.concat([kept, merged])
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+
+            if len(index):
+                self._write_column(os.path.join(directory, "index.i64"), merged.index.to_numpy(dtype=np.int64), start)
+                for column in BAR_COLUMNS:
+                    self._write_column(os.path.join(directory, f"{column}.f64"),
+                                       merged[column].to_numpy(dtype=np.float64), start)
+                series["rows"] = rows = start + len(merged)
+                series["tz"] = series["tz"] or tz
+
+            for feature in features or ([] if series["features"] else DEFAULT_FEATURES):
+                name, params = parse_feature(feature)
+                series["features"].setdefault(feature_id(name, params), {
+                    "indicator": name, "params": params, "fingerprint": None, "rows": 0
+                })
+            updated = self._update_features(directory, series, min(start, rows))
+            series["updated_at"] = time.time()
+            self._write_json(os.path.join(directory, "series.json"), series)
+
+        logger.info(f"Feature store {symbol.upper()} {interval}: {rows} bars, "
+                    f"{len(index)} merged from row {start}, {len(updated)} features updated")
+        return {"rows": rows, "bars_written": len(index), "from_row": start, "features_updated": updated}
+
+    def _update_features(self, directory: str, series: dict, changed_from: int) -> List[str]:
+        """Compute every feature from the first row it is missing or whose input changed"""
+        rows = series["rows"]
+        close = self._column(os.path.join(directory, "Close.f64"), np.float64, rows)
+        updated = []
+        for fid, meta in series["features"].items():
+            indicator = INDICATORS[meta["indicator"]]
+            valid_rows = meta["rows"] if meta["fingerprint"] == indicator.fingerprint else 0
+            first = min(valid_rows, changed_from)
+            if first >= rows:
+                continue
+
+            lookback = indicator.lookback(self.ema_precision, **meta["params"])
+            context = max(0, first - lookback + 1)
+            outputs = indicator.compute(pd.Series(close[context:rows]), **meta["params"])
+            if isinstance(outputs, pd.Series):
+                outputs = (outputs,)
+            for suffix, values in zip(indicator.outputs, outputs):
+                values = values.to_numpy(dtype=np.float64, copy=True)
+                # Values without a full lookback behind them depend on where history starts
+                values[:max(0, lookback - 1 - context)] = np.nan
+                filename = f"{fid}.{suffix}.f64" if suffix else f"{fid}.f64"
+                self._write_column(os.path.join(directory, filename), values[first - context:], first)
+
+            meta.update(rows=rows, fingerprint=indicator.fingerprint,
+                        version=indicator.version, lookback=lookback)
+            updated.append(fid)
+        return updated
+
+    # -- reading -------------------------------------------------------------
+
+    def series(self, symbol: str, interval: str) -> Optional[dict]:
+        return self._read_json(os.path.join(self._series_dir(symbol, interval), "series.json"))
+
+    def read_arrays(self, symbol: str, interval: str, columns: Optional[List[str]] = None,
+                    start=None, end=None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Zero-copy range read: (timestamps, {column: values}) as read-only
+        memory-mapped slices for start <= timestamp <= end. Columns are bar
+        columns or feature columns ("rsi(period=14)", "macd(...).signal");
+        None means all of them. Stale features are rebuilt first.
+        """
+        directory = self._series_dir(symbol, interval)
+        series = self.series(symbol, interval)
+        if series is None:
+            raise KeyError(f"No stored bars for {symbol.upper()} {interval}")
+
+        available = self._columns(series)
+        columns = list(available) if columns is None else columns
+        missing = [c for c in columns if c not in available]
+        if missing:
+            raise KeyError(f"Not stored for {symbol.upper()} {interval}: {missing}")
+        stale = {fid for fid, meta in series["features"].items()
+                 if meta["fingerprint"] != INDICATORS[meta["indicator"]].fingerprint or meta["rows"] != series["rows"]}
+        if stale & {_feature_of(c) for c in columns}:
+            series = self._rebuild(symbol, interval)
+
+        rows = series["rows"]
+        index = self._column(os.path.join(directory, "index.i64"), np.int64, rows)
+        lo = 0 if start is None else int(np.searchsorted(index, self._bound(start, series["tz"]), side="left"))
+        hi = rows if end is None else int(np.searchsorted(index, self._bound(end, series["tz"]), side="right"))
+        values = {c: self._column(os.path.join(directory, f"{c}.f64"), np.float64, rows)[lo:hi] for c in columns}
+        return index[lo:hi], values
+
+    def read(self, symbol: str, interval: str, columns: Optional[List[str]] = None,
+             start=None, end=None) -> pd.DataFrame:
+        """Range read as a DataFrame indexed by bar timestamp"""
+        index, values = self.read_arrays(symbol, interval, columns, start, end)
+        timestamps = pd.DatetimeIndex(index.view("datetime64[ns]"))
+        tz = self.series(symbol, interval)["tz"]
+        if tz:
+            timestamps = timestamps.tz_localize("UTC").tz_convert(tz)
+        return pd.DataFrame({c: np.array(v) for c, v in values.items()}, index=timestamps)
+
+    def indicator_frame(self, symbol: str, interval: str, start=None, end=None) -> pd.DataFrame:
+        """Bars plus the columns calculate_technical_indicators() adds, under the same names"""
+        df = self.read(symbol, interval, BAR_COLUMNS + list(STRATEGY_COLUMNS.values()), start, end)
+        return df.rename(columns={stored: name for name, stored in STRATEGY_COLUMNS.items()})
+
+    def load_bars(self, interval: str, symbols: Optional[List[str]] = None,
+                  start=None, end=None) -> Dict[str, pd.DataFrame]:
+        """Stored bars of many symbols, in the shape simulator.load_bars() returns"""
+        directory = os.path.join(self.root, interval)
+        names = symbols if symbols is not None else sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        return {symbol.upper(): self.read(symbol, interval, BAR_COLUMNS, start, end)
+                for symbol in names if self.series(symbol, interval) is not None}
+
+    def _rebuild(self, symbol: str, interval: str) -> dict:
+        directory = self._series_dir(symbol, interval)
+        with self._locked(directory):
+            series = self.series(symbol, interval)
+            updated = self._update_features(directory, series, series["rows"])
+            self._write_json(os.path.join(directory, "series.json"), series)
+        if updated:
+            logger.info(f"Rebuilt stale features for {symbol.upper()} {interval}: {updated}")
+        return series
+
+    @staticmethod
+    def _columns(series: dict) -> List[str]:
+        columns = list(BAR_COLUMNS)
+        for fid, meta in series["features"].items():
+            columns += [f"{fid}.{suffix}" if suffix else fid for suffix in INDICATORS[meta["indicator"]].outputs]
+        return columns
+
+    @staticmethod
+    def _bound(value, tz: Optional[str]) -> int:
+        timestamp = pd.Timestamp(value)
+        if timestamp.tz is None and tz:
+            timestamp = timestamp.tz_localize(tz)
+        if timestamp.tz is not None:
+            timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+        return timestamp.value
+
+    def status(self) -> dict:
+        series = []
+        for interval in sorted(os.listdir(self.root)):
+            if not os.path.isdir(os.path.join(self.root, interval)):
+                continue
+            for symbol in sorted(os.listdir(os.path.join(self.root, interval))):
+                info = self.series(symbol, interval)
+                if info is None:
+                    continue
+                stale = [fid for fid, meta in info["features"].items()
+                         if meta["fingerprint"] != INDICATORS[meta["indicator"]].fingerprint]
+                series.append({"symbol": symbol, "interval": interval, "rows": info["rows"],
+                               "features": len(info["features"]), "stale_features": stale})
+        return {"root": self.root, "indicators": self.manifest["indicators"], "series": series}
+
+
+if __name__ == "__main__":
+    from fetch_scheduler import FetchScheduler, Priority
+
+    parser = argparse.ArgumentParser(description="Materialize and read precomputed indicator columns")
+    commands = parser.add_subparsers(dest="command", required=True)
+    update = commands.add_parser("update", help="Fetch bars and bring their features up to date")
+    update.add_argument("--symbols", required=True, help="Comma-separated symbols")
+    update.add_argument("--interval", default="1d")
+    update.add_argument("--period", default="1y", help="History to fetch (yfinance period)")
+    update.add_argument("--features", nargs="*", default=None,
+                        help=f"Features to add, e.g. 'rsi(period=14)' (default for new series: {DEFAULT_FEATURES})")
+    read = commands.add_parser("read", help="Write a range of stored columns to CSV")
+    read.add_argument("--symbol", required=True)
+    read.add_argument("--interval", default="1d")
+    read.add_argument("--columns", default=None, help="Comma-separated columns (default: all)")
+    read.add_argument("--start", default=None)
+    read.add_argument("--end", default=None)
+    read.add_argument("--out", default=None, help="CSV path (default: print the last rows)")
+    commands.add_parser("status", help="Show indicator versions and stored series")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    store = FeatureStore.from_env()
+    if args.command == "update":
+        scheduler = FetchScheduler.from_env()
+        for name in [s.strip() for s in args.symbols.split(",") if s.strip()]:
+            df = scheduler.fetch(name, args.period, args.interval, Priority.BULK)
+            print(name.upper(), store.update(name, args.interval, df, args.features))
+    elif args.command == "read":
+        frame = store.read(args.symbol, args.interval, args.columns.split(",") if args.columns else None,
+                           args.start, args.end)
+        if args.out:
+            frame.to_csv(args.out)
+        else:
+            print(frame.tail())
+    else:
+        print(json.dumps(store.status(), indent=2))
@@ -0,0 +1,542 @@
+"""
+Central scheduler for upstream (yfinance) market data fetches.
+
+Every handler goes through a single FetchScheduler instead of calling
+yfinance directly. The scheduler:
+
+- paces calls with a token bucket so sustained throughput stays just under
+  the upstream limit instead of bursting and getting banned
+- serves queued fetches by priority (interactive /signal calls first, then
+  batch, then bulk/screener work)
+- coalesces identical queued fetches into a single upstream call
+- retries transient failures (network errors, timeouts, 5xx, throttling)
+  with jittered exponential backoff; permanent errors such as an unknown
+  symbol or an invalid period fail at once
+- opens a circuit breaker after repeated failures so we fail fast while
+  upstream is unhealthy
+- with SHARED_CACHE_DIR set, shares fetched data and the rate limit with
+  the other uvicorn workers (see shared_cache.py); while a revalidation
+  (refresh) of an expired entry is queued, the expired copy is served with
+  df.attrs["stale"] set instead of fetching it again
+"""
+
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+import yfinance as yf
+
+from shared_cache import SharedCache, SharedTokenBucket
+
+logger = logging.getLogger(__name__)
+
+FetchKey = Tuple[str, str, str]
+Fetcher = Callable[[str, str, str], pd.DataFrame]
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # single /signal and /market-data calls
+    BATCH = 1        # /signals/batch
+    BULK = 2         # screeners, warm-up and other background work
+
+
+class CircuitOpenError(Exception):
+    """Raised when the upstream circuit breaker is open and fetches are rejected."""
+
+
+class UpstreamThrottledError(Exception):
+    """Raised by fetchers when upstream answers with a rate-limit response."""
+
+
+def yfinance_fetcher(symbol: str, period: str, interval: str) -> pd.DataFrame:
+    """Default fetcher: download OHLCV history from yfinance"""
+    return yf.Ticker(symbol).history(period=period, interval=interval)
+
+
+def http_fetcher(base_url: str, timeout: float = 10.0) -> Fetcher:
+    """
+    Fetcher for an HTTP market data service speaking the stub server's
+    /history format (see loadtest/stub_server.py). Used when MARKET_DATA_URL
+    is set, e.g. for load tests without network access.
+    """
+    local = threading.local()
+
+    def fetch(symbol: str, period: str, interval: str) -> pd.DataFrame:
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        response = local.session.get(
+            f"{base_url.rstrip('/')}/history",
+            params={"symbol": symbol, "period": period, "interval": interval},
+            timeout=timeout
+        )
+        if response.status_code == 429:
+            raise UpstreamThrottledError(f"Upstream throttled request for {symbol}")
+        if response.status_code == 404:
+            return pd.DataFrame()
+        response.raise_for_status()
+        payload = response.json()
+        return pd.DataFrame(
+            {
+                "Open": payload["open"],
+                "High": payload["high"],
+                "Low": payload["low"],
+                "Close": payload["close"],
+                "Volume": payload["volume"]
+            },
+            index=pd.to_datetime(payload["timestamp"], unit="s")
+        )
+
+    return fetch
+
+
+def _is_throttle_error(error: Exception) -> bool:
+    """Best-effort detection of upstream rate-limit errors"""
+    if isinstance(error, UpstreamThrottledError):
+        return True
+    if type(error).__name__ == "YFRateLimitError":
+        return True
+    message = str(error).lower()
+    return "429" in message or "too many requests" in message or "rate limit" in message
+
+
+def _is_transient_error(error: Exception) -> bool:
+    """Errors worth retrying: throttling, connection problems, timeouts and 5xx responses"""
+    if _is_throttle_error(error):
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError, requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Take one token and return how many seconds the caller must wait
+        before using it. Tokens may go negative, which queues callers fairly
+        behind each other at exactly `rate` per second.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def drain(self):
+        """Drop any saved-up burst capacity (used after upstream throttles us)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Return True if a fetch may go upstream right now"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state == self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Upstream circuit closed")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Upstream circuit opened after {self._consecutive_failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def status(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "retry_in_seconds": round(retry_in, 1)
+            }
+
+
+class _FetchJob:
+    __slots__ = ("key", "priority", "future", "started", "refresh")
+
+    def __init__(self, key: FetchKey, priority: Priority, refresh: bool = False):
+        self.key = key
+        self.priority = priority
+        self.future: Future = Future()
+        self.started = False
+        self.refresh = refresh
+
+
+class FetchScheduler:
+    def __init__(self, fetcher: Optional[Fetcher] = None, rate: float = 2.0, burst: float = 2.0,
+                 workers: int = 4, max_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, failure_threshold: int = 5,
+                 reset_timeout: float = 60.0, timeout: float = 30.0,
+                 cache: Optional[SharedCache] = None):
+        self.fetcher = fetcher or yfinance_fetcher
+        self.cache = cache
+        if cache is not None:
+            # One upstream budget for all workers sharing the cache directory
+            self.bucket = SharedTokenBucket(os.path.join(cache.directory, "upstream.bucket"), rate, burst)
+        else:
+            self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self._heap = []
+        self._sequence = itertools.count()
+        # (key, refresh) -> queued or running job
+        self._pending: Dict[Tuple[FetchKey, bool], _FetchJob] = {}
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stats = {
+            "submitted": 0,
+            "cache_hits": 0,
+            "stale_hits": 0,
+            "deduplicated": 0,
+            "completed": 0,
+            "failed": 0,
+            "retries": 0,
+            "throttled": 0,
+            "rejected": 0
+        }
+
+    @classmethod
+    def from_env(cls, fetcher: Optional[Fetcher] = None) -> "FetchScheduler":
+        """
+        Build a scheduler from environment variables. UPSTREAM_RATE_LIMIT is
+        the upstream limit in requests/second; we run at UPSTREAM_RATE_HEADROOM
+        of it so sustained throughput sits just under the limit. Setting
+        MARKET_DATA_URL swaps yfinance for an HTTP market data service.
+        """
+        if fetcher is None and os.getenv("MARKET_DATA_URL"):
+            fetcher = http_fetcher(os.environ["MARKET_DATA_URL"])
+        limit = float(os.getenv("UPSTREAM_RATE_LIMIT", "2.0"))
+        headroom = float(os.getenv("UPSTREAM_RATE_HEADROOM", "0.9"))
+        return cls(
+            fetcher=fetcher,
+            rate=limit * headroom,
+            burst=float(os.getenv("UPSTREAM_BURST", "2")),
+            workers=int(os.getenv("FETCH_WORKERS", "4")),
+            max_retries=int(os.getenv("FETCH_MAX_RETRIES", "3")),
+            backoff_base=float(os.getenv("FETCH_BACKOFF_BASE_SECONDS", "0.5")),
+            backoff_max=float(os.getenv("FETCH_BACKOFF_MAX_SECONDS", "30")),
+            failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("CIRCUIT_RESET_SECONDS", "60")),
+            timeout=float(os.getenv("FETCH_TIMEOUT_SECONDS", "30")),
+            cache=SharedCache.from_env()
+        )
+
+    def _ensure_started(self):
+        # Workers are started lazily so each uvicorn worker process gets its own
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"fetch-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, symbol: str, period: str, interval: str,
+               priority: Priority = Priority.INTERACTIVE, refresh: bool = False) -> Future:
+        """
+        Queue a history fetch and return a Future for the resulting DataFrame.
+        Identical fetches that are still queued or running share one Future;
+        a higher-priority duplicate promotes the queued fetch. With refresh
+        the shared cache is bypassed and overwritten (revalidation); a
+        refresh only shares another refresh's Future, while plain fetches
+        also share a refresh's.
+        """
+        if self.breaker.is_open():
+            with self._condition:
+                self._stats["rejected"] += 1
+            raise CircuitOpenError("Upstream market data circuit is open; try again later")
+
+        key = (symbol.upper(), period, interval)
+        if self.cache is not None and not refresh:
+            cached = self.cache.get_frame(key)
+            stale = cached is None and self._revalidating(key)
+            if stale:
+                cached = self.cache.get_frame(key, ttl=float("inf"))
+                if cached is not None:
+                    cached = cached.copy(deep=False)
+                    cached.attrs["stale"] = True
+            if cached is not None:
+                with self._condition:
+                    self._stats["submitted"] += 1
+                    self._stats["stale_hits" if stale else "cache_hits"] += 1
+                future = Future()
+                future.set_result(cached)
+                return future
+
+        with self._condition:
+            self._ensure_started()
+            self._stats["submitted"] += 1
+            # A refresh must not reuse a plain fetch that may be served from the cache
+            job = self._pending.get((key, True))
+            if job is None and not refresh:
+                job = self._pending.get((key, False))
+            if job is not None:
+                self._stats["deduplicated"] += 1
+                if not job.started and priority < job.priority:
+                    job.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._sequence), job))
+                return job.future
+
+            job = _FetchJob(key, priority, refresh)
+            self._pending[(key, refresh)] = job
+            heapq.heappush(self._heap, (priority, next(self._sequence), job))
+            self._condition.notify()
+            return job.future
+
+    def _revalidating(self, key: FetchKey) -> bool:
+        with self._condition:
+            return (key, True) in self._pending
+
+    def fetch(self, symbol: str, period: str, interval: str,
+              priority: Priority = Priority.INTERACTIVE) -> pd.DataFrame:
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(symbol, period, interval, priority).result(timeout=self.timeout)
+
+    def fetch_closes(self, symbols: List[str], period: str, interval: str,
+                     priority: Priority = Priority.BULK, start: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """
+        Wide frame of close prices, one column per symbol. With the default
+        yfinance fetcher this is one bulk download paced by a single token
+        (and shared between workers through the shared cache); other
+        fetchers go through submit() per symbol. With start only bars from
+        start onward are returned, and yfinance downloads only those.
+        """
+        symbols = [symbol.upper() for symbol in symbols]
+        if self.fetcher is not yfinance_fetcher:
+            futures = {symbol: self.submit(symbol, period, interval, priority) for symbol in symbols}
+            series = {}
+            for symbol, future in futures.items():
+                df = future.result(timeout=self.timeout)
+                series[symbol] = df["Close"] if not df.empty else pd.Series(dtype=float)
+            closes = pd.concat(series, axis=1).reindex(columns=symbols)
+            return closes[closes.index >= start] if start is not None else closes
+
+        key = ("closes", hashlib.sha1(",".join(symbols).encode()).hexdigest(), period, interval)
+        if start is not None:
+            key += (int(start.value),)
+        if self.cache is None:
+            return self._download_closes(symbols, period, interval, start)
+        with self.cache.fetch_lock(key):
+            cached = self.cache.get_frame(key)
+            if cached is not None:
+                return cached
+            closes = self._download_closes(symbols, period, interval, start)
+            try:
+                self.cache.put_frame(key, closes)
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Could not store bulk closes in shared cache: {e}")
+            return closes
+
+    def _download_closes(self, symbols: List[str], period: str, interval: str,
+                         start: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        if not self.breaker.allow():
+            with self._condition:
+                self._stats["rejected"] += 1
+            raise CircuitOpenError("Upstream market data circuit is open; try again later")
+        wait = self.bucket.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        span = {"period": period} if start is None else {"start": start}
+        try:
+            data = yf.download(symbols, interval=interval, group_by="column", progress=False, **span)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        closes = data["Close"] if not data.empty else pd.DataFrame()
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(symbols[0])
+        return closes.reindex(columns=symbols)
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job.started:
+                    # Stale entry left behind by a priority promotion
+                    continue
+                job.started = True
+                self._in_flight += 1
+            try:
+                self._run(job)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter" exponential backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _finish(self, job: _FetchJob, result=None, error: Optional[Exception] = None):
+        with self._condition:
+            self._pending.pop((job.key, job.refresh), None)
+            self._stats["failed" if error else "completed"] += 1
+        if error:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _run(self, job: _FetchJob):
+        if self.cache is None:
+            self._fetch_upstream(job)
+            return
+
+        # Only one worker process fetches a key; the others wait here and
+        # then find the fresh entry it wrote
+        with self.cache.fetch_lock(job.key):
+            cached = None if job.refresh else self.cache.get_frame(job.key)
+            if cached is not None:
+                with self._condition:
+                    self._stats["cache_hits"] += 1
+                self._finish(job, result=cached)
+                return
+            self._fetch_upstream(job)
+
+    def _fetch_upstream(self, job: _FetchJob):
+        if not self.breaker.allow():
+            with self._condition:
+                self._stats["rejected"] += 1
+            self._finish(job, error=CircuitOpenError("Upstream market data circuit is open; try again later"))
+            return
+
+        symbol, period, interval = job.key
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            wait = self.bucket.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                df = self.fetcher(symbol, period, interval)
+            except Exception as e:
+                last_error = e
+                if not _is_transient_error(e):
+                    # Upstream answered; retrying a bad symbol or period cannot help
+                    self.breaker.record_success()
+                    logger.error(f"Fetch {symbol} {period}/{interval} failed: {e}")
+                    self._finish(job, error=e)
+                    return
+                if _is_throttle_error(e):
+                    self.bucket.drain()
+                    with self._condition:
+                        self._stats["throttled"] += 1
+                if attempt == self.max_retries:
+                    break
+                delay = self._backoff(attempt)
+                with self._condition:
+                    self._stats["retries"] += 1
+                logger.warning(f"Fetch {symbol} {period}/{interval} failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            if self.cache is not None:
+                try:
+                    self.cache.put_frame(job.key, df)
+                except (OSError, ValueError, TypeError) as e:
+                    logger.warning(f"Could not store {symbol} {period}/{interval} in shared cache: {e}")
+            self._finish(job, result=df)
+            return
+
+        self.breaker.record_failure()
+        logger.error(f"Fetch {symbol} {period}/{interval} failed after {self.max_retries + 1} attempts: {last_error}")
+        self._finish(job, error=last_error)
+
+    def status(self) -> dict:
+        """Scheduler state for the /health endpoint"""
+        with self._condition:
+            queued = {p.name.lower(): 0 for p in Priority}
+            for job in self._pending.values():
+                if not job.started:
+                    queued[job.priority.name.lower()] += 1
+            stats = dict(self._stats)
+            in_flight = self._in_flight
+        return {
+            "rate_per_second": round(self.bucket.rate, 3),
+            "burst": self.bucket.capacity,
+            "tokens_available": round(self.bucket.available(), 2),
+            "queued": queued,
+            "in_flight": in_flight,
+            "workers": self.workers,
+            "circuit": self.breaker.status(),
+            "shared_cache": self.cache.status() if self.cache is not None else None,
+            "stats": stats
+        }
@@ -0,0 +1,299 @@
+"""
+Load-test harness for the signal engine.
+
+Starts the stub market-data server, launches the FastAPI app under uvicorn
+pointed at it (MARKET_DATA_URL), and drives /signal and /signals/batch with
+a configurable symbol mix. Runs on one box with no network access.
+
+Two load models are supported:
+
+- open loop (--rates 5,10,20): Poisson arrivals at each rate in turn;
+  latency is measured from the scheduled arrival time so queueing inside
+  the engine is not hidden (no coordinated omission)
+- closed loop (--concurrency N without --rates): N clients issuing requests
+  back to back
+
+Each stage reports throughput, latency percentiles and error rates, which is
+enough to see the request rate at which p99 starts to degrade.
+
+The launched engine gets a high UPSTREAM_RATE_LIMIT and a private shared
+cache by default, so the numbers describe the app rather than the upstream
+rate limiter. Pass --upstream-rate-limit with the real limit to measure the
+limiter instead; the run says so when upstream fetches were limiter-bound.
+
+    cd TradingBot.SignalEngine
+    python -m loadtest.run --rates 5,10,20,40 --duration 30 --symbols 200
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from loadtest.stub_server import add_stub_arguments, stub_from_args
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (endpoint, status_code or error name, latency in seconds)
+Result = Tuple[str, str, float]
+
+
+class RequestMix:
+    """Chooses endpoints and symbols; symbol popularity follows a Zipf law"""
+
+    def __init__(self, symbols: int, zipf: float, batch_fraction: float, batch_size: int,
+                 strategy: str, timeframe: str, period: str, seed: int = 42):
+        self.universe = [f"SYM{i:04d}" for i in range(symbols)]
+        weights = [1.0 / (rank + 1) ** zipf for rank in range(symbols)]
+        self._cum_weights = list(np.cumsum(weights))
+        self.batch_fraction = batch_fraction
+        self.batch_size = min(batch_size, symbols)
+        self.body = {"strategy": strategy, "timeframe": timeframe, "period": period}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _symbol(self) -> str:
+        return self._random.choices(self.universe, cum_weights=self._cum_weights)[0]
+
+    def next_request(self) -> Tuple[str, dict]:
+        with self._lock:
+            if self._random.random() < self.batch_fraction:
+                symbols = list(dict.fromkeys(self._symbol() for _ in range(self.batch_size)))
+                return "/signals/batch", dict(self.body, symbols=symbols)
+            return "/signal", dict(self.body, symbol=self._symbol())
+
+
+class LoadDriver:
+    def __init__(self, base_url: str, mix: RequestMix, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.mix = mix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _issue(self, scheduled_at: float) -> Result:
+        endpoint, body = self.mix.next_request()
+        try:
+            response = self._session().post(self.base_url + endpoint, json=body, timeout=self.timeout)
+            outcome = str(response.status_code)
+        except requests.RequestException as e:
+            outcome = type(e).__name__
+        return endpoint, outcome, time.perf_counter() - scheduled_at
+
+    def run_open_loop(self, rate: float, duration: float, max_in_flight: int) -> Tuple[List[Result], float]:
+        """Poisson arrivals at `rate` requests/second for `duration` seconds"""
+        results: List[Result] = []
+        futures = []
+        arrivals = random.Random(7)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            next_at = start
+            while next_at - start < duration:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self._issue, next_at))
+                next_at += arrivals.expovariate(rate)
+            for future in futures:
+                results.append(future.result())
+        return results, time.perf_counter() - start
+
+    def run_closed_loop(self, concurrency: int, duration: float) -> Tuple[List[Result], float]:
+        """`concurrency` clients issuing requests back to back"""
+        results: List[Result] = []
+        lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = start + duration
+
+        def client():
+            while time.perf_counter() < deadline:
+                result = self._issue(time.perf_counter())
+                with lock:
+                    results.append(result)
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - start
+
+
+def summarize(label: str, results: List[Result], elapsed: float) -> dict:
+    """Throughput, latency percentiles and error rate overall and per endpoint"""
+    def stats(rows: List[Result]) -> dict:
+        latencies = np.array([r[2] for r in rows]) * 1000 if rows else np.array([0.0])
+        outcomes = Counter(r[1] for r in rows)
+        errors = sum(count for outcome, count in outcomes.items() if outcome != "200")
+        return {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+            "p90_ms": round(float(np.percentile(latencies, 90)), 1),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 1),
+            "max_ms": round(float(latencies.max()), 1),
+            "outcomes": dict(outcomes)
+        }
+
+    by_endpoint: Dict[str, List[Result]] = defaultdict(list)
+    for result in results:
+        by_endpoint[result[0]].append(result)
+
+    return {
+        "stage": label,
+        "duration_s": round(elapsed, 2),
+        "overall": stats(results),
+        "endpoints": {endpoint: stats(rows) for endpoint, rows in sorted(by_endpoint.items())}
+    }
+
+
+def print_report(report: dict):
+    print(f"\n== {report['stage']} ({report['duration_s']}s) ==")
+    header = f"{'endpoint':<16}{'reqs':>7}{'rps':>9}{'err%':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    rows = [("all", report["overall"])] + list(report["endpoints"].items())
+    for name, s in rows:
+        print(f"{name:<16}{s['requests']:>7}{s['throughput_rps']:>9}{s['error_rate'] * 100:>7.2f}%"
+              f"{s['p50_ms']:>9}{s['p90_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+    print(f"outcomes: {report['overall']['outcomes']}")
+
+
+def start_engine(port: int, market_data_url: str, workers: int, extra_env: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ, MARKET_DATA_URL=market_data_url, **extra_env)
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=ENGINE_DIR, env=env)
+
+
+def wait_for_health(base_url: str, engine: Optional[subprocess.Popen] = None, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if engine is not None and engine.poll() is not None:
+            raise RuntimeError(f"Signal engine exited with code {engine.returncode} before becoming healthy")
+        try:
+            if requests.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Signal engine at {base_url} did not become healthy within {timeout}s")
+
+
+def limiter_bound(upstream: Optional[dict], upstream_requests: int, elapsed: float) -> bool:
+    """True when upstream fetches ran at (nearly) the engine's rate limit, so latency reflects the limiter"""
+    if not upstream or not elapsed:
+        return False
+    queued = sum(upstream.get("queued", {}).values())
+    return queued > 0 or upstream_requests / elapsed >= 0.8 * upstream["rate_per_second"]
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load test the signal engine against a local stub market data server")
+    parser.add_argument("--engine-url", default=None,
+                        help="Drive an already-running engine instead of starting one (it must use MARKET_DATA_URL)")
+    parser.add_argument("--engine-port", type=int, default=8765)
+    parser.add_argument("--engine-workers", type=int, default=1, help="uvicorn --workers for the launched engine")
+    parser.add_argument("--upstream-rate-limit", type=float, default=1000.0,
+                        help="UPSTREAM_RATE_LIMIT for the launched engine; the default is high enough that the "
+                             "app, not the rate limiter, is measured")
+    parser.add_argument("--shared-cache-dir", default=None,
+                        help="SHARED_CACHE_DIR for the launched engine (default: a temporary directory)")
+    parser.add_argument("--no-shared-cache", action="store_true", help="Launch the engine without a shared cache")
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--rates", default=None, help="Comma-separated open-loop arrival rates (requests/second)")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Closed-loop clients, or max in-flight requests in open-loop mode")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per stage")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Closed-loop warm-up seconds (not reported)")
+    parser.add_argument("--symbols", type=int, default=100, help="Size of the symbol universe")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Symbol popularity skew (0 = uniform)")
+    parser.add_argument("--batch-fraction", type=float, default=0.1, help="Fraction of requests sent to /signals/batch")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--strategy", default="moving_average")
+    parser.add_argument("--timeframe", default="1d")
+    parser.add_argument("--period", default="1y")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client request timeout")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the reports to this file")
+    add_stub_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    stub = stub_from_args(args, port=args.stub_port).start()
+    print(f"Stub market data server on {stub.url}")
+
+    engine = None
+    cache_dir = None
+    base_url = args.engine_url
+    if base_url is None:
+        extra_env = {"UPSTREAM_RATE_LIMIT": str(args.upstream_rate_limit)}
+        if not args.no_shared_cache:
+            cache_dir = args.shared_cache_dir or tempfile.mkdtemp(prefix="loadtest-cache-")
+            extra_env["SHARED_CACHE_DIR"] = cache_dir
+        engine = start_engine(args.engine_port, stub.url, args.engine_workers, extra_env)
+        base_url = f"http://127.0.0.1:{args.engine_port}"
+        print(f"Engine: UPSTREAM_RATE_LIMIT={args.upstream_rate_limit:g}, SHARED_CACHE_DIR={cache_dir or 'unset'}")
+
+    reports = []
+    bound = False
+    try:
+        wait_for_health(base_url, engine)
+        mix = RequestMix(args.symbols, args.zipf, args.batch_fraction, args.batch_size,
+                         args.strategy, args.timeframe, args.period)
+        driver = LoadDriver(base_url, mix, args.timeout)
+        started = time.perf_counter()
+
+        if args.warmup > 0:
+            driver.run_closed_loop(min(args.concurrency, 4), args.warmup)
+
+        if args.rates:
+            for rate in (float(r) for r in args.rates.split(",")):
+                results, elapsed = driver.run_open_loop(rate, args.duration, args.concurrency)
+                reports.append(summarize(f"open loop @ {rate:g} req/s", results, elapsed))
+                print_report(reports[-1])
+        else:
+            results, elapsed = driver.run_closed_loop(args.concurrency, args.duration)
+            reports.append(summarize(f"closed loop x{args.concurrency}", results, elapsed))
+            print_report(reports[-1])
+
+        upstream = requests.get(f"{base_url}/health", timeout=5).json().get("upstream")
+        print(f"\nstub: {stub.stats}")
+        print(f"engine upstream: {json.dumps(upstream)}")
+        bound = limiter_bound(upstream, stub.stats["requests"], time.perf_counter() - started)
+        if bound:
+            print(f"\nNOTE: upstream fetches ran at the engine's rate limit ({upstream['rate_per_second']}/s); "
+                  f"these latencies measure the rate limiter, not the app.")
+    finally:
+        if engine is not None:
+            engine.terminate()
+            engine.wait(timeout=10)
+        stub.stop()
+        if cache_dir and not args.shared_cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"args": vars(args), "reports": reports, "stub": stub.stats, "limiter_bound": bound}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
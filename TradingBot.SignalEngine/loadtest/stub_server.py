@@ -0,0 +1,252 @@
+"""
+Local stub market-data server for load tests.
+
+Serves deterministic synthetic OHLCV history in place of yfinance so the
+signal engine can be load tested on one box with no network. Latency,
+error injection and upstream-style throttling (HTTP 429) are configurable.
+
+Point the engine at it with MARKET_DATA_URL=http://127.0.0.1:<port>.
+
+    python -m loadtest.stub_server --port 8800 --stub-latency-ms 150 --stub-error-rate 0.01
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# Trading minutes in an NSE session (09:15 - 15:30)
+SESSION_MINUTES = 375
+
+PERIOD_DAYS = {"d": 1, "wk": 7, "mo": 21, "y": 252}
+INTERVAL_MINUTES = {"m": 1, "h": 60}
+MAX_BARS = 50000
+# Encoded responses kept for repeated requests (least recently used dropped)
+CACHE_SIZE = 1024
+
+
+def _period_trading_days(period: str) -> int:
+    if period in ("max", "ytd"):
+        return 252
+    for suffix in sorted(PERIOD_DAYS, key=len, reverse=True):
+        if period.endswith(suffix):
+            return int(period[:-len(suffix)]) * PERIOD_DAYS[suffix]
+    raise ValueError(f"Unsupported period '{period}'")
+
+
+def bar_count(period: str, interval: str) -> int:
+    """Approximate number of bars yfinance returns for a period/interval"""
+    days = _period_trading_days(period)
+    if interval.endswith("mo"):
+        return max(1, days // (21 * int(interval[:-2])))
+    if interval.endswith("wk"):
+        return max(1, days // (5 * int(interval[:-2])))
+    if interval.endswith("d"):
+        return max(1, days // int(interval[:-1]))
+    for suffix, minutes in INTERVAL_MINUTES.items():
+        if interval.endswith(suffix):
+            per_day = SESSION_MINUTES // (int(interval[:-1]) * minutes)
+            return min(MAX_BARS, days * max(1, per_day))
+    raise ValueError(f"Unsupported interval '{interval}'")
+
+
+def _interval_seconds(interval: str) -> int:
+    for suffix, seconds in (("mo", 30 * 86400), ("wk", 7 * 86400), ("d", 86400), ("h", 3600), ("m", 60)):
+        if interval.endswith(suffix):
+            return int(interval[:-len(suffix)]) * seconds
+    raise ValueError(f"Unsupported interval '{interval}'")
+
+
+def synthetic_ohlcv(symbol: str, period: str, interval: str) -> dict:
+    """Deterministic random-walk OHLCV for a symbol (same symbol -> same bars)"""
+    n = bar_count(period, interval)
+    rng = np.random.default_rng(zlib.crc32(f"{symbol}|{interval}".encode()))
+    start_price = 50 + (zlib.crc32(symbol.encode()) % 2000)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.005, n)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.integers(100_000, 5_000_000, n)
+
+    step = _interval_seconds(interval)
+    end = int(time.time()) // 60 * 60
+    timestamps = end - step * np.arange(n - 1, -1, -1)
+
+    return {
+        "symbol": symbol,
+        "timestamp": timestamps.tolist(),
+        "open": np.round(open_, 2).tolist(),
+        "high": np.round(high, 2).tolist(),
+        "low": np.round(low, 2).tolist(),
+        "close": np.round(close, 2).tolist(),
+        "volume": volume.tolist()
+    }
+
+
+class _Throttle:
+    """Token bucket; requests beyond the limit are answered with 429"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class StubMarketDataServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 rate_limit: Optional[float] = None, burst: float = 5.0, cache_size: int = CACHE_SIZE):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle = _Throttle(rate_limit, burst) if rate_limit else None
+        self.stats = {"requests": 0, "served": 0, "errors": 0, "throttled": 0}
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                status, body = stub.handle(self.path)
+                self._send(status, body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def handle(self, path: str) -> Tuple[int, bytes]:
+        url = urlparse(path)
+        if url.path == "/stats":
+            with self._lock:
+                return 200, json.dumps(self.stats).encode()
+        if url.path != "/history":
+            return 404, b'{"error": "not found"}'
+
+        self._count("requests")
+        if self.throttle and not self.throttle.allow():
+            self._count("throttled")
+            return 429, b'{"error": "Too Many Requests"}'
+
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self._count("errors")
+            return 500, b'{"error": "injected failure"}'
+
+        params = parse_qs(url.query)
+        symbol = params.get("symbol", [""])[0]
+        period = params.get("period", ["3mo"])[0]
+        interval = params.get("interval", ["1d"])[0]
+        if not symbol:
+            return 400, b'{"error": "symbol is required"}'
+
+        key = (symbol.upper(), period, interval)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+        if body is None:
+            try:
+                body = json.dumps(synthetic_ohlcv(*key)).encode()
+            except ValueError as e:
+                return 400, json.dumps({"error": str(e)}).encode()
+            with self._lock:
+                self._cache[key] = body
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        self._count("served")
+        return 200, body
+
+    def start(self) -> "StubMarketDataServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-market-data", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--stub-latency-ms", type=float, default=100.0, help="Mean upstream latency")
+    parser.add_argument("--stub-jitter-ms", type=float, default=50.0, help="Uniform latency jitter (+/-)")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--stub-rate-limit", type=float, default=None,
+                        help="Requests/second before the stub answers 429 (default: unlimited)")
+    parser.add_argument("--stub-burst", type=float, default=5.0, help="Burst allowance for the stub rate limit")
+
+
+def stub_from_args(args, host: str = "127.0.0.1", port: int = 0) -> StubMarketDataServer:
+    return StubMarketDataServer(
+        host=host,
+        port=port,
+        latency_ms=args.stub_latency_ms,
+        jitter_ms=args.stub_jitter_ms,
+        error_rate=args.stub_error_rate,
+        rate_limit=args.stub_rate_limit,
+        burst=args.stub_burst
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic OHLCV server standing in for yfinance")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = stub_from_args(args, args.host, args.port)
+    print(f"Stub market data server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
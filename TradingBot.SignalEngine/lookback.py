@@ -0,0 +1,95 @@
+"""
+Translate a strategy's lookback (in bars) into the yfinance period to fetch.
+
+Strategies only need their indicator warm-up plus the last couple of rows,
+so the engine fetches the smallest standard period that covers that window
+(never more than the client asked for) and trims the frame to the window
+before computing indicators. Per-request cost then depends on the strategy,
+not on the requested `period`.
+"""
+
+import math
+import os
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+# Extra bars kept beyond the strategy's lookback
+LOOKBACK_MARGIN_BARS = int(os.getenv("LOOKBACK_MARGIN_BARS", "10"))
+
+# Shortest trading session we serve (NSE, 09:15 - 15:30); used to size intraday periods
+SESSION_MINUTES = 375
+
+# Slack for holidays and half days when converting bars to trading days
+HOLIDAY_SLACK = 1.1
+
+# Standard yfinance periods, in approximate trading days, smallest first
+STANDARD_PERIODS = [
+    ("1d", 1), ("5d", 5), ("1mo", 21), ("3mo", 63), ("6mo", 126),
+    ("1y", 252), ("2y", 504), ("5y", 1260), ("10y", 2520)
+]
+
+_PERIOD_PATTERN = re.compile(r"^(\d+)(d|wk|mo|y)$")
+_INTERVAL_PATTERN = re.compile(r"^(\d+)(m|h|d|wk|mo)$")
+
+
+def period_trading_days(period: str) -> Optional[float]:
+    """Approximate trading days covered by a yfinance period, None if unbounded"""
+    if period == "max":
+        return None
+    if period == "ytd":
+        return date.today().timetuple().tm_yday * 5 / 7
+    match = _PERIOD_PATTERN.match(period)
+    if not match:
+        return None
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == "d":
+        # "1d"/"5d" mean trading days; longer day counts are calendar days
+        return float(count) if count <= 5 else count * 5 / 7
+    return float(count * {"wk": 5, "mo": 21, "y": 252}[unit])
+
+
+def bars_per_day(interval: str) -> float:
+    """Bars per trading day for a yfinance interval (conservative for intraday)"""
+    match = _INTERVAL_PATTERN.match(interval)
+    if not match:
+        raise ValueError(f"Unsupported interval '{interval}'")
+    count, unit = int(match.group(1)), match.group(2)
+    if unit in ("m", "h"):
+        minutes = count * (60 if unit == "h" else 1)
+        return max(1, SESSION_MINUTES // minutes)
+    return 1.0 / (count * {"d": 1, "wk": 5, "mo": 21}[unit])
+
+
+def bar_duration(interval: str) -> timedelta:
+    """Wall-clock length of one bar of a yfinance interval (a month counts as 30 days)"""
+    match = _INTERVAL_PATTERN.match(interval)
+    if not match:
+        raise ValueError(f"Unsupported interval '{interval}'")
+    count, unit = int(match.group(1)), match.group(2)
+    return timedelta(minutes=count * {"m": 1, "h": 60, "d": 1440, "wk": 10080, "mo": 43200}[unit])
+
+
+def window_bars(lookback: int) -> int:
+    """Bars to keep for a strategy lookback, including the safety margin"""
+    return lookback + LOOKBACK_MARGIN_BARS
+
+
+def fetch_period(requested_period: str, interval: str, bars: int) -> str:
+    """
+    Smallest standard period holding `bars` bars of `interval`, capped at the
+    requested period so we never fetch more history than the client asked for.
+    """
+    per_day = bars_per_day(interval)
+    needed_days = math.ceil(bars / per_day * HOLIDAY_SLACK)
+    if per_day > 1:
+        # Today's session may have only just started
+        needed_days += 1
+    requested_days = period_trading_days(requested_period)
+
+    for period, days in STANDARD_PERIODS:
+        if days >= needed_days:
+            if requested_days is not None and requested_days <= days:
+                return requested_period
+            return period
+    return requested_period
@@ -1,15 +1,25 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-import yfinance as yf
 import pandas_ta as ta
 import logging
 import sys
-from typing import List, Optional
+from typing import Dict, List, Optional
 import json
-from strategies.base import BaseStrategy
+import time
+import threading
+from concurrent.futures import Future
+from strategies.base import BaseStrategy, TradeSignal
 from strategies.moving_average import MovingAverageStrategy
 from strategies.ai_strategy import AIStrategy
 from strategies.basic import BasicStrategy
+from fetch_scheduler import FetchScheduler, Priority, CircuitOpenError
+import profiling
+from profiling import profiled
+import lookback
+from warm_state import WarmStateSnapshotter, strategy_fingerprints
+from batch_cursor import CursorStore, signal_fingerprint
+from risk import RiskService
 
 # Configure console logging (Docker-friendly)
 logging.basicConfig(
@@ -27,25 +37,23 @@ class SignalRequest(BaseModel):
     timeframe: Optional[str] = "1d"
     period: Optional[str] = "3mo"
 
-class TradeSignal(BaseModel):
-    symbol: str
-    action: str  # Buy, Sell, or Hold
-    target: float
-    stop_loss: float
-    confidence: float
-    strategy: str
-    reasoning: str
-    timestamp: str
-
 class BatchSignalRequest(BaseModel):
     symbols: List[str]
     strategy: Optional[str] = "moving_average"
     timeframe: Optional[str] = "1d"
     period: Optional[str] = "3mo"
+    cursor: Optional[str] = None  # from a previous response; only changed signals are returned
+
+class VaRRequest(BaseModel):
+    positions: Dict[str, float]  # symbol -> position value (negative for shorts)
+    confidence: Optional[float] = 0.99
+    horizon_bars: Optional[int] = 1
 
 class BatchSignalResponse(BaseModel):
     signals: List[TradeSignal]
     summary: dict
+    cursor: Optional[str] = None
+    delta: bool = False  # True when signals only holds changes since the request cursor
 
 # Strategy registry
 STRATEGIES = {
@@ -54,9 +62,87 @@ STRATEGIES = {
     "basic": BasicStrategy()
 }
 
+# All upstream market data requests go through the shared fetch scheduler
+fetch_scheduler = FetchScheduler.from_env()
+
+# Rolling covariance of the RISK_WATCHLIST (None if not configured)
+risk_service = RiskService.from_env(fetch_scheduler)
+
+# Signal sets behind /signals/batch cursors
+cursor_store = CursorStore.from_env(fetch_scheduler.cache)
+
+# Most recent signal per (strategy, SYMBOL, timeframe)
+last_signals = {}
+last_signals_lock = threading.Lock()
+
+# Periodic warm-state snapshots (None unless SNAPSHOT_PATH is set)
+snapshotter = WarmStateSnapshotter.from_env()
+
+def _save_snapshot(force: bool = False) -> bool:
+    with last_signals_lock:
+        signals = {key: signal.model_dump(mode="json") for key, signal in last_signals.items()}
+    streams = {"risk": risk_service.snapshot_state()} if risk_service is not None and risk_service.ready else None
+    return snapshotter.save(fetch_scheduler.cache, signals, strategy_fingerprints(STRATEGIES), force, streams)
+
+@app.on_event("startup")
+def restore_warm_state():
+    # Runs before uvicorn accepts connections
+    if snapshotter is None:
+        return
+    state, stale = snapshotter.restore(fetch_scheduler.cache, strategy_fingerprints(STRATEGIES))
+    if state is not None:
+        with last_signals_lock:
+            for key, signal in state.last_signals.items():
+                last_signals.setdefault(key, TradeSignal(**signal))
+        if risk_service is not None and "risk" in state.streams:
+            risk_service.restore_state(*state.streams["risk"])
+        # Expired bars are served until these paced background refetches replace them
+        for symbol, period, interval in stale:
+            try:
+                fetch_scheduler.submit(symbol, period, interval, Priority.BULK, refresh=True)
+            except CircuitOpenError:
+                break
+    snapshotter.start(_save_snapshot)
+
+@app.on_event("startup")
+def start_risk_service():
+    if risk_service is not None:
+        risk_service.start()
+
+@app.on_event("shutdown")
+def save_warm_state():
+    if snapshotter is not None:
+        snapshotter.stop()
+        _save_snapshot(force=True)
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    if not profiling.is_profiling_requested(request.headers, request.query_params):
+        return await call_next(request)
+
+    profile = profiling.start_profile(request.method, request.url.path, request.url.query)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        # Handlers that raise still leave a profile behind
+        profiling.finish_profile(profile, (time.perf_counter() - start) * 1000, status_code)
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
 @app.get("/health", tags=["Health"])
 async def health_check():
-    return {"status": "ok", "service": "signal-engine", "version": "1.0.0"}
+    return {
+        "status": "ok",
+        "service": "signal-engine",
+        "version": "1.0.0",
+        "upstream": fetch_scheduler.status(),
+        "warm_state": snapshotter.status() if snapshotter is not None else None,
+        "last_signals": len(last_signals),
+        "risk": risk_service.status() if risk_service is not None else None
+    }
 
 @app.get("/strategies", tags=["Strategies"])
 async def get_available_strategies():
@@ -66,7 +152,25 @@ async def get_available_strategies():
     }
 
 @app.post("/signal", response_model=TradeSignal, tags=["Signals"])
+@profiled
 def generate_signal(request: SignalRequest):
+    return _generate_signal(request)
+
+@app.get("/signals/latest", tags=["Signals"])
+async def get_latest_signals(strategy: str = "moving_average", timeframe: str = "1d", symbols: Optional[str] = None):
+    """Last signal generated (or restored from a warm-state snapshot) per symbol, without fetching"""
+    wanted = {s.strip().upper() for s in symbols.split(",") if s.strip()} if symbols else None
+    with last_signals_lock:
+        latest = [signal for (name, symbol, frame), signal in last_signals.items()
+                  if name == strategy and frame == timeframe and (wanted is None or symbol in wanted)]
+    return {"strategy": strategy, "timeframe": timeframe, "signals": latest}
+
+def _fetch_plan(request: SignalRequest, strategy: BaseStrategy) -> tuple:
+    """Bars the strategy needs (plus margin) and the period to fetch for them"""
+    window = lookback.window_bars(strategy.required_lookback())
+    return window, lookback.fetch_period(request.period, request.timeframe, window)
+
+def _generate_signal(request: SignalRequest, pending_fetch: Optional[Future] = None):
     try:
         logger.info(f"Generating signal for {request.symbol} using {request.strategy} strategy")
         
@@ -75,25 +179,80 @@ def generate_signal(request: SignalRequest):
         if not strategy:
             raise HTTPException(status_code=400, detail=f"Strategy '{request.strategy}' not found")
         
-        # Download market data
-        ticker = yf.Ticker(request.symbol)
-        df = ticker.history(period=request.period, interval=request.timeframe)
-        
-        if df.empty:
-            raise HTTPException(status_code=404, detail=f"No data found for symbol {request.symbol}")
-        
-        # Generate signal using the strategy
-        signal = strategy.generate_signal(df, request.symbol)
+        # Generate signal using the strategy over the trimmed window
+        df, period = _signal_bars(request, strategy, pending_fetch)
+        signal = _record_signal(request, strategy, _strategy_signal(request, strategy, df, period), df, period)
         
         logger.info(f"Signal generated for {request.symbol}: {signal.action} (confidence={signal.confidence})")
         return signal
         
+    except CircuitOpenError as e:
+        logger.warning(f"Upstream unavailable for {request.symbol}: {str(e)}")
+        with last_signals_lock:
+            last = last_signals.get((request.strategy, request.symbol.upper(), request.timeframe))
+        if last is None:
+            raise HTTPException(status_code=503, detail=str(e))
+        # Serve the last known signal, flagged, rather than failing outright
+        return last.model_copy(update={"metadata": dict(last.metadata or {}, stale=True)})
     except Exception as e:
         logger.error(f"Error generating signal for {request.symbol}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating signal: {str(e)}")
 
+def _signal_bars(request: SignalRequest, strategy: BaseStrategy, pending_fetch: Optional[Future] = None) -> tuple:
+    """Download only the history the strategy's lookback needs, trimmed to its window"""
+    window, period = _fetch_plan(request, strategy)
+    if pending_fetch is not None:
+        df = pending_fetch.result(timeout=fetch_scheduler.timeout)
+    else:
+        df = fetch_scheduler.fetch(request.symbol, period, request.timeframe, Priority.INTERACTIVE)
+    
+    if df.empty:
+        raise HTTPException(status_code=404, detail=f"No data found for symbol {request.symbol}")
+    return df.iloc[-window:], period
+
+def _record_signal(request: SignalRequest, strategy: BaseStrategy, signal: TradeSignal, df, period: str) -> TradeSignal:
+    """Attach lookback metadata and remember the signal as the latest for its symbol"""
+    signal.metadata = {
+        "lookback_bars": strategy.required_lookback(),
+        "bars_used": len(df),
+        "requested_period": request.period,
+        "fetched_period": period
+    }
+    if df.attrs.get("stale"):
+        # Computed from expired bars while their revalidation is queued
+        signal.metadata["stale"] = True
+    with last_signals_lock:
+        last_signals[(request.strategy, request.symbol.upper(), request.timeframe)] = signal
+    return signal
+
+def _strategy_signal(request: SignalRequest, strategy: BaseStrategy, df, period: str) -> TradeSignal:
+    """
+    Run the strategy, reusing a signal another worker already computed from
+    the same bars when the shared cache is enabled.
+    """
+    cache = fetch_scheduler.cache
+    if cache is None:
+        return strategy.generate_signal(df, request.symbol)
+
+    key = ("signal", request.strategy, request.symbol.upper(), request.timeframe, period,
+           len(df), int(df.index[-1].value), float(df["Close"].iloc[-1]))
+    cached = cache.get_blob(key)
+    if cached is not None:
+        # Shared across spellings of the symbol; answer in this request's
+        signal = TradeSignal.model_validate_json(cached)
+        signal.symbol = request.symbol
+        return signal
+
+    signal = strategy.generate_signal(df, request.symbol)
+    try:
+        cache.put_blob(key, signal.model_dump_json(exclude={"metadata"}).encode())
+    except OSError as e:
+        logger.warning(f"Could not store signal for {request.symbol} in shared cache: {e}")
+    return signal
+
 @app.post("/signals/batch", response_model=BatchSignalResponse, tags=["Signals"])
-def generate_batch_signals(request: BatchSignalRequest):
+@profiled
+def generate_batch_signals(request: BatchSignalRequest, http_request: Request, response: Response):
     try:
         logger.info(f"Generating batch signals for {len(request.symbols)} symbols using {request.strategy} strategy")
         
@@ -101,19 +260,39 @@ def generate_batch_signals(request: BatchSignalRequest):
         successful = 0
         failed = 0
         
-        for symbol in request.symbols:
-            try:
-                signal = generate_signal(SignalRequest(
-                    symbol=symbol,
-                    strategy=request.strategy,
-                    timeframe=request.timeframe,
-                    period=request.period
-                ))
-                signals.append(signal)
-                successful += 1
-            except Exception as e:
-                logger.warning(f"Failed to generate signal for {symbol}: {str(e)}")
-                failed += 1
+        # Queue every fetch up front so the scheduler can pace and dedupe them
+        pending_fetches = {}
+        strategy = STRATEGIES.get(request.strategy)
+        if strategy:
+            _, period = _fetch_plan(request, strategy)
+            for symbol in request.symbols:
+                try:
+                    pending_fetches[symbol] = fetch_scheduler.submit(
+                        symbol, period, request.timeframe, Priority.BATCH
+                    )
+                except CircuitOpenError as e:
+                    # Fail the symbol here rather than refetching it at interactive priority
+                    pending_fetches[symbol] = Future()
+                    pending_fetches[symbol].set_exception(e)
+        
+        if strategy is not None and strategy.batch_scoring:
+            signals = _score_batch(request, strategy, pending_fetches)
+            successful = len(signals)
+            failed = len(request.symbols) - successful
+        else:
+            for symbol in request.symbols:
+                try:
+                    signal = _generate_signal(SignalRequest(
+                        symbol=symbol,
+                        strategy=request.strategy,
+                        timeframe=request.timeframe,
+                        period=request.period
+                    ), pending_fetches.get(symbol))
+                    signals.append(signal)
+                    successful += 1
+                except Exception as e:
+                    logger.warning(f"Failed to generate signal for {symbol}: {str(e)}")
+                    failed += 1
         
         summary = {
             "total_requested": len(request.symbols),
@@ -122,17 +301,75 @@ def generate_batch_signals(request: BatchSignalRequest):
             "strategy_used": request.strategy
         }
         
-        return BatchSignalResponse(signals=signals, summary=summary)
+        return _delta_response(request, signals, summary, http_request, response)
         
     except Exception as e:
         logger.error(f"Error generating batch signals: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating batch signals: {str(e)}")
 
+def _etag_values(header: Optional[str]) -> List[str]:
+    """Entity tags listed in an If-None-Match header, without quotes or W/ prefix"""
+    if not header:
+        return []
+    return [tag.strip().removeprefix("W/").strip('"') for tag in header.split(",")]
+
+def _delta_response(request: BatchSignalRequest, signals: List[TradeSignal], summary: dict,
+                    http_request: Request, response: Response):
+    """
+    Full response plus a cursor, or, given a known cursor (body or
+    If-None-Match), only the signals whose action, target, stop-loss or
+    confidence changed. An unchanged poll by ETag gets 304.
+    """
+    etags = _etag_values(http_request.headers.get("if-none-match"))
+    previous_cursor = request.cursor or (etags[0] if etags else None)
+    previous = None
+    if previous_cursor:
+        previous = cursor_store.load(previous_cursor, request.strategy, request.timeframe, request.period)
+
+    current = {signal.symbol.upper(): signal_fingerprint(signal) for signal in signals}
+    if previous is None:
+        changed = signals
+        state = current
+    else:
+        changed = [s for s in signals if previous.get(s.symbol.upper()) != current[s.symbol.upper()]]
+        # Symbols that failed this time keep what the client already has
+        requested = {symbol.upper() for symbol in request.symbols}
+        state = {symbol: fp for symbol, fp in previous.items() if symbol in requested}
+        state.update(current)
+
+    cursor = cursor_store.save(request.strategy, request.timeframe, request.period, state)
+    etag = f'"{cursor}"'
+    if previous is not None and not changed and cursor in etags:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    if previous is not None:
+        summary["changed"] = len(changed)
+        summary["unchanged"] = len(signals) - len(changed)
+    return BatchSignalResponse(signals=changed, summary=summary, cursor=cursor, delta=previous is not None)
+
+def _score_batch(request: BatchSignalRequest, strategy: BaseStrategy, pending_fetches: dict) -> List[TradeSignal]:
+    """Collect every symbol's bars, then let the strategy score them all in one pass"""
+    frames = {}
+    for symbol in request.symbols:
+        symbol_request = SignalRequest(symbol=symbol, strategy=request.strategy,
+                                       timeframe=request.timeframe, period=request.period)
+        try:
+            frames[symbol] = (symbol_request,) + _signal_bars(symbol_request, strategy, pending_fetches.get(symbol))
+        except Exception as e:
+            logger.warning(f"Failed to load bars for {symbol}: {str(e)}")
+    
+    scored = strategy.generate_signals({symbol: df for symbol, (_, df, _) in frames.items()})
+    return [
+        _record_signal(symbol_request, strategy, scored[symbol], df, period)
+        for symbol, (symbol_request, df, period) in frames.items()
+    ]
+
 @app.get("/market-data/{symbol}", tags=["Market Data"])
+@profiled
 def get_market_data(symbol: str, period: str = "1mo", interval: str = "1d"):
     try:
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period=period, interval=interval)
+        df = fetch_scheduler.fetch(symbol, period, interval, Priority.INTERACTIVE)
         
         if df.empty:
             raise HTTPException(status_code=404, detail=f"No data found for symbol {symbol}")
@@ -153,10 +390,64 @@ def get_market_data(symbol: str, period: str = "1mo", interval: str = "1d"):
         
         return data
         
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching market data for {symbol}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching market data: {str(e)}")
 
+def _risk_service() -> RiskService:
+    if risk_service is None:
+        raise HTTPException(status_code=404, detail="No RISK_WATCHLIST configured")
+    if not risk_service.ready:
+        raise HTTPException(status_code=503, detail="Risk matrix is still loading")
+    return risk_service
+
+@app.get("/risk/correlation", tags=["Risk"])
+def get_correlation(symbols: Optional[str] = None, matrix: str = "correlation"):
+    """Rolling return correlation (or covariance) matrix for the watchlist or a comma-separated subset"""
+    if matrix not in ("correlation", "covariance"):
+        raise HTTPException(status_code=400, detail="matrix must be 'correlation' or 'covariance'")
+    subset = [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None
+    return _risk_service().correlation(subset, covariance=matrix == "covariance")
+
+@app.post("/risk/var", tags=["Risk"])
+def get_value_at_risk(request: VaRRequest):
+    """Parametric (delta-normal) VaR for the given position values"""
+    if not 0.5 < request.confidence < 1:
+        raise HTTPException(status_code=400, detail="confidence must be between 0.5 and 1")
+    if request.horizon_bars < 1:
+        raise HTTPException(status_code=400, detail="horizon_bars must be at least 1")
+    service = _risk_service()
+    try:
+        return service.value_at_risk(request.positions, request.confidence, request.horizon_bars)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _require_debug_access(request: Request):
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    client_host = request.client.host if request.client else None
+    if not profiling.is_debug_access_allowed(request.headers, request.query_params, client_host):
+        detail = f"Send the {profiling.PROFILE_HEADER} header to read profiles"
+        if not profiling.PROFILING_TOKEN:
+            detail += " (only from localhost unless PROFILING_TOKEN is set)"
+        raise HTTPException(status_code=403, detail=detail)
+
+@app.get("/debug/profiles", tags=["Debug"])
+async def list_profiles(request: Request):
+    _require_debug_access(request)
+    return {"slowest": profiling.profile_store.slowest()}
+
+@app.get("/debug/profiles/{profile_id}", response_class=PlainTextResponse, tags=["Debug"])
+async def get_profile(profile_id: str, request: Request):
+    """Collapsed stacks for one profiled request (feed to flamegraph.pl or speedscope)"""
+    _require_debug_access(request)
+    profile = profiling.profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    return profile.collapsed()
+
 @app.get("/", tags=["Root"])
 async def root():
     return {
@@ -167,7 +458,10 @@ async def root():
             "strategies": "/strategies",
             "single_signal": "/signal",
             "batch_signals": "/signals/batch",
-            "market_data": "/market-data/{symbol}"
+            "latest_signals": "/signals/latest",
+            "market_data": "/market-data/{symbol}",
+            "correlation": "/risk/correlation",
+            "value_at_risk": "/risk/var"
         }
     }
 
@@ -0,0 +1,250 @@
+"""
+Opt-in per-request sampling profiler.
+
+When PROFILING_ENABLED is set, a request carrying the `X-Profile` header or
+`?profile=` query flag (equal to PROFILING_TOKEN when one is configured) is
+sampled while its handler runs. Samples are aggregated into collapsed stacks
+("frame;frame;frame count"), the input format of flamegraph.pl and
+speedscope. The most recent profiles and the slowest N profiled requests are
+kept in memory and served from /debug/profiles, which needs the same header
+or query flag; without a PROFILING_TOKEN it only answers localhost clients.
+The flag itself is removed from the stored query string.
+
+A single background thread samples the stacks of every thread currently
+running a profiled handler, so the overhead is one stack walk per sampling
+interval per profiled request and nothing for everything else.
+"""
+
+import contextvars
+import functools
+import heapq
+import hmac
+import ipaddress
+import itertools
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_ALWAYS = os.getenv("PROFILING_ALWAYS", "false").lower() == "true"
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_SLOWEST_N = int(os.getenv("PROFILING_SLOWEST_N", "20"))
+PROFILING_RECENT_N = int(os.getenv("PROFILING_RECENT_N", "50"))
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "profile"
+
+_current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = \
+    contextvars.ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, query: str = ""):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.query = query
+        self.started_at = datetime.now().isoformat()
+        self.duration_ms = 0.0
+        self.status_code = 0
+        self.samples: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add_sample(self, stack: str):
+        with self._lock:
+            self.samples[stack] += 1
+
+    def collapsed(self) -> str:
+        """Collapsed-stack text for flamegraph.pl / speedscope"""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def summary(self) -> dict:
+        with self._lock:
+            sample_count = sum(self.samples.values())
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "status_code": self.status_code,
+            "samples": sample_count,
+            "interval_ms": PROFILING_INTERVAL_MS
+        }
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler:
+    """One daemon thread sampling the stacks of all registered threads"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._targets: Dict[int, RequestProfile] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, thread_id: int, profile: RequestProfile) -> bool:
+        with self._condition:
+            if thread_id in self._targets:
+                return False
+            self._targets[thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+            return True
+
+    def unregister(self, thread_id: int):
+        with self._condition:
+            self._targets.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._targets:
+                    self._condition.wait()
+                targets = dict(self._targets)
+
+            frames = sys._current_frames()
+            for thread_id, profile in targets.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    profile.add_sample(";".join(reversed(stack)))
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Keeps the most recent profiles and the slowest N seen so far"""
+
+    def __init__(self, slowest_n: int, recent_n: int):
+        self.slowest_n = slowest_n
+        self.recent_n = recent_n
+        self._recent: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._slowest: List[tuple] = []  # min-heap of (duration_ms, seq, profile)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._recent[profile.id] = profile
+            while len(self._recent) > self.recent_n:
+                self._recent.popitem(last=False)
+            entry = (profile.duration_ms, next(self._sequence), profile)
+            if len(self._slowest) < self.slowest_n:
+                heapq.heappush(self._slowest, entry)
+            elif self.slowest_n and profile.duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            if profile_id in self._recent:
+                return self._recent[profile_id]
+            for _, _, profile in self._slowest:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def slowest(self) -> List[dict]:
+        with self._lock:
+            entries = sorted(self._slowest, key=lambda e: e[0], reverse=True)
+        return [profile.summary() for _, _, profile in entries]
+
+
+sampler = _Sampler(PROFILING_INTERVAL_MS / 1000.0)
+profile_store = ProfileStore(PROFILING_SLOWEST_N, PROFILING_RECENT_N)
+
+
+def _has_profile_flag(headers, query_params) -> bool:
+    """The request's header/query flag, checked against PROFILING_TOKEN when one is set"""
+    flag = headers.get(PROFILE_HEADER) or query_params.get(PROFILE_QUERY_PARAM)
+    if not flag:
+        return False
+    if PROFILING_TOKEN:
+        return hmac.compare_digest(flag.encode(), PROFILING_TOKEN.encode())
+    return flag.lower() not in ("0", "false", "no")
+
+
+def is_profiling_requested(headers, query_params) -> bool:
+    """Check config and the request's header/query flag"""
+    if not PROFILING_ENABLED:
+        return False
+    return PROFILING_ALWAYS or _has_profile_flag(headers, query_params)
+
+
+def _is_loopback(host: Optional[str]) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host or "").is_loopback
+    except ValueError:
+        return False
+
+
+def is_debug_access_allowed(headers, query_params, client_host: Optional[str] = None) -> bool:
+    """
+    /debug/profiles needs the same flag (or token) as profiling a request.
+    Profiles expose code paths and timings, so without a token only
+    localhost clients may read them.
+    """
+    if not PROFILING_ENABLED or not _has_profile_flag(headers, query_params):
+        return False
+    return bool(PROFILING_TOKEN) or _is_loopback(client_host)
+
+
+def redact_query(query: str) -> str:
+    """Query string without the profile flag, so the token is never stored"""
+    params = [(k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k != PROFILE_QUERY_PARAM]
+    return urlencode(params)
+
+
+def start_profile(method: str, path: str, query: str = "") -> RequestProfile:
+    """Create a profile and make it current for the rest of this request"""
+    profile = RequestProfile(method, path, redact_query(query))
+    _current_profile.set(profile)
+    return profile
+
+
+def finish_profile(profile: RequestProfile, duration_ms: float, status_code: int):
+    profile.duration_ms = duration_ms
+    profile.status_code = status_code
+    profile_store.add(profile)
+
+
+def profiled(func):
+    """
+    Decorator for sync handlers: sample the handler's thread while it runs
+    if the current request asked for profiling. FastAPI runs sync handlers
+    in a threadpool, so the profile is found through a context variable set
+    by the middleware.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        thread_id = threading.get_ident()
+        registered = sampler.register(thread_id, profile)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if registered:
+                sampler.unregister(thread_id)
+    return wrapper
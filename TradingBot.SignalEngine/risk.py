@@ -0,0 +1,280 @@
+"""
+Rolling return covariance/correlation for a configured watchlist, and
+parametric VaR on top of it.
+
+RollingCovariance keeps the last `window` return vectors in a ring buffer
+together with their running sum and cross-product matrix. Each new bar is
+a rank-one update of the cross products plus a rank-one downdate for the
+bar leaving the window, O(N^2) instead of the O(window * N^2) of a full
+recompute. The sums are rebuilt from the buffer every `window` updates so
+floating-point drift cannot accumulate.
+
+RiskService refreshes the matrix from the fetch scheduler every
+RISK_REFRESH_SECONDS on a background thread, downloading only the bars
+since the last one applied. Missing bars are treated as zero returns, i.e.
+the last close is carried forward.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import lookback
+from fetch_scheduler import FetchScheduler, Priority
+
+logger = logging.getLogger(__name__)
+
+
+class RollingCovariance:
+    def __init__(self, symbols: List[str], window: int):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.window = window
+        size = len(self.symbols)
+        self._returns = np.zeros((window, size))
+        self._position = 0
+        self.count = 0
+        self._sum = np.zeros(size)
+        self._cross = np.zeros((size, size))
+        self._since_rebuild = 0
+
+    def update(self, returns: np.ndarray):
+        """Add one bar of returns (NaN counts as 0), dropping the oldest once full"""
+        returns = np.nan_to_num(np.asarray(returns, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+        if self.count == self.window:
+            oldest = self._returns[self._position]
+            self._sum -= oldest
+            self._cross -= np.outer(oldest, oldest)
+        else:
+            self.count += 1
+        self._returns[self._position] = returns
+        self._position = (self._position + 1) % self.window
+        self._sum += returns
+        self._cross += np.outer(returns, returns)
+
+        self._since_rebuild += 1
+        if self._since_rebuild >= self.window:
+            self._rebuild()
+
+    def _rebuild(self):
+        data = self._returns[:self.count]
+        self._sum = data.sum(axis=0)
+        self._cross = data.T @ data
+        self._since_rebuild = 0
+
+    def state(self) -> tuple:
+        """(metadata, arrays) to snapshot the window"""
+        meta = {"symbols": self.symbols, "window": self.window, "count": self.count, "position": self._position}
+        return meta, {"returns": self._returns.copy()}
+
+    def load_state(self, meta: dict, arrays: Dict[str, np.ndarray]) -> bool:
+        """Restore a window from state(); False if it is for other symbols or another window size"""
+        returns = arrays.get("returns")
+        if meta.get("symbols") != self.symbols or meta.get("window") != self.window \
+                or returns is None or returns.shape != self._returns.shape:
+            return False
+        self._returns = np.array(returns, dtype=float)
+        self.count = int(meta["count"])
+        self._position = int(meta["position"])
+        self._rebuild()
+        return True
+
+    def covariance(self, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sample covariance of per-bar returns, optionally for a subset of symbols"""
+        n = self.count
+        if indices is None:
+            cross, total = self._cross, self._sum
+        else:
+            cross, total = self._cross[np.ix_(indices, indices)], self._sum[indices]
+        if n < 2:
+            return np.full(cross.shape, np.nan)
+        return (cross - np.outer(total, total) / n) / (n - 1)
+
+    def correlation(self, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        cov = self.covariance(indices)
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.outer(std, std)
+        np.clip(corr, -1.0, 1.0, out=corr)
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return corr
+
+
+class RiskService:
+    def __init__(self, scheduler: FetchScheduler, symbols: List[str], interval: str = "1m",
+                 window: int = 375, refresh_seconds: float = 60.0):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.refresh_seconds = refresh_seconds
+        self.matrix = RollingCovariance([s.upper() for s in symbols], window)
+        self.as_of: Optional[pd.Timestamp] = None
+        self.last_refresh_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._last_close = np.full(len(symbols), np.nan)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, scheduler: FetchScheduler) -> Optional["RiskService"]:
+        """Service for RISK_WATCHLIST (comma-separated), or None if no watchlist is configured"""
+        symbols = [s.strip() for s in os.getenv("RISK_WATCHLIST", "").split(",") if s.strip()]
+        if not symbols:
+            return None
+        return cls(
+            scheduler,
+            list(dict.fromkeys(s.upper() for s in symbols)),
+            interval=os.getenv("RISK_INTERVAL", "1m"),
+            window=int(os.getenv("RISK_WINDOW_BARS", "375")),
+            refresh_seconds=float(os.getenv("RISK_REFRESH_SECONDS", "60"))
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.matrix.count >= 2
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.refresh()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    logger.error(f"Risk matrix refresh failed: {e}")
+                time.sleep(self.refresh_seconds)
+
+        self._thread = threading.Thread(target=loop, name="risk-refresh", daemon=True)
+        self._thread.start()
+
+    def refresh(self) -> int:
+        """Fetch the closes since as_of and apply every completed bar newer than it; returns bars applied"""
+        started = time.perf_counter()
+        bar = pd.Timedelta(lookback.bar_duration(self.interval))
+        bars, start = self.matrix.window + 2, None
+        if self.as_of is not None:
+            # Bars since as_of (an upper bound: it counts closed-market time too)
+            missed = math.ceil((pd.Timestamp.now(tz=self.as_of.tz) - self.as_of) / bar) + 2
+            if missed < bars:
+                bars, start = missed, self.as_of
+        period = lookback.fetch_period("max", self.interval, bars)
+        closes = self.scheduler.fetch_closes(self.matrix.symbols, period, self.interval, Priority.BULK, start)
+        closes = closes.sort_index()
+        # The newest bar may still be forming; it is picked up once complete
+        if len(closes) and closes.index[-1] + bar > pd.Timestamp.now(tz=closes.index.tz):
+            closes = closes.iloc[:-1]
+        if self.as_of is not None:
+            closes = closes[closes.index > self.as_of]
+        elif len(closes) > self.matrix.window + 1:
+            closes = closes.iloc[-(self.matrix.window + 1):]
+
+        prices = closes.to_numpy(dtype=float)
+        with self._lock:
+            for row in prices:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    returns = row / self._last_close - 1
+                if not np.isnan(self._last_close).all():
+                    self.matrix.update(returns)
+                self._last_close = np.where(np.isnan(row), self._last_close, row)
+            if len(closes):
+                self.as_of = closes.index[-1]
+        self.last_refresh_ms = round((time.perf_counter() - started) * 1000, 1)
+        return len(prices)
+
+    def snapshot_state(self) -> tuple:
+        """(metadata, arrays) for a warm-state snapshot"""
+        with self._lock:
+            meta, arrays = self.matrix.state()
+            meta.update(interval=self.interval, as_of=self.as_of.isoformat() if self.as_of is not None else None)
+            arrays["last_close"] = self._last_close.copy()
+        return meta, arrays
+
+    def restore_state(self, meta: dict, arrays: Dict[str, np.ndarray]) -> bool:
+        """Resume from snapshot_state(); refresh() then applies only the bars since as_of"""
+        last_close = arrays.get("last_close")
+        if meta.get("interval") != self.interval or last_close is None \
+                or last_close.shape != self._last_close.shape:
+            return False
+        with self._lock:
+            if not self.matrix.load_state(meta, arrays):
+                return False
+            self._last_close = np.array(last_close, dtype=float)
+            self.as_of = pd.Timestamp(meta["as_of"]) if meta.get("as_of") else None
+        logger.info(f"Restored risk matrix: {self.matrix.count} bars as of {self.as_of}")
+        return True
+
+    def _indices(self, symbols: Optional[List[str]]) -> tuple:
+        if not symbols:
+            return self.matrix.symbols, None
+        known = [s.upper() for s in symbols if s.upper() in self.matrix.index]
+        return known, np.array([self.matrix.index[s] for s in known], dtype=int)
+
+    def correlation(self, symbols: Optional[List[str]] = None, covariance: bool = False) -> dict:
+        names, indices = self._indices(symbols)
+        with self._lock:
+            matrix = self.matrix.covariance(indices) if covariance else self.matrix.correlation(indices)
+            bars = self.matrix.count
+            as_of = self.as_of
+        values = pd.DataFrame(matrix).astype(object).where(~np.isnan(matrix), None).values.tolist()
+        return {
+            "symbols": names,
+            "matrix": "covariance" if covariance else "correlation",
+            "interval": self.interval,
+            "bars": bars,
+            "as_of": as_of.isoformat() if as_of is not None else None,
+            "values": values
+        }
+
+    def value_at_risk(self, positions: Dict[str, float], confidence: float = 0.99, horizon_bars: int = 1) -> dict:
+        """
+        Delta-normal VaR for position values (currency, negative for shorts):
+        z * sqrt(w' S w) * sqrt(horizon), with the per-bar return covariance S
+        and zero mean. Components add up to the total.
+        """
+        held = {s.upper(): float(v) for s, v in positions.items()}
+        names = [s for s in held if s in self.matrix.index]
+        if not names:
+            raise ValueError("positions must include at least one RISK_WATCHLIST symbol")
+        indices = np.array([self.matrix.index[s] for s in names], dtype=int)
+        missing = [s for s in held if s not in self.matrix.index]
+        weights = np.array([held[s] for s in names])
+        with self._lock:
+            cov = self.matrix.covariance(indices)
+            bars = self.matrix.count
+
+        z = NormalDist().inv_cdf(confidence)
+        scale = z * math.sqrt(horizon_bars)
+        marginal = np.nan_to_num(cov) @ weights
+        volatility = float(np.sqrt(max(weights @ marginal, 0.0)))
+        components = weights * marginal / volatility * scale if volatility > 0 else np.zeros(len(names))
+        return {
+            "confidence": confidence,
+            "horizon_bars": horizon_bars,
+            "interval": self.interval,
+            "bars": bars,
+            "portfolio_value": float(weights.sum()),
+            "portfolio_volatility": volatility,
+            "var": volatility * scale,
+            "components": dict(zip(names, np.round(components, 2).tolist())),
+            "missing_symbols": missing
+        }
+
+    def status(self) -> dict:
+        return {
+            "symbols": len(self.matrix.symbols),
+            "window_bars": self.matrix.window,
+            "bars": self.matrix.count,
+            "interval": self.interval,
+            "as_of": self.as_of.isoformat() if self.as_of is not None else None,
+            "last_refresh_ms": self.last_refresh_ms,
+            "last_error": self.last_error
+        }
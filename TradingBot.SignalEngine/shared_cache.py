@@ -0,0 +1,367 @@
+"""
+Cross-process cache for multi-worker deployments (uvicorn --workers N).
+
+Entries live in memory-mapped files under SHARED_CACHE_DIR (ideally on
+/dev/shm), so every worker maps the same pages instead of holding its own
+copy of the market data:
+
+- reads are lock-free: writers build a new file and atomically rename it
+  over the old one, so a reader either maps the old or the new version,
+  never a partial one; frames are served zero-copy straight from the map
+- at most one worker fetches a given key: fetch_lock() takes an exclusive
+  flock on a per-key lock file, and workers that wait on it re-read the
+  cache instead of fetching again
+- SharedTokenBucket keeps the upstream rate limit in a shared file, so
+  adding workers does not multiply the upstream request rate
+- the directory is kept under max_bytes by evicting the oldest entries;
+  it is scanned every _PRUNE_EVERY_WRITES writes or once this process's
+  running size estimate crosses max_bytes, not on every write, and the
+  scan also removes lock files of evicted keys and leftover .tmp files
+
+Linux/Unix only (fcntl).
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"TBSC"
+_FORMAT_VERSION = 1
+_KIND_FRAME = 1
+_KIND_BLOB = 2
+# magic, format version, kind, created_at, rows, columns, names length
+_HEADER = struct.Struct("<4sIIdQII")
+_BUCKET_STATE = struct.Struct("<dd")
+
+# Writes between full directory scans (other workers' writes are only seen by a scan)
+_PRUNE_EVERY_WRITES = 256
+
+# Age after which a .tmp file is from a crashed writer and an unused .lock file can go
+_ORPHAN_SECONDS = 60.0
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class SharedCache:
+    def __init__(self, directory: str, ttl: float = 60.0, max_bytes: int = 48 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # Per-process map of open entries: filename -> (inode, kind, created_at, value)
+        self._mapped: Dict[str, Tuple[int, int, float, object]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        # Running size estimate since the last directory scan (None: scan on the next write)
+        self._estimated_bytes: Optional[int] = None
+        self._writes_since_scan = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SharedCache"]:
+        """Shared cache configured from SHARED_CACHE_* variables, or None if disabled"""
+        directory = os.getenv("SHARED_CACHE_DIR")
+        if not directory:
+            return None
+        return cls(
+            directory,
+            ttl=float(os.getenv("SHARED_CACHE_TTL_SECONDS", "60")),
+            max_bytes=int(float(os.getenv("SHARED_CACHE_MAX_MB", "48")) * 1024 * 1024)
+        )
+
+    def _filename(self, key: Hashable) -> str:
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    # -- reads (lock-free) -------------------------------------------------
+
+    def _load(self, key: Hashable, kind: int, ttl: Optional[float]):
+        filename = self._filename(key)
+        path = os.path.join(self.directory, filename)
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            with self._lock:
+                self._mapped.pop(filename, None)
+            self._count("misses")
+            return None
+
+        with self._lock:
+            cached = self._mapped.get(filename)
+        if cached is None or cached[0] != inode or cached[1] != kind:
+            try:
+                cached = (inode, kind) + self._map(path, kind)
+            except (FileNotFoundError, ValueError, struct.error) as e:
+                if not isinstance(e, FileNotFoundError):
+                    logger.warning(f"Discarding unreadable shared cache entry {filename}: {e}")
+                self._count("misses")
+                return None
+            with self._lock:
+                self._mapped[filename] = cached
+
+        _, _, created_at, value = cached
+        if time.time() - created_at > (self.ttl if ttl is None else ttl):
+            # Unmap stale data; the fetch that follows replaces the file
+            with self._lock:
+                self._mapped.pop(filename, None)
+            self._count("misses")
+            return None
+        self._count("hits")
+        return value
+
+    def _map(self, path: str, kind: Optional[int] = None, with_key: bool = False):
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, stored_kind, created_at, rows, columns, names_length = _HEADER.unpack_from(buffer, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION or (kind is not None and stored_kind != kind):
+            raise ValueError("incompatible entry")
+        kind = stored_kind
+
+        offset = _HEADER.size
+        names = json.loads(bytes(buffer[offset:offset + names_length]))
+        offset = _align(offset + names_length)
+        if kind == _KIND_BLOB:
+            value = bytes(buffer[offset:offset + rows])
+            return (names.get("key"), kind, created_at, value) if with_key else (created_at, value)
+
+        index = np.frombuffer(buffer, dtype=np.int64, count=rows, offset=offset)
+        offset += rows * 8
+        values = np.frombuffer(buffer, dtype=np.float64, count=rows * columns, offset=offset)
+        # (columns, rows) block viewed as (rows, columns): pandas keeps it without copying
+        timestamps = pd.DatetimeIndex(index.view("datetime64[ns]"))
+        if names.get("tz"):
+            timestamps = timestamps.tz_localize("UTC").tz_convert(names["tz"])
+        frame = pd.DataFrame(values.reshape(columns, rows).T, columns=names["columns"],
+                             index=timestamps, copy=False)
+        return (names.get("key"), kind, created_at, frame) if with_key else (created_at, frame)
+
+    def get_frame(self, key: Hashable, ttl: Optional[float] = None) -> Optional[pd.DataFrame]:
+        """Cached OHLCV frame for key (read-only, shared between workers) or None"""
+        return self._load(key, _KIND_FRAME, ttl)
+
+    def get_blob(self, key: Hashable, ttl: Optional[float] = None) -> Optional[bytes]:
+        return self._load(key, _KIND_BLOB, ttl)
+
+    def contains(self, key: Hashable) -> bool:
+        """True if an entry exists for key, fresh or not"""
+        return os.path.exists(os.path.join(self.directory, self._filename(key)))
+
+    def entries(self) -> Iterator[Tuple[tuple, str, float, object]]:
+        """(key, "frame" | "blob", created_at, value) for every readable entry"""
+        for name in os.listdir(self.directory):
+            if name.endswith((".lock", ".tmp", ".bucket")):
+                continue
+            try:
+                key, kind, created_at, value = self._map(os.path.join(self.directory, name), with_key=True)
+            except (FileNotFoundError, ValueError, struct.error):
+                continue
+            if key is not None:
+                yield tuple(key), "frame" if kind == _KIND_FRAME else "blob", created_at, value
+
+    # -- writes --------------------------------------------------------------
+
+    def _write(self, key: Hashable, kind: int, rows: int, columns: int, names: dict, payload: list,
+               created_at: Optional[float] = None):
+        filename = self._filename(key)
+        path = os.path.join(self.directory, filename)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if isinstance(key, tuple):
+            # Kept so entries can be listed (e.g. for warm-state snapshots)
+            names = dict(names, key=list(key))
+        names_bytes = json.dumps(names).encode()
+        created_at = time.time() if created_at is None else created_at
+        header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, kind, created_at, rows, columns, len(names_bytes))
+
+        with open(temp_path, "wb") as f:
+            f.write(header)
+            f.write(names_bytes)
+            f.write(b"\0" * (_align(len(header) + len(names_bytes)) - len(header) - len(names_bytes)))
+            for chunk in payload:
+                f.write(chunk)
+        os.replace(temp_path, path)
+        self._count("writes")
+
+        size = _align(len(header) + len(names_bytes)) + sum(len(chunk) for chunk in payload)
+        with self._lock:
+            self._writes_since_scan += 1
+            if self._estimated_bytes is not None:
+                # Overestimates when a key is rewritten, which only brings the next scan forward
+                self._estimated_bytes += size
+            due = self._estimated_bytes is None or self._estimated_bytes > self.max_bytes \
+                or self._writes_since_scan >= _PRUNE_EVERY_WRITES
+        if due:
+            self._prune()
+
+    def put_frame(self, key: Hashable, df: pd.DataFrame, created_at: Optional[float] = None):
+        """Store an OHLCV frame (numeric columns, datetime index)"""
+        index = pd.DatetimeIndex(df.index)
+        tz = str(index.tz) if index.tz is not None else None
+        if tz:
+            index = index.tz_convert("UTC").tz_localize(None)
+        timestamps = index.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        values = np.ascontiguousarray(df.to_numpy(dtype=np.float64).T)
+        names = {"columns": [str(c) for c in df.columns], "tz": tz}
+        self._write(key, _KIND_FRAME, len(df), len(df.columns), names,
+                    [timestamps.tobytes(), values.tobytes()], created_at)
+
+    def put_blob(self, key: Hashable, data: bytes, created_at: Optional[float] = None):
+        self._write(key, _KIND_BLOB, len(data), 0, {}, [data], created_at)
+
+    def _prune(self):
+        """
+        Scan the directory: drop the oldest entries (and their lock files)
+        once it exceeds max_bytes, and remove .tmp files left by crashed
+        writers and lock files of keys that have no entry.
+        """
+        entries = []
+        locks = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(".tmp"):
+                if now - stat.st_mtime > _ORPHAN_SECONDS:
+                    self._remove(path)
+            elif name.endswith(".lock"):
+                locks.append((name, stat.st_mtime))
+            elif not name.endswith(".bucket"):
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+
+        if total > self.max_bytes:
+            for _, size, name in sorted(entries):
+                self._remove(os.path.join(self.directory, name))
+                self._remove_lock(os.path.join(self.directory, name + ".lock"))
+                self._count("evictions")
+                total -= size
+                if total <= self.max_bytes * 0.8:
+                    break
+
+        for name, mtime in locks:
+            if now - mtime > _ORPHAN_SECONDS and not os.path.exists(os.path.join(self.directory, name[:-5])):
+                self._remove_lock(os.path.join(self.directory, name))
+
+        with self._lock:
+            self._estimated_bytes = total
+            self._writes_since_scan = 0
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _remove_lock(path: str):
+        """Remove a fetch lock file unless a worker holds it right now"""
+        try:
+            with open(path, "r") as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # A worker that opened the file just before this sees the unlinked
+                # lock; the worst case is one extra fetch of that key
+                os.remove(path)
+        except (FileNotFoundError, BlockingIOError):
+            pass
+
+    # -- coordination --------------------------------------------------------
+
+    @contextmanager
+    def fetch_lock(self, key: Hashable):
+        """Exclusive cross-process lock for fetching key; waiters re-check the cache"""
+        path = os.path.join(self.directory, self._filename(key) + ".lock")
+        with open(path, "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def status(self) -> dict:
+        entries = 0
+        size = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith((".lock", ".tmp", ".bucket")):
+                entries += 1
+                try:
+                    size += os.stat(os.path.join(self.directory, name)).st_size
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            "directory": self.directory,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "stats": stats
+        }
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in a small shared file, so every worker
+    draws from the same upstream budget. Same interface as
+    fetch_scheduler.TokenBucket.
+    """
+
+    def __init__(self, path: str, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _state(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(self._fd, _BUCKET_STATE.size, 0)
+                now = time.time()
+                if len(raw) == _BUCKET_STATE.size:
+                    tokens, updated = _BUCKET_STATE.unpack(raw)
+                    tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+                else:
+                    tokens = self.capacity
+                state = [tokens]
+                yield state
+                os.pwrite(self._fd, _BUCKET_STATE.pack(state[0], now), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def reserve(self) -> float:
+        with self._state() as state:
+            state[0] -= 1
+            return 0.0 if state[0] >= 0 else -state[0] / self.rate
+
+    def drain(self):
+        with self._state() as state:
+            state[0] = min(state[0], 0.0)
+
+    def available(self) -> float:
+        with self._state() as state:
+            return state[0]
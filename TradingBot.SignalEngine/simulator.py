@@ -0,0 +1,512 @@
+"""
+Event-driven paper-trading simulator.
+
+Replays stored OHLCV bars for many symbols through any strategy and
+simulates market, limit and stop-loss fills while enforcing the same daily
+limits as the C# PortfolioManagementService (max trades, max buy amount,
+max sell amount per day) and its position sizing rule. Produces a trade
+ledger, a list of rejected/cancelled orders and an equity curve.
+
+The simulator is built to replay a year of 1-minute bars for hundreds of
+symbols in minutes:
+
+- signals for every bar are computed up front, vectorized, with
+  BaseStrategy.generate_signal_frame()
+- the event queue is a heap holding at most a few events per symbol: each
+  symbol only schedules its next *actionable* signal (the next Buy while
+  flat, the next Sell while long or with an entry pending), and protective
+  stop-loss/target exits are located with a vectorized scan of the bars
+  instead of checking every bar in Python
+- stale events are dropped lazily through version counters
+
+Signals are generated on a bar's close and act on later bars, so there is
+no look-ahead: market orders fill at the next bar's open, limit orders when
+a later bar trades through the limit, stop-losses at the stop (or the open,
+on a gap through it). Within a bar, orders filling at the open run first,
+then protective exits, then the bar's signal; so a strategy exit due at the
+open wins over a stop or target touched later in that bar.
+
+Protective stop-loss and target exits mirror the broker-side stop attached
+to the entry order: they are not checked against the daily limits (a
+limit must never leave a position unprotected) but still count towards
+the day's trades and sell amount. Rejections are reported in time order.
+
+    python simulator.py --bars-dir data/1m --strategy moving_average --ledger ledger.csv --equity equity.csv
+"""
+
+import argparse
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from strategies.base import BaseStrategy
+
+logger = logging.getLogger(__name__)
+
+NS_PER_DAY = 86_400_000_000_000
+
+# Event kinds; at equal timestamps fills at the bar's open run first, then
+# protective exits during the bar, then signals on its close
+_FILL_PRIORITY = 0
+_PROTECTIVE_PRIORITY = 1
+_SIGNAL_PRIORITY = 2
+_ENTRY, _EXIT, _SIGNAL = 0, 1, 2
+
+# First chunk size when scanning bars for a protective exit
+_SCAN_CHUNK = 256
+
+
+def load_bars(directory: str, symbols: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Load stored bars, one file per symbol named <SYMBOL>.parquet, .pkl or
+    .csv, each with a datetime index and Open/High/Low/Close/Volume columns.
+    """
+    bars = {}
+    for filename in sorted(os.listdir(directory)):
+        symbol, ext = os.path.splitext(filename)
+        if symbols is not None and symbol not in symbols:
+            continue
+        path = os.path.join(directory, filename)
+        if ext == ".parquet":
+            df = pd.read_parquet(path)
+        elif ext == ".pkl":
+            df = pd.read_pickle(path)
+        elif ext == ".csv":
+            df = pd.read_csv(path, index_col=0, parse_dates=True)
+        else:
+            continue
+        bars[symbol] = df.sort_index()
+    return bars
+
+
+def _timestamps_ns(index: pd.Index) -> np.ndarray:
+    """Wall-clock nanoseconds for a datetime index (timezone dropped, not converted)"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.to_numpy(dtype="datetime64[ns]").view("int64")
+
+
+class _Order:
+    __slots__ = ("signal_bar", "fill_bar", "price", "quantity", "order_type", "target", "stop_loss")
+
+    def __init__(self, signal_bar, fill_bar, price, quantity, order_type, target, stop_loss):
+        self.signal_bar = signal_bar
+        self.fill_bar = fill_bar
+        self.price = price
+        self.quantity = quantity
+        self.order_type = order_type
+        self.target = target
+        self.stop_loss = stop_loss
+
+
+class _SymbolBook:
+    """Bars, precomputed signals and simulation state for one symbol"""
+
+    def __init__(self, symbol: str, df: pd.DataFrame, signals: pd.DataFrame):
+        self.symbol = symbol
+        self.ts = _timestamps_ns(df.index)
+        self.open = df["Open"].to_numpy(dtype=float)
+        self.high = df["High"].to_numpy(dtype=float)
+        self.low = df["Low"].to_numpy(dtype=float)
+        self.close = df["Close"].to_numpy(dtype=float)
+        self.target = signals["target"].to_numpy(dtype=float)
+        self.stop_loss = signals["stop_loss"].to_numpy(dtype=float)
+        action = signals["action"].to_numpy()
+        self.buy_bars = np.flatnonzero(action == "Buy")
+        self.sell_bars = np.flatnonzero(action == "Sell")
+
+        self.position = 0
+        self.entry_price = 0.0
+        self.pending_entry: Optional[_Order] = None
+        self.exit_version = 0
+        self.signal_version = 0
+
+    def __len__(self):
+        return len(self.ts)
+
+    def next_signal_bar(self, after_bar: int) -> Optional[int]:
+        """Next bar after `after_bar` with a signal we would act on in the current state"""
+        bars = self.buy_bars if self.position == 0 and self.pending_entry is None else self.sell_bars
+        k = np.searchsorted(bars, after_bar, side="right")
+        return int(bars[k]) if k < len(bars) else None
+
+    def first_bar_where(self, values: np.ndarray, start: int, below: float = None, above: float = None) -> Optional[int]:
+        """First bar >= start where values <= below (or >= above), scanning in growing chunks"""
+        n = len(values)
+        chunk = _SCAN_CHUNK
+        while start < n:
+            end = min(n, start + chunk)
+            window = values[start:end]
+            hits = window <= below if below is not None else window >= above
+            if hits.any():
+                return start + int(hits.argmax())
+            start = end
+            chunk *= 4
+        return None
+
+
+class SimulationResult:
+    def __init__(self, ledger: pd.DataFrame, rejections: pd.DataFrame,
+                 equity_curve: pd.DataFrame, summary: Dict[str, Any]):
+        self.ledger = ledger
+        self.rejections = rejections
+        self.equity_curve = equity_curve
+        self.summary = summary
+
+
+class PaperTradingSimulator:
+    def __init__(self, strategy: BaseStrategy, config: Dict[str, Any] = None):
+        self.strategy = strategy
+
+        # Defaults mirror TradeSettings / RiskConfig in TradingBot.Api
+        self.default_config = {
+            "initial_cash": 100000.0,
+            "max_daily_trades": int(os.getenv("MAX_DAILY_TRADES", "10")),
+            "max_daily_buy_amount": float(os.getenv("MAX_DAILY_BUY_AMOUNT", "10000")),
+            "max_daily_sell_amount": float(os.getenv("MAX_DAILY_SELL_AMOUNT", "10000")),
+            "position_size_percentage": 0.02,   # of available cash per entry
+            "max_position_size": 50000.0,       # absolute cap per entry
+            "entry_order": "market",            # "market" or "limit"
+            "limit_offset": 0.002,              # buy limit 0.2% below the signal close
+            "limit_ttl_bars": 5,                # bars a limit entry stays open
+            "use_stop_loss": True,
+            "use_target": True,
+            "commission_percent": 0.0,
+            "equity_interval": "1D"             # equity curve sampling; None for every bar
+        }
+
+        # Merge with provided config
+        if config:
+            self.default_config.update(config)
+
+    # -- event queue -------------------------------------------------------
+
+    def _push(self, ts: int, priority: int, kind: int, book: _SymbolBook, version: int, payload):
+        heapq.heappush(self._events, (ts, priority, next(self._sequence), kind, book, version, payload))
+
+    def _schedule_signal(self, book: _SymbolBook, after_bar: int):
+        """Replace the symbol's pending signal event with its next actionable one"""
+        book.signal_version += 1
+        bar = book.next_signal_bar(after_bar)
+        if bar is not None:
+            self._push(book.ts[bar], _SIGNAL_PRIORITY, _SIGNAL, book, book.signal_version, bar)
+
+    def _schedule_protective_exit(self, book: _SymbolBook, order: _Order):
+        """Find the first bar that hits the stop-loss or target and queue that exit"""
+        cfg = self.default_config
+        start = order.fill_bar
+        stop_bar = target_bar = None
+        if cfg["use_stop_loss"] and order.stop_loss > 0:
+            stop_bar = book.first_bar_where(book.low, start, below=order.stop_loss)
+        if cfg["use_target"] and order.target > 0:
+            target_bar = book.first_bar_where(book.high, start, above=order.target)
+
+        # Same bar for both: assume the stop was hit first (conservative).
+        # A gap through the level fills at the bar's open (the entry price on the fill bar).
+        if stop_bar is not None and (target_bar is None or stop_bar <= target_bar):
+            reference = book.open[stop_bar] if stop_bar > start else order.price
+            price = min(reference, order.stop_loss)
+            self._push(book.ts[stop_bar], _PROTECTIVE_PRIORITY, _EXIT, book, book.exit_version, (stop_bar, price, "stop_loss"))
+        elif target_bar is not None:
+            reference = book.open[target_bar] if target_bar > start else order.price
+            price = max(reference, order.target)
+            self._push(book.ts[target_bar], _PROTECTIVE_PRIORITY, _EXIT, book, book.exit_version, (target_bar, price, "target"))
+
+    # -- limits and bookkeeping -------------------------------------------
+
+    def _roll_day(self, ts: int):
+        day = ts // NS_PER_DAY
+        if day != self._day:
+            self._day = day
+            self._trade_count = 0
+            self._buy_amount = 0.0
+            self._sell_amount = 0.0
+
+    def _reject(self, ts: int, book: _SymbolBook, side: str, quantity: int, price: float, reason: str):
+        self._rejections.append((ts, book.symbol, side, quantity, round(price, 2), reason))
+
+    def _record(self, ts: int, book: _SymbolBook, side: str, quantity: int, price: float,
+                order_type: str, pnl: float):
+        self._trades.append((ts, book.symbol, side, quantity, round(price, 4), round(quantity * price, 2),
+                             order_type, round(pnl, 2), round(self._cash, 2)))
+
+    # -- event handlers ----------------------------------------------------
+
+    def _on_signal(self, book: _SymbolBook, bar: int):
+        cfg = self.default_config
+        n = len(book)
+        is_buy = book.position == 0 and book.pending_entry is None
+
+        if is_buy:
+            if bar + 1 >= n:
+                return
+            size = min(self._cash * cfg["position_size_percentage"], cfg["max_position_size"])
+            quantity = int(size // book.close[bar])
+            if quantity < 1:
+                self._reject(book.ts[bar], book, "Buy", 0, book.close[bar], "Position size below one share.")
+                self._schedule_signal(book, bar)
+                return
+
+            if cfg["entry_order"] == "limit":
+                limit = round(book.close[bar] * (1 - cfg["limit_offset"]), 2)
+                last = min(n, bar + 1 + cfg["limit_ttl_bars"])
+                hits = np.flatnonzero(book.low[bar + 1:last] <= limit)
+                if not len(hits):
+                    self._reject(book.ts[last - 1], book, "Buy", quantity, limit, "Limit order expired.")
+                    self._schedule_signal(book, last - 1)
+                    return
+                fill_bar = bar + 1 + int(hits[0])
+                order = _Order(bar, fill_bar, min(book.open[fill_bar], limit), quantity, "limit",
+                               book.target[bar], book.stop_loss[bar])
+            else:
+                fill_bar = bar + 1
+                order = _Order(bar, fill_bar, book.open[fill_bar], quantity, "market",
+                               book.target[bar], book.stop_loss[bar])
+
+            book.pending_entry = order
+            self._push(book.ts[fill_bar], _FILL_PRIORITY, _ENTRY, book, 0, order)
+            self._schedule_signal(book, bar)
+            return
+
+        # Sell signal: cancel a pending entry, or exit the position at the next open
+        if book.pending_entry is not None:
+            order = book.pending_entry
+            book.pending_entry = None
+            self._reject(book.ts[bar], book, "Buy", order.quantity, order.price, "Entry cancelled by sell signal.")
+            self._schedule_signal(book, bar)
+        elif bar + 1 < n:
+            self._push(book.ts[bar + 1], _FILL_PRIORITY, _EXIT, book, book.exit_version,
+                       (bar + 1, book.open[bar + 1], "signal"))
+            self._schedule_signal(book, bar)
+
+    def _on_entry(self, ts: int, book: _SymbolBook, order: _Order):
+        if book.pending_entry is not order:
+            return  # cancelled
+        book.pending_entry = None
+        cfg = self.default_config
+        self._roll_day(ts)
+
+        cost = order.quantity * order.price
+        commission = cost * cfg["commission_percent"]
+        reason = None
+        if cost + commission > self._cash:
+            reason = "Insufficient cash for buy."
+        elif self._buy_amount + cost > cfg["max_daily_buy_amount"]:
+            reason = "Max daily buy amount exceeded."
+        elif self._trade_count + 1 > cfg["max_daily_trades"]:
+            reason = "Max daily trades exceeded."
+        if reason:
+            self._reject(ts, book, "Buy", order.quantity, order.price, reason)
+            self._schedule_signal(book, order.fill_bar - 1)
+            return
+
+        self._cash -= cost + commission
+        self._trade_count += 1
+        self._buy_amount += cost
+        book.position = order.quantity
+        book.entry_price = order.price
+        book.exit_version += 1
+        self._record(ts, book, "Buy", order.quantity, order.price, order.order_type, 0.0)
+
+        self._schedule_protective_exit(book, order)
+        self._schedule_signal(book, order.fill_bar - 1)
+
+    def _on_exit(self, ts: int, book: _SymbolBook, version: int, bar: int, price: float, order_type: str):
+        if version != book.exit_version or book.position == 0:
+            return  # position already closed
+        cfg = self.default_config
+        self._roll_day(ts)
+
+        quantity = book.position
+        value = quantity * price
+        # Protective exits always execute; strategy sells go through the daily limits
+        if order_type == "signal":
+            reason = None
+            if self._sell_amount + value > cfg["max_daily_sell_amount"]:
+                reason = "Max daily sell amount exceeded."
+            elif self._trade_count + 1 > cfg["max_daily_trades"]:
+                reason = "Max daily trades exceeded."
+            if reason:
+                self._reject(ts, book, "Sell", quantity, price, reason)
+                return
+
+        commission = value * cfg["commission_percent"]
+        self._cash += value - commission
+        self._trade_count += 1
+        self._sell_amount += value
+        pnl = (price - book.entry_price) * quantity - commission
+        book.position = 0
+        book.exit_version += 1
+        self._record(ts, book, "Sell", quantity, price, "market" if order_type == "signal" else order_type, pnl)
+        self._schedule_signal(book, bar - 1)
+
+    # -- run ---------------------------------------------------------------
+
+    def run(self, bars: Dict[str, pd.DataFrame]) -> SimulationResult:
+        """Replay bars for all symbols and return the ledger and equity curve"""
+        started = time.perf_counter()
+        books = []
+        for symbol, df in bars.items():
+            if df.empty:
+                continue
+            books.append(_SymbolBook(symbol, df, self.strategy.generate_signal_frame(df)))
+        signals_done = time.perf_counter()
+
+        self._events = []
+        self._sequence = itertools.count()
+        self._cash = float(self.default_config["initial_cash"])
+        self._day = None
+        self._trade_count = 0
+        self._buy_amount = 0.0
+        self._sell_amount = 0.0
+        self._trades = []
+        self._rejections = []
+
+        for book in books:
+            self._schedule_signal(book, -1)
+
+        processed = 0
+        while self._events:
+            ts, _, _, kind, book, version, payload = heapq.heappop(self._events)
+            processed += 1
+            if kind == _SIGNAL:
+                if version == book.signal_version:
+                    self._on_signal(book, payload)
+            elif kind == _ENTRY:
+                self._on_entry(ts, book, payload)
+            else:
+                self._on_exit(ts, book, version, *payload)
+
+        ledger = pd.DataFrame(self._trades, columns=["timestamp", "symbol", "side", "quantity", "price",
+                                                     "value", "order_type", "pnl", "cash_after"])
+        ledger["timestamp"] = pd.to_datetime(ledger["timestamp"])
+        rejections = pd.DataFrame(self._rejections, columns=["timestamp", "symbol", "side", "quantity",
+                                                             "price", "reason"])
+        # Expired limit orders are rejected when placed, stamped with their expiry bar
+        rejections = rejections.sort_values("timestamp", kind="stable", ignore_index=True)
+        rejections["timestamp"] = pd.to_datetime(rejections["timestamp"])
+        equity_curve = self._equity_curve(books)
+
+        summary = self._summarize(books, ledger, rejections, equity_curve)
+        summary["events_processed"] = processed
+        summary["signal_seconds"] = round(signals_done - started, 2)
+        summary["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+        return SimulationResult(ledger, rejections, equity_curve, summary)
+
+    def _equity_curve(self, books: List[_SymbolBook]) -> pd.DataFrame:
+        """Cash, holdings value and equity sampled per equity_interval (vectorized per symbol)"""
+        interval = self.default_config["equity_interval"]
+        if not books:
+            return pd.DataFrame(columns=["cash", "holdings_value", "equity"])
+
+        if interval:
+            step = pd.Timedelta(interval).value
+            sample_points = []
+            for book in books:
+                bucket = book.ts // step
+                last_in_bucket = np.flatnonzero(np.diff(bucket, append=bucket[-1] + 1))
+                sample_points.append(book.ts[last_in_bucket])
+            grid = np.unique(np.concatenate(sample_points))
+        else:
+            grid = np.unique(np.concatenate([book.ts for book in books]))
+
+        initial_cash = float(self.default_config["initial_cash"])
+        trades = self._trades
+        trade_ts = np.array([t[0] for t in trades], dtype="int64")
+        cash_after = np.array([t[8] for t in trades], dtype=float)
+        k = np.searchsorted(trade_ts, grid, side="right")
+        cash = np.where(k > 0, cash_after[np.maximum(k - 1, 0)] if len(trades) else initial_cash, initial_cash)
+
+        holdings = np.zeros(len(grid))
+        fills_by_symbol: Dict[str, List[tuple]] = {}
+        for t in trades:
+            fills_by_symbol.setdefault(t[1], []).append((t[0], t[3] if t[2] == "Buy" else -t[3]))
+        for book in books:
+            fills = fills_by_symbol.get(book.symbol)
+            if not fills:
+                continue
+            fill_ts = np.array([f[0] for f in fills], dtype="int64")
+            quantity = np.cumsum([f[1] for f in fills])
+            held = np.searchsorted(fill_ts, grid, side="right")
+            qty = np.where(held > 0, quantity[np.maximum(held - 1, 0)], 0)
+            bar = np.searchsorted(book.ts, grid, side="right") - 1
+            price = np.where(bar >= 0, book.close[np.maximum(bar, 0)], 0.0)
+            holdings += qty * price
+
+        return pd.DataFrame({
+            "cash": np.round(cash, 2),
+            "holdings_value": np.round(holdings, 2),
+            "equity": np.round(cash + holdings, 2)
+        }, index=pd.to_datetime(grid))
+
+    def _summarize(self, books, ledger, rejections, equity_curve) -> Dict[str, Any]:
+        initial_cash = float(self.default_config["initial_cash"])
+        final_equity = float(equity_curve["equity"].iloc[-1]) if len(equity_curve) else initial_cash
+        drawdown = 0.0
+        if len(equity_curve):
+            equity = equity_curve["equity"].to_numpy()
+            drawdown = float(((np.maximum.accumulate(equity) - equity) / np.maximum.accumulate(equity)).max())
+        sells = ledger[ledger["side"] == "Sell"]
+        return {
+            "strategy": self.strategy.name,
+            "symbols": len(books),
+            "bars": int(sum(len(book) for book in books)),
+            "initial_cash": initial_cash,
+            "final_equity": round(final_equity, 2),
+            "total_return_percent": round((final_equity / initial_cash - 1) * 100, 2),
+            "max_drawdown_percent": round(drawdown * 100, 2),
+            "trades": len(ledger),
+            "round_trips": len(sells),
+            "win_rate": round(float((sells["pnl"] > 0).mean()), 3) if len(sells) else 0.0,
+            "realized_pnl": round(float(sells["pnl"].sum()), 2),
+            "rejections": len(rejections),
+            "open_positions": sum(1 for book in books if book.position)
+        }
+
+
+if __name__ == "__main__":
+    from strategies import STRATEGY_REGISTRY
+
+    parser = argparse.ArgumentParser(description="Replay stored bars through a strategy in paper-trading mode")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bars-dir", help="Directory with one <SYMBOL>.parquet/.pkl/.csv per symbol")
+    source.add_argument("--feature-store", metavar="INTERVAL",
+                        help="Read bars of this interval from the feature store (FEATURE_STORE_DIR) instead")
+    parser.add_argument("--start", default=None, help="First bar to replay (with --feature-store)")
+    parser.add_argument("--end", default=None, help="Last bar to replay (with --feature-store)")
+    parser.add_argument("--strategy", default="moving_average", choices=sorted(STRATEGY_REGISTRY))
+    parser.add_argument("--symbols", default=None, help="Comma-separated subset of symbols")
+    parser.add_argument("--initial-cash", type=float, default=100000.0)
+    parser.add_argument("--entry-order", choices=["market", "limit"], default="market")
+    parser.add_argument("--equity-interval", default="1D", help="Equity curve sampling interval (pandas offset)")
+    parser.add_argument("--ledger", default=None, help="Write the trade ledger CSV here")
+    parser.add_argument("--equity", default=None, help="Write the equity curve CSV here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    symbols = args.symbols.split(",") if args.symbols else None
+    if args.feature_store:
+        from feature_store import FeatureStore
+        bars = FeatureStore.from_env().load_bars(args.feature_store, symbols, args.start, args.end)
+    else:
+        bars = load_bars(args.bars_dir, symbols)
+    simulator = PaperTradingSimulator(STRATEGY_REGISTRY[args.strategy](), {
+        "initial_cash": args.initial_cash,
+        "entry_order": args.entry_order,
+        "equity_interval": args.equity_interval
+    })
+    result = simulator.run(bars)
+
+    if args.ledger:
+        result.ledger.to_csv(args.ledger, index=False)
+    if args.equity:
+        result.equity_curve.to_csv(args.equity)
+    for key, value in result.summary.items():
+        print(f"{key}: {value}")
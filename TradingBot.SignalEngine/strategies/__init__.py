@@ -1,9 +1,9 @@
 from .basic import BasicStrategy
-from .moving_average import MovingAverageCrossoverStrategy
-from .ai_strategy import AIEnhancedStrategy
+from .moving_average import MovingAverageStrategy
+from .ai_strategy import AIStrategy
 
 STRATEGY_REGISTRY = {
     "basic": BasicStrategy,
-    "moving_average": MovingAverageCrossoverStrategy,
-    "ai": AIEnhancedStrategy
-}
\ No newline at end of file
+    "moving_average": MovingAverageStrategy,
+    "ai": AIStrategy
+}
@@ -2,7 +2,10 @@ import pandas as pd
 from datetime import datetime
 import os
 import json
-from .base import BaseStrategy, TradeSignal
+from typing import Dict
+from .base import BaseStrategy, TradeSignal, SIGNAL_ROWS, DEFAULT_EMA_PRECISION
+from .local_model import LocalModel, build_feature_matrix, stack_frames
+from .moving_average import MovingAverageStrategy
 
 class AIStrategy(BaseStrategy):
     def __init__(self, config=None):
@@ -17,7 +20,11 @@ class AIStrategy(BaseStrategy):
             "temperature": 0.3,
             "target_percent": 0.04,   # 4% target
             "stop_loss_percent": 0.025,  # 2.5% stop loss
-            "fallback_strategy": "moving_average"
+            "fallback_strategy": "moving_average",
+            "mode": os.getenv("AI_STRATEGY_MODE", "llm"),  # "llm" or "local"
+            "model_path": os.getenv("AI_MODEL_PATH", ""),  # local model file (see local_model.py)
+            "buy_threshold": 0.6,   # P(up) at or above which a one-output model says Buy
+            "sell_threshold": 0.4   # P(up) at or below which it says Sell
         }
         
         # Merge with provided config
@@ -34,29 +41,101 @@ class AIStrategy(BaseStrategy):
             except ImportError:
                 print("OpenAI library not installed. Install with: pip install openai")
 
+        # Local model inference replaces the LLM call when configured
+        self.local_model = None
+        if self.default_config["mode"] == "local":
+            try:
+                self.local_model = LocalModel.load(self.default_config["model_path"])
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not load local model '{self.default_config['model_path']}': {e}. "
+                      f"Falling back to technical analysis.")
+
+        # Reused for every technical fallback signal
+        self.fallback_strategy = MovingAverageStrategy()
+
+    @property
+    def batch_scoring(self) -> bool:
+        return self.local_model is not None
+
+    def required_lookback(self, precision: float = None) -> int:
+        """
+        SMA_20/50, RSI, MACD and Bollinger Bands for the market summary, and
+        whatever the moving average fallback needs.
+        """
+        precision = precision or self.config.get("ema_precision", DEFAULT_EMA_PRECISION)
+        own = max(50, 20, 10, self._rsi_lookback(14), self._macd_lookback(precision)) + SIGNAL_ROWS - 1
+        return max(own, self.fallback_strategy.required_lookback(precision))
+
     def generate_signal(self, df: pd.DataFrame, symbol: str) -> TradeSignal:
         """
         Generate trading signal using AI analysis combined with technical indicators.
         
         Strategy:
-        1. Calculate technical indicators
-        2. Prepare market data summary
+        1. Score with the local model if one is loaded
+        2. Otherwise calculate technical indicators and prepare a market summary
         3. Use AI to analyze and generate signal
         4. Fallback to technical analysis if AI fails
         """
-        # Calculate technical indicators
-        df = self.calculate_technical_indicators(df)
-        
+        if self.local_model is not None:
+            return self.generate_signals({symbol: df})[symbol]
+
         # Try AI analysis first
         if self.openai_client:
             try:
-                return self._generate_ai_signal(df, symbol)
+                return self._generate_ai_signal(self.calculate_technical_indicators(df), symbol)
             except Exception as e:
                 print(f"AI analysis failed: {e}. Falling back to technical analysis.")
         
-        # Fallback to technical analysis
+        # Fallback to technical analysis (computes its own indicators)
         return self._generate_technical_signal(df, symbol)
 
+    def generate_signals(self, frames: Dict[str, pd.DataFrame]) -> Dict[str, TradeSignal]:
+        """
+        Score every symbol with the local model in one pass: one feature
+        matrix for all symbols, one matrix operation for the scores.
+        """
+        if self.local_model is None:
+            return super().generate_signals(frames)
+
+        cfg = self.default_config
+        close, volume = stack_frames(frames, max([0] + [len(df) for df in frames.values()]))
+        features = build_feature_matrix(close, volume, list(frames))
+        actions, confidences = self.local_model.predict(features, cfg["buy_threshold"], cfg["sell_threshold"])
+        missing = features[self.local_model.features].isna().any(axis=1).to_numpy()
+
+        signals = {}
+        timestamp = datetime.now().isoformat()
+        for symbol, current_price, action, confidence, incomplete in zip(
+                features.index, close[-1], actions, confidences, missing):
+            target, stop_loss = self._calculate_target_and_stop_loss(
+                float(current_price), action, cfg["target_percent"], cfg["stop_loss_percent"]
+            )
+            if incomplete:
+                reasoning = "Not enough history for the local model's features"
+            else:
+                reasoning = f"Local {self.local_model.type} model: {action} with probability {confidence:.2f}"
+            signals[symbol] = TradeSignal(
+                symbol=symbol,
+                action=action,
+                target=target,
+                stop_loss=stop_loss,
+                confidence=float(confidence),
+                strategy=self.name,
+                reasoning=reasoning,
+                timestamp=timestamp
+            )
+        return signals
+
+    def generate_signal_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Replay with the local model bar by bar if one is loaded, otherwise
+        with the moving average fallback's vectorized signals. The LLM is
+        never called during a replay: that would be one API call per bar.
+        """
+        if self.local_model is None:
+            return self.fallback_strategy.generate_signal_frame(df)
+        return super().generate_signal_frame(df)
+
     def _generate_ai_signal(self, df: pd.DataFrame, symbol: str) -> TradeSignal:
         """Generate signal using OpenAI API"""
         # Prepare market data summary
@@ -91,10 +170,7 @@ class AIStrategy(BaseStrategy):
     def _generate_technical_signal(self, df: pd.DataFrame, symbol: str) -> TradeSignal:
         """Fallback technical analysis signal"""
         # Use moving average strategy as fallback
-        from .moving_average import MovingAverageStrategy
-        
-        fallback_strategy = MovingAverageStrategy()
-        return fallback_strategy.generate_signal(df, symbol)
+        return self.fallback_strategy.generate_signal(df, symbol)
 
     def _prepare_market_summary(self, df: pd.DataFrame, symbol: str) -> dict:
         """Prepare market data summary for AI analysis"""
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import math
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from pydantic import BaseModel
@@ -13,12 +15,78 @@ class TradeSignal(BaseModel):
     strategy: str
     reasoning: str
     timestamp: str
+    metadata: Optional[Dict[str, Any]] = None
+
+# Weight an EMA may still give to bars before the trimmed window
+DEFAULT_EMA_PRECISION = 1e-3
+
+# Strategies compare the latest row with the one before it
+SIGNAL_ROWS = 2
+
+def ema_warmup_bars(span: int, precision: float = DEFAULT_EMA_PRECISION) -> int:
+    """
+    Number of bars after which an EMA of the given span has forgotten its
+    starting point, i.e. the weight left on older bars is below `precision`.
+    """
+    alpha = 2.0 / (span + 1)
+    return int(math.ceil(math.log(precision) / math.log(1 - alpha)))
+
+def rsi_lookback(period: int = 14) -> int:
+    """Bars needed for rsi() (one extra for the first diff)"""
+    return period + 1
+
+def macd_lookback(precision: float, fast: int = 12, slow: int = 26, signal: int = 9) -> int:
+    """Bars needed for macd(): slow EMA warm-up, then the signal EMA's"""
+    return ema_warmup_bars(max(fast, slow), precision) + ema_warmup_bars(signal, precision)
+
+# Indicator formulas, shared by the strategies and the feature store (feature_store.py)
+
+def sma(prices: pd.Series, window: int) -> pd.Series:
+    """Simple moving average"""
+    return prices.rolling(window=window).mean()
+
+def rsi(prices: pd.Series, period: int = 14) -> pd.Series:
+    """Calculate RSI indicator"""
+    delta = prices.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+def macd(prices: pd.Series, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple:
+    """Calculate MACD indicator: (macd, signal, histogram)"""
+    ema_fast = prices.ewm(span=fast).mean()
+    ema_slow = prices.ewm(span=slow).mean()
+    macd_line = ema_fast - ema_slow
+    macd_signal = macd_line.ewm(span=signal).mean()
+    return macd_line, macd_signal, macd_line - macd_signal
+
+def bollinger_bands(prices: pd.Series, period: int = 20, std_dev: float = 2) -> tuple:
+    """Calculate Bollinger Bands: (upper, middle, lower)"""
+    middle = sma(prices, period)
+    std = prices.rolling(window=period).std()
+    return middle + (std * std_dev), middle, middle - (std * std_dev)
 
 class BaseStrategy(ABC):
+    # True when generate_signals() scores all symbols in one pass
+    batch_scoring = False
+
     def __init__(self, config: Dict[str, Any] = None):
         self.config = config or {}
         self.name = self.__class__.__name__
 
+    def required_lookback(self, precision: float = None) -> int:
+        """
+        Minimum number of trailing bars the strategy needs for its signal to
+        be accurate: the longest indicator window (or EMA warm-up for the
+        given precision) plus the rows the signal logic compares.
+
+        The default covers everything calculate_technical_indicators()
+        computes; strategies that use fewer indicators override it.
+        """
+        precision = precision or self.config.get("ema_precision", DEFAULT_EMA_PRECISION)
+        return max(200, 20, self._rsi_lookback(14), self._macd_lookback(precision)) + SIGNAL_ROWS - 1
+
     @abstractmethod
     def generate_signal(self, df: pd.DataFrame, symbol: str) -> TradeSignal:
         """
@@ -33,6 +101,44 @@ class BaseStrategy(ABC):
         """
         pass
 
+    def generate_signals(self, frames: Dict[str, pd.DataFrame]) -> Dict[str, TradeSignal]:
+        """
+        Generate signals for several symbols at once.
+
+        The default calls generate_signal() per symbol; strategies that can
+        score every symbol in one pass override it and set batch_scoring.
+
+        Args:
+            frames (Dict[str, pd.DataFrame]): Market data per symbol
+
+        Returns:
+            Dict[str, TradeSignal]: Signal per symbol
+        """
+        return {symbol: self.generate_signal(df, symbol) for symbol, df in frames.items()}
+
+    def generate_signal_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Generate the signal for every bar of df, as if generate_signal() had
+        been called with the history up to and including that bar. Used by
+        the paper-trading simulator to replay history.
+
+        The default replays generate_signal() over a trailing lookback window
+        per bar, which is correct but slow; strategies override it with a
+        vectorized version.
+
+        Args:
+            df (pd.DataFrame): Market data with OHLCV columns
+
+        Returns:
+            pd.DataFrame: action, confidence, target and stop_loss per bar
+        """
+        window = self.required_lookback()
+        rows = []
+        for i in range(len(df)):
+            signal = self.generate_signal(df.iloc[max(0, i - window + 1):i + 1], "")
+            rows.append((signal.action, signal.confidence, signal.target, signal.stop_loss))
+        return pd.DataFrame(rows, index=df.index, columns=["action", "confidence", "target", "stop_loss"])
+
     def calculate_technical_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Calculate common technical indicators for the strategy.
@@ -47,46 +153,26 @@ class BaseStrategy(ABC):
         df = df.copy()
         
         # Moving averages
-        df['SMA_20'] = df['Close'].rolling(window=20).mean()
-        df['SMA_50'] = df['Close'].rolling(window=50).mean()
-        df['SMA_200'] = df['Close'].rolling(window=200).mean()
+        df['SMA_20'] = sma(df['Close'], 20)
+        df['SMA_50'] = sma(df['Close'], 50)
+        df['SMA_200'] = sma(df['Close'], 200)
         
         # RSI
-        df['RSI_14'] = self._calculate_rsi(df['Close'], 14)
+        df['RSI_14'] = rsi(df['Close'], 14)
         
         # MACD
-        df['MACD'], df['MACD_Signal'], df['MACD_Histogram'] = self._calculate_macd(df['Close'])
+        df['MACD'], df['MACD_Signal'], df['MACD_Histogram'] = macd(df['Close'])
         
         # Bollinger Bands
-        df['BB_Upper'], df['BB_Middle'], df['BB_Lower'] = self._calculate_bollinger_bands(df['Close'])
+        df['BB_Upper'], df['BB_Middle'], df['BB_Lower'] = bollinger_bands(df['Close'])
         
         return df
 
-    def _calculate_rsi(self, prices: pd.Series, period: int = 14) -> pd.Series:
-        """Calculate RSI indicator"""
-        delta = prices.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
-
-    def _calculate_macd(self, prices: pd.Series, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple:
-        """Calculate MACD indicator"""
-        ema_fast = prices.ewm(span=fast).mean()
-        ema_slow = prices.ewm(span=slow).mean()
-        macd = ema_fast - ema_slow
-        macd_signal = macd.ewm(span=signal).mean()
-        macd_histogram = macd - macd_signal
-        return macd, macd_signal, macd_histogram
-
-    def _calculate_bollinger_bands(self, prices: pd.Series, period: int = 20, std_dev: int = 2) -> tuple:
-        """Calculate Bollinger Bands"""
-        sma = prices.rolling(window=period).mean()
-        std = prices.rolling(window=period).std()
-        upper_band = sma + (std * std_dev)
-        lower_band = sma - (std * std_dev)
-        return upper_band, sma, lower_band
+    def _rsi_lookback(self, period: int = 14) -> int:
+        return rsi_lookback(period)
+
+    def _macd_lookback(self, precision: float, fast: int = 12, slow: int = 26, signal: int = 9) -> int:
+        return macd_lookback(precision, fast, slow, signal)
 
     def _get_current_price(self, df: pd.DataFrame) -> float:
         """Get the current (latest) price"""
@@ -106,4 +192,16 @@ class BaseStrategy(ABC):
             target = current_price
             stop_loss = current_price
             
-        return round(target, 2), round(stop_loss, 2)
\ No newline at end of file
+        return round(target, 2), round(stop_loss, 2)
+
+    def _signal_frame(self, close: pd.Series, action: np.ndarray, confidence: np.ndarray,
+                      target_percent: float, stop_loss_percent: float) -> pd.DataFrame:
+        """Vectorized counterpart of _calculate_target_and_stop_loss for a whole series"""
+        price = close.to_numpy(dtype=float)
+        direction = np.select([action == "Buy", action == "Sell"], [1.0, -1.0], 0.0)
+        return pd.DataFrame({
+            "action": action,
+            "confidence": confidence,
+            "target": np.round(price * (1 + direction * target_percent), 2),
+            "stop_loss": np.round(price * (1 - direction * stop_loss_percent), 2)
+        }, index=close.index)
\ No newline at end of file
@@ -1,6 +1,7 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from .base import BaseStrategy, TradeSignal
+from .base import BaseStrategy, TradeSignal, SIGNAL_ROWS
 
 class BasicStrategy(BaseStrategy):
     def __init__(self, config=None):
@@ -19,6 +20,31 @@ class BasicStrategy(BaseStrategy):
         if config:
             self.default_config.update(config)
 
+    def required_lookback(self, precision: float = None) -> int:
+        """RSI_14 and a 10-bar volume average over the last two rows"""
+        return max(self._rsi_lookback(14), 10) + SIGNAL_ROWS - 1
+
+    def generate_signal_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Vectorized generate_signal() for every bar (same rules, no reasoning text)"""
+        ind = self.calculate_technical_indicators(df)
+        cfg = self.default_config
+        price_threshold = cfg["price_change_threshold"]
+
+        # The first bar compares against itself, like generate_signal()
+        price_change = ind['Close'].pct_change().fillna(0.0) if len(ind) else ind['Close']
+        avg_volume = ind['Volume'].rolling(window=10).mean()
+        volume_ratio = (ind['Volume'] / avg_volume).where(avg_volume > 0, 1.0)
+        rsi = ind['RSI_14']
+
+        buy = (price_change > price_threshold) & (volume_ratio > cfg["volume_threshold"]) & (rsi < 70)
+        price_drop = price_change < -price_threshold
+        sell = ~buy & (price_drop | (rsi > 70))
+
+        action = np.select([buy, sell], ["Buy", "Sell"], "Hold")
+        confidence = np.select([buy, sell & price_drop, sell], [0.7, 0.7, 0.6], 0.5)
+        return self._signal_frame(ind['Close'], action, confidence,
+                                  cfg["target_percent"], cfg["stop_loss_percent"])
+
     def generate_signal(self, df: pd.DataFrame, symbol: str) -> TradeSignal:
         """
         Generate trading signal based on simple price action and volume.
@@ -0,0 +1,215 @@
+"""
+NumPy-only models for AIStrategy's local inference mode.
+
+A model is a JSON file with a feature list (names from FEATURE_NAMES), an
+optional standardisation (mean/scale) and either linear weights or a tree
+ensemble. Scores for all rows are computed in one matrix pass:
+
+    {"type": "linear", "features": [...], "mean": [...], "scale": [...],
+     "weights": [[...], ...], "bias": [...], "classes": ["Sell", "Hold", "Buy"]}
+
+    {"type": "tree_ensemble", "features": [...], "base_score": [...],
+     "classes": [...], "trees": [{"feature": [...], "threshold": [...],
+     "left": [...], "right": [...], "value": [[...], ...]}, ...]}
+
+With "classes" the scores are softmaxed and the arg-max class is the
+action. Without it the model has one output, read as the logit of an up
+move, and mapped to Buy/Sell/Hold by AIStrategy's probability thresholds.
+Tree nodes with left == -1 are leaves; a row goes left when
+x[feature] <= threshold.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+FEATURE_NAMES = [
+    "return_1",         # close / previous close - 1
+    "volume_ratio",     # volume / 10-bar average volume
+    "rsi_14",           # RSI / 100
+    "close_to_sma_20",  # close / SMA 20 - 1
+    "close_to_sma_50",  # close / SMA 50 - 1
+    "sma_20_slope",     # SMA 20 / previous SMA 20 - 1
+    "sma_50_slope",     # SMA 50 / previous SMA 50 - 1
+    "macd",             # MACD / close
+    "macd_signal",      # MACD signal / close
+    "macd_histogram",   # MACD histogram / close
+    "bb_position"       # (close - lower band) / (upper band - lower band)
+]
+
+ACTIONS = ("Buy", "Sell", "Hold")
+
+# Bars the features need: SMA 50 and its previous value
+FEATURE_LOOKBACK = 51
+
+
+def _ewm_mean(values: np.ndarray, span: int) -> np.ndarray:
+    """
+    pandas' ewm(span=span).mean() (adjust=True, ignore_na=False) down the
+    rows of a 2-D array, all columns at once. Leading NaNs stay NaN.
+    """
+    decay = 1 - 2.0 / (span + 1)
+    numerator = np.zeros(values.shape[1])
+    denominator = np.zeros(values.shape[1])
+    out = np.empty_like(values)
+    for t in range(len(values)):
+        observed = ~np.isnan(values[t])
+        numerator = numerator * decay + np.where(observed, values[t], 0.0)
+        denominator = denominator * decay + observed
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[t] = numerator / denominator
+    return out
+
+
+def stack_frames(frames: Dict[str, pd.DataFrame], bars: int) -> tuple:
+    """
+    Last `bars` closes and volumes of every frame as (bars x symbols)
+    matrices, aligned on the latest bar and NaN-padded at the top.
+    """
+    bars = max(bars, FEATURE_LOOKBACK)
+    close = np.full((bars, len(frames)), np.nan)
+    volume = np.full((bars, len(frames)), np.nan)
+    for j, df in enumerate(frames.values()):
+        n = min(bars, len(df))
+        if n:
+            close[bars - n:, j] = df['Close'].to_numpy(dtype=float)[-n:]
+            volume[bars - n:, j] = df['Volume'].to_numpy(dtype=float)[-n:]
+    return close, volume
+
+
+def build_feature_matrix(close: np.ndarray, volume: np.ndarray, symbols: List[str]) -> pd.DataFrame:
+    """
+    Features at the last row of stack_frames() matrices, one row per symbol,
+    computed for all symbols at once. Formulas mirror BaseStrategy's
+    indicators (SMA-based RSI, MACD 12/26/9, Bollinger 20/2). Symbols with
+    fewer than FEATURE_LOOKBACK bars get NaN features.
+    """
+    last, prev = close[-1], close[-2]
+    sma_20, prev_sma_20 = close[-20:].mean(axis=0), close[-21:-1].mean(axis=0)
+    sma_50, prev_sma_50 = close[-50:].mean(axis=0), close[-51:-1].mean(axis=0)
+    std_20 = close[-20:].std(axis=0, ddof=1)
+
+    delta = np.diff(close[-15:], axis=0)
+    gain = np.where(delta > 0, delta, 0.0).mean(axis=0)
+    loss = np.where(delta < 0, -delta, 0.0).mean(axis=0)
+
+    macd_line = _ewm_mean(close, 12) - _ewm_mean(close, 26)
+    macd = macd_line[-1]
+    macd_signal = _ewm_mean(macd_line, 9)[-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features = np.column_stack([
+            last / prev - 1,
+            volume[-1] / volume[-10:].mean(axis=0),
+            (100 - 100 / (1 + gain / loss)) / 100,
+            last / sma_20 - 1,
+            last / sma_50 - 1,
+            sma_20 / prev_sma_20 - 1,
+            sma_50 / prev_sma_50 - 1,
+            macd / last,
+            macd_signal / last,
+            (macd - macd_signal) / last,
+            (last - (sma_20 - 2 * std_20)) / (4 * std_20)
+        ])
+    features[~np.isfinite(features)] = np.nan
+    features[np.isnan(close[-FEATURE_LOOKBACK])] = np.nan
+    return pd.DataFrame(features, index=symbols, columns=FEATURE_NAMES)
+
+
+class LocalModel:
+    def __init__(self, spec: dict):
+        self.type = spec.get("type")
+        self.features: List[str] = list(spec["features"])
+        unknown = [f for f in self.features if f not in FEATURE_NAMES]
+        if unknown:
+            raise ValueError(f"Model uses unknown features: {unknown}")
+        self.classes: Optional[List[str]] = spec.get("classes")
+        if self.classes is not None and any(c not in ACTIONS for c in self.classes):
+            raise ValueError(f"Model classes must be among {ACTIONS}")
+        outputs = len(self.classes) if self.classes else 1
+
+        width = len(self.features)
+        self.mean = np.asarray(spec.get("mean", np.zeros(width)), dtype=float)
+        self.scale = np.asarray(spec.get("scale", np.ones(width)), dtype=float)
+        if self.mean.shape != (width,) or self.scale.shape != (width,):
+            raise ValueError("mean and scale must have one value per feature")
+
+        if self.type == "linear":
+            self.weights = np.asarray(spec["weights"], dtype=float).reshape(width, outputs)
+            self.bias = np.asarray(spec.get("bias", np.zeros(outputs)), dtype=float).reshape(outputs)
+        elif self.type == "tree_ensemble":
+            self._load_trees(spec["trees"], outputs)
+            self.base_score = np.asarray(spec.get("base_score", np.zeros(outputs)), dtype=float).reshape(outputs)
+        else:
+            raise ValueError(f"Unsupported model type '{self.type}'")
+
+    @classmethod
+    def load(cls, path: str) -> "LocalModel":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _load_trees(self, trees: list, outputs: int):
+        """Pad all trees into (trees, nodes) arrays so they are walked together"""
+        nodes = max(len(tree["left"]) for tree in trees)
+        count = len(trees)
+        self.tree_feature = np.zeros((count, nodes), dtype=np.int64)
+        self.tree_threshold = np.zeros((count, nodes))
+        self.tree_left = np.full((count, nodes), -1, dtype=np.int64)
+        self.tree_right = np.full((count, nodes), -1, dtype=np.int64)
+        self.tree_value = np.zeros((count, nodes, outputs))
+        for t, tree in enumerate(trees):
+            n = len(tree["left"])
+            self.tree_feature[t, :n] = np.maximum(np.asarray(tree["feature"], dtype=np.int64), 0)
+            self.tree_threshold[t, :n] = tree["threshold"]
+            self.tree_left[t, :n] = tree["left"]
+            self.tree_right[t, :n] = tree["right"]
+            self.tree_value[t, :n] = np.asarray(tree["value"], dtype=float).reshape(n, outputs)
+        if self.tree_feature.max(initial=0) >= len(self.features):
+            raise ValueError("Tree splits on a feature index outside the feature list")
+        self.tree_depth = nodes
+
+    def scores(self, X: np.ndarray) -> np.ndarray:
+        """Raw model output, shape (rows, outputs)"""
+        X = (X - self.mean) / self.scale
+        if self.type == "linear":
+            return X @ self.weights + self.bias
+
+        rows = np.arange(len(X))[:, None]
+        trees = np.arange(self.tree_left.shape[0])[None, :]
+        node = np.zeros((len(X), self.tree_left.shape[0]), dtype=np.int64)
+        for _ in range(self.tree_depth):
+            left = self.tree_left[trees, node]
+            internal = left >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, self.tree_feature[trees, node]] <= self.tree_threshold[trees, node]
+            node = np.where(internal, np.where(go_left, left, self.tree_right[trees, node]), node)
+        return self.tree_value[trees, node].sum(axis=1) + self.base_score
+
+    def predict(self, features: pd.DataFrame, buy_threshold: float = 0.6,
+                sell_threshold: float = 0.4) -> tuple:
+        """
+        (action, confidence) arrays for every row of the feature matrix.
+        Rows with missing features are Hold with confidence 0.5.
+        """
+        X = features[self.features].to_numpy(dtype=float)
+        valid = ~np.isnan(X).any(axis=1)
+        action = np.full(len(X), "Hold", dtype=object)
+        confidence = np.full(len(X), 0.5)
+        if not valid.any():
+            return action, confidence
+
+        raw = self.scores(X[valid])
+        if self.classes:
+            exp = np.exp(raw - raw.max(axis=1, keepdims=True))
+            probability = exp / exp.sum(axis=1, keepdims=True)
+            best = probability.argmax(axis=1)
+            action[valid] = np.asarray(self.classes, dtype=object)[best]
+            confidence[valid] = probability[np.arange(len(best)), best]
+        else:
+            up = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            action[valid] = np.select([up >= buy_threshold, up <= sell_threshold], ["Buy", "Sell"], "Hold")
+            confidence[valid] = np.where(action[valid] == "Hold", 0.5, np.maximum(up, 1 - up))
+        return action, np.round(confidence, 4)
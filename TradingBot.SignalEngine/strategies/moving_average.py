@@ -1,6 +1,7 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from .base import BaseStrategy, TradeSignal
+from .base import BaseStrategy, TradeSignal, SIGNAL_ROWS
 
 class MovingAverageStrategy(BaseStrategy):
     def __init__(self, config=None):
@@ -23,6 +24,48 @@ class MovingAverageStrategy(BaseStrategy):
         if config:
             self.default_config.update(config)
 
+    def required_lookback(self, precision: float = None) -> int:
+        """Both moving averages, RSI and the 20-bar volume average over the last two rows"""
+        return max(
+            self.default_config["short_period"],
+            self.default_config["long_period"],
+            self._rsi_lookback(self.default_config["rsi_period"]),
+            20
+        ) + SIGNAL_ROWS - 1
+
+    def generate_signal_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Vectorized generate_signal() for every bar (same rules, no reasoning text)"""
+        ind = self.calculate_technical_indicators(df)
+        cfg = self.default_config
+
+        short_ma = ind[f'SMA_{cfg["short_period"]}']
+        long_ma = ind[f'SMA_{cfg["long_period"]}']
+        rsi = ind['RSI_14']
+        avg_volume = ind['Volume'].rolling(window=20).mean()
+
+        # The first bar compares against itself, like generate_signal()
+        prev_short_ma = short_ma.shift(1)
+        prev_long_ma = long_ma.shift(1)
+        if len(ind):
+            prev_short_ma.iloc[0] = short_ma.iloc[0]
+            prev_long_ma.iloc[0] = long_ma.iloc[0]
+
+        golden_cross = (prev_short_ma <= prev_long_ma) & (short_ma > long_ma)
+        death_cross = (short_ma < long_ma) & (prev_short_ma >= prev_long_ma)
+        buy = (short_ma > long_ma) & (rsi < cfg["rsi_overbought"]) & \
+            (ind['Volume'] > avg_volume * cfg["volume_threshold"])
+        sell = ~buy & ((rsi > cfg["rsi_overbought"]) | death_cross)
+
+        action = np.select([buy, sell], ["Buy", "Sell"], "Hold")
+        confidence = np.select(
+            [buy & golden_cross, buy & (rsi < cfg["rsi_oversold"]), buy,
+             sell & death_cross, sell & (rsi > cfg["rsi_overbought"]), sell],
+            [0.8, 0.7, 0.6, 0.8, 0.7, 0.6],
+            0.5
+        )
+        return self._signal_frame(ind['Close'], action, confidence,
+                                  cfg["target_percent"], cfg["stop_loss_percent"])
+
     def generate_signal(self, df: pd.DataFrame, symbol: str) -> TradeSignal:
         """
         Generate trading signal based on moving average crossover and RSI.
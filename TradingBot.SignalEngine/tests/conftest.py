@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The engine's modules are imported as top-level modules, as uvicorn does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_bars(rows: int = 300, seed: int = 0, freq: str = "D", start: str = "2023-01-02",
+              tz: str = None) -> pd.DataFrame:
+    """Synthetic random-walk OHLCV bars"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) * 1.005,
+        "Low": np.minimum(open_, close) * 0.995,
+        "Close": close,
+        "Volume": rng.integers(1_000, 10_000, rows).astype(float)
+    }, index=pd.date_range(start, periods=rows, freq=freq, tz=tz))
+
+
+@pytest.fixture
+def bars():
+    return make_bars()
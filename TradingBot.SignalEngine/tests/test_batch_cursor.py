@@ -0,0 +1,41 @@
+import time
+
+from batch_cursor import CursorStore
+from shared_cache import SharedCache
+
+SIGNALS = {"AAPL": ["BUY", 110.0, 95.0, 0.8], "MSFT": ["HOLD", None, None, 0.5]}
+
+
+def test_same_signals_give_the_same_cursor():
+    store = CursorStore()
+    cursor = store.save("basic", "1d", "3mo", SIGNALS)
+    assert store.save("basic", "1d", "3mo", dict(reversed(list(SIGNALS.items())))) == cursor
+    assert store.save("basic", "1d", "3mo", dict(SIGNALS, MSFT=["SELL", None, None, 0.5])) != cursor
+    assert store.load(cursor, "basic", "1d", "3mo") == SIGNALS
+
+
+def test_cursor_is_only_valid_for_its_request():
+    store = CursorStore()
+    cursor = store.save("basic", "1d", "3mo", SIGNALS)
+    assert store.load(cursor, "moving_average", "1d", "3mo") is None
+    assert store.load(cursor, "basic", "1h", "3mo") is None
+    assert store.load("unknown", "basic", "1d", "3mo") is None
+
+
+def test_least_recently_used_cursors_are_evicted():
+    store = CursorStore(max_entries=2)
+    first = store.save("basic", "1d", "3mo", {"A": [1]})
+    second = store.save("basic", "1d", "3mo", {"B": [1]})
+    store.load(first, "basic", "1d", "3mo")
+    store.save("basic", "1d", "3mo", {"C": [1]})
+    assert store.load(first, "basic", "1d", "3mo") is not None
+    assert store.load(second, "basic", "1d", "3mo") is None
+
+
+def test_cursors_resolve_across_workers_until_they_expire(tmp_path):
+    cache = SharedCache(str(tmp_path))
+    cursor = CursorStore(cache).save("basic", "1d", "3mo", SIGNALS)
+    assert CursorStore(cache).load(cursor, "basic", "1d", "3mo") == SIGNALS
+
+    cache.put_blob(("batch_cursor", cursor), cache.get_blob(("batch_cursor", cursor), ttl=60), time.time() - 120)
+    assert CursorStore(cache, ttl=60).load(cursor, "basic", "1d", "3mo") is None
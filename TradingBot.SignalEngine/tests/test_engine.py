@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+
+import engine
+from conftest import make_bars
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    """Mock yf.download the way yfinance answers: upper-case ticker columns"""
+    calls = []
+
+    def download(tickers, **kwargs):
+        calls.append(list(tickers))
+        frames = {t.upper(): make_bars(rows=200, seed=i, freq="30min") for i, t in enumerate(tickers)}
+        return pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+    monkeypatch.setattr(engine.yf, "download", download)
+    monkeypatch.setattr(engine, "_close_cache", {})
+    return calls
+
+
+def test_lowercase_symbols_get_signals(downloads):
+    results = engine.generate_signals(["aapl", "msft"])
+    assert [r["symbol"] for r in results] == ["aapl", "msft"]
+    assert all(r["reason"] != "No data found." for r in results)
+    assert downloads == [["AAPL", "MSFT"]]
+
+
+def test_case_variants_share_one_download(downloads):
+    results = engine.generate_signals(["AAPL", "aapl", " Aapl "])
+    assert downloads == [["AAPL"]]
+    assert results[0]["prediction"] == results[1]["prediction"] == results[2]["prediction"]
+
+
+def test_cached_closes_are_reused_within_ttl(downloads):
+    engine.generate_signals(["AAPL"])
+    engine.generate_signals(["aapl", "MSFT"])
+    assert downloads == [["AAPL"], ["MSFT"]]
+
+
+def test_stale_entries_are_evicted(downloads, monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(engine.time, "monotonic", lambda: clock["now"])
+    engine.generate_signals(["AAPL"])
+    clock["now"] += engine.CACHE_TTL_SECONDS + 1
+    engine.generate_signals(["MSFT"])
+    assert set(engine._close_cache) == {"MSFT"}
+
+
+def test_unknown_symbol_reports_no_data(downloads, monkeypatch):
+    monkeypatch.setattr(engine.yf, "download", lambda tickers, **kwargs: pd.DataFrame())
+    assert engine.generate_signal("NOPE")["reason"] == "No data found."
+
+
+def test_indicators_match_pandas_ta():
+    ta = pytest.importorskip("pandas_ta", minversion="0.3")
+    close = make_bars(rows=300, seed=3)["Close"]
+    frame = close.to_frame("AAPL")
+    expected = ta.macd(close)
+
+    pd.testing.assert_series_equal(engine._ema(frame, 20)["AAPL"], ta.ema(close, 20), check_names=False)
+    pd.testing.assert_series_equal(engine._rsi(frame, 14)["AAPL"], ta.rsi(close, 14), check_names=False)
+    macd, histogram = engine._macd(frame)
+    pd.testing.assert_series_equal(macd["AAPL"], expected["MACD_12_26_9"], check_names=False)
+    pd.testing.assert_series_equal(histogram["AAPL"], expected["MACDh_12_26_9"], check_names=False)
+
+
+def mixed_calendar_download(tickers, **kwargs):
+    """A regular-hours stock next to a 24/7 coin whose history starts later"""
+    frames = {}
+    for i, ticker in enumerate(tickers):
+        bars = make_bars(rows=2000, seed=i, freq="30min", start="2024-01-01")
+        if ticker == "BTC-USD":
+            frames[ticker] = bars.iloc[500:]
+        else:
+            hours = bars.index.indexer_between_time("14:30", "20:30")
+            frames[ticker] = bars.iloc[hours][bars.index[hours].dayofweek < 5]
+    return pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+
+def test_batching_with_another_calendar_does_not_change_a_signal(monkeypatch):
+    monkeypatch.setattr(engine.yf, "download", mixed_calendar_download)
+    monkeypatch.setattr(engine, "_close_cache", {})
+    batched = engine.generate_signals(["AAPL", "BTC-USD"])
+    monkeypatch.setattr(engine, "_close_cache", {})
+    assert engine.generate_signals(["AAPL"]) == batched[:1]
+
+    close = engine._align_latest(engine._download_closes(["AAPL", "BTC-USD"]))
+    alone = engine._align_latest(engine._download_closes(["AAPL"]))
+    # The stock's bars form one gap-free run ending on its latest bar
+    assert close["AAPL"].loc[close["AAPL"].first_valid_index():].notna().all()
+    for indicator in (lambda frame: engine._ema(frame, 20), engine._rsi, lambda frame: engine._macd(frame)[1]):
+        assert indicator(close)["AAPL"].iloc[-1] == pytest.approx(indicator(alone)["AAPL"].iloc[-1], rel=1e-12)
@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import feature_store
+from conftest import make_bars
+from feature_store import BAR_COLUMNS, FeatureStore, Indicator, parse_feature
+from strategies.basic import BasicStrategy
+
+FEATURES = ["sma(window=20)", "rsi(period=14)", "macd(fast=12,signal=9,slow=26)"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeatureStore(str(tmp_path / "store"))
+
+
+def assert_same(left: pd.DataFrame, right: pd.DataFrame, atol: float = 1e-9):
+    assert list(left.columns) == list(right.columns)
+    assert left.index.equals(right.index)
+    np.testing.assert_allclose(left.to_numpy(), right.to_numpy(), atol=atol, equal_nan=True)
+
+
+def test_indicator_frame_matches_calculate_technical_indicators(store):
+    bars = make_bars(rows=600, tz="America/New_York")
+    store.update("aapl", "1d", bars)
+    stored = store.indicator_frame("AAPL", "1d")
+    expected = BasicStrategy().calculate_technical_indicators(bars)
+
+    assert stored.index.equals(bars.index)
+    for column in stored.columns:
+        valid = stored[column].notna()
+        # Only the warm-up rows, which depend on where history starts, are left out
+        assert valid[400:].all()
+        np.testing.assert_allclose(stored[column][valid], expected[column][valid], rtol=1e-12)
+
+
+def test_appends_match_a_full_build(tmp_path, store):
+    bars = make_bars(rows=300)
+    for chunk in range(0, 300, 70):
+        store.update("AAPL", "1d", bars.iloc[chunk:chunk + 70], FEATURES)
+    full = FeatureStore(str(tmp_path / "full"))
+    full.update("AAPL", "1d", bars, FEATURES)
+
+    assert store.series("AAPL", "1d")["rows"] == 300
+    assert_same(store.read("AAPL", "1d"), full.read("AAPL", "1d"))
+
+
+def test_backfill_keeps_newer_bars(tmp_path, store):
+    bars = make_bars(rows=300)
+    store.update("AAPL", "1d", bars.iloc[150:], FEATURES)
+    result = store.update("AAPL", "1d", bars.iloc[:150])
+    full = FeatureStore(str(tmp_path / "full"))
+    full.update("AAPL", "1d", bars, FEATURES)
+
+    assert result["rows"] == 300 and result["from_row"] == 0
+    assert_same(store.read("AAPL", "1d"), full.read("AAPL", "1d"))
+
+
+def test_overlapping_bars_replace_stored_ones(store):
+    bars = make_bars(rows=100)
+    store.update("AAPL", "1d", bars, FEATURES)
+    revised = bars.iloc[[40, 99]].copy()
+    revised["Close"] *= 1.1
+    store.update("AAPL", "1d", revised)
+
+    stored = store.read("AAPL", "1d", ["Close", "sma(window=20)"])
+    expected = bars["Close"].copy()
+    expected.iloc[[40, 99]] *= 1.1
+    assert len(stored) == 100
+    np.testing.assert_allclose(stored["Close"], expected)
+    np.testing.assert_allclose(stored["sma(window=20)"][19:], expected.rolling(20).mean()[19:])
+
+
+def test_readers_keep_their_data_while_a_column_is_replaced(store):
+    bars = make_bars(rows=100)
+    store.update("AAPL", "1d", bars, FEATURES)
+    _, before = store.read_arrays("AAPL", "1d", ["Close"])
+    inode = os.stat(os.path.join(store.root, "1d", "AAPL", "Close.f64")).st_ino
+
+    store.update("AAPL", "1d", bars.iloc[:50] * 2)
+    assert os.stat(os.path.join(store.root, "1d", "AAPL", "Close.f64")).st_ino != inode
+    np.testing.assert_allclose(before["Close"], bars["Close"])
+    np.testing.assert_allclose(store.read("AAPL", "1d", ["Close"])["Close"][:50], bars["Close"][:50] * 2)
+
+
+def wilder_rsi(prices: pd.Series, period: int) -> pd.Series:
+    delta = prices.diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / period, adjust=False).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / period, adjust=False).mean()
+    return 100 - 100 / (1 + gain / loss)
+
+
+def test_changed_formula_rebuilds_its_columns(tmp_path, store, monkeypatch):
+    bars = make_bars(rows=200)
+    store.update("AAPL", "1d", bars, FEATURES)
+    sma_before = store.read("AAPL", "1d", ["sma(window=20)"])
+
+    monkeypatch.setitem(feature_store.INDICATORS, "rsi",
+                        Indicator("rsi", ("",), wilder_rsi, lambda precision, period: 200, [wilder_rsi]))
+    reopened = FeatureStore(store.root)
+    assert reopened.manifest["indicators"]["rsi"]["revision"] == 2
+    assert reopened.manifest["indicators"]["sma"]["revision"] == 1
+    status = reopened.status()["series"][0]
+    assert status["stale_features"] == ["rsi(period=14)"]
+
+    rebuilt = reopened.read("AAPL", "1d", ["rsi(period=14)"])["rsi(period=14)"]
+    np.testing.assert_allclose(rebuilt[199:], wilder_rsi(bars["Close"], 14)[199:])
+    assert reopened.status()["series"][0]["stale_features"] == []
+    assert_same(reopened.read("AAPL", "1d", ["sma(window=20)"]), sma_before)
+
+
+def test_fingerprints_cover_the_shared_formulas():
+    from strategies import base
+
+    assert feature_store.INDICATORS["sma"].compute is base.sma
+    assert feature_store.INDICATORS["rsi"].compute is base.rsi
+    edited = Indicator("sma", ("",), base.sma, lambda precision, window: window, [base.sma], version=2)
+    assert edited.fingerprint != feature_store.INDICATORS["sma"].fingerprint
+
+
+def test_range_reads(store):
+    bars = make_bars(rows=100)
+    store.update("AAPL", "1d", bars, ["sma(window=5)"])
+    frame = store.read("AAPL", "1d", ["Close", "sma(window=5)"], start=bars.index[10], end=bars.index[19])
+    assert frame.index.equals(bars.index[10:20])
+    with pytest.raises(KeyError):
+        store.read("AAPL", "1d", ["rsi(period=14)"])
+    with pytest.raises(KeyError):
+        store.read("MSFT", "1d")
+
+
+@pytest.mark.parametrize("feature", ["unknown(window=5)", "sma(period=5)", "rsi()", "macd(fast=12)"])
+def test_invalid_features_are_rejected(feature):
+    with pytest.raises(ValueError):
+        parse_feature(feature)
+
+
+def test_feature_ids_are_canonical(store):
+    assert parse_feature("macd(slow=26, fast=12, signal=9)") == ("macd", {"slow": 26, "fast": 12, "signal": 9})
+    store.update("AAPL", "1d", make_bars(rows=60), ["macd(slow=26,fast=12,signal=9)"])
+    assert list(store.series("AAPL", "1d")["features"]) == ["macd(fast=12,signal=9,slow=26)"]
+    assert set(BAR_COLUMNS) <= set(store.read("AAPL", "1d").columns)
+
+
+def test_open_column_maps_are_bounded(tmp_path):
+    store = FeatureStore(str(tmp_path / "store"), max_open_maps=3)
+    bars = make_bars(rows=50)
+    for symbol in ["AAA", "BBB", "CCC"]:
+        store.update(symbol, "1d", bars, ["sma(window=5)"])
+        store.read(symbol, "1d", ["Close", "sma(window=5)"])
+    assert len(store._maps) == 3
+    _, held = store.read_arrays("AAA", "1d", ["Close"])
+    assert list(store._maps)[-1].endswith(os.path.join("AAA", "Close.f64"))
+
+    store.read("BBB", "1d")
+    assert len(store._maps) == 3
+    # Evicted mappings stay valid for arrays already handed out
+    np.testing.assert_allclose(held["Close"], bars["Close"])
@@ -0,0 +1,194 @@
+import pandas as pd
+import pytest
+import requests
+
+import fetch_scheduler
+from fetch_scheduler import (CircuitBreaker, CircuitOpenError, FetchScheduler, Priority, TokenBucket,
+                             UpstreamThrottledError)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(fetch_scheduler.time, "monotonic", clock)
+    return clock
+
+
+def scheduler(fetcher, **kwargs) -> FetchScheduler:
+    options = dict(rate=1000.0, burst=1000.0, workers=1, max_retries=2,
+                   backoff_base=0.0, backoff_max=0.0, timeout=5.0)
+    options.update(kwargs)
+    return FetchScheduler(fetcher=fetcher, **options)
+
+
+def test_token_bucket_spends_burst_then_queues_at_rate(clock):
+    bucket = TokenBucket(rate=2.0, capacity=2.0)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert bucket.available() == pytest.approx(0.0)
+
+
+def test_token_bucket_drain_drops_saved_burst(clock):
+    bucket = TokenBucket(rate=1.0, capacity=5.0)
+    bucket.drain()
+    assert bucket.available() == 0.0
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_circuit_breaker_opens_and_probes_once_after_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open() and not breaker.allow()
+
+    clock.now += 10.0
+    assert breaker.allow()       # the half-open probe
+    assert not breaker.allow()   # only one probe at a time
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.status()["state"] == CircuitBreaker.CLOSED
+
+
+def test_transient_errors_are_retried():
+    calls = []
+
+    def fetcher(symbol, period, interval):
+        calls.append(symbol)
+        if len(calls) < 3:
+            raise requests.ConnectionError("connection reset")
+        return pd.DataFrame({"Close": [1.0]})
+
+    s = scheduler(fetcher)
+    assert s.fetch("AAPL", "1mo", "1d")["Close"].iloc[0] == 1.0
+    assert len(calls) == 3
+    assert s.status()["stats"]["retries"] == 2
+
+
+def test_throttling_is_retried_and_drains_the_bucket():
+    calls = []
+
+    def fetcher(symbol, period, interval):
+        calls.append(symbol)
+        if len(calls) == 1:
+            raise UpstreamThrottledError("429")
+        return pd.DataFrame({"Close": [1.0]})
+
+    s = scheduler(fetcher)
+    s.fetch("AAPL", "1mo", "1d")
+    assert s.status()["stats"]["throttled"] == 1
+    assert len(calls) == 2
+
+
+def test_permanent_errors_fail_without_retry_or_tripping_the_breaker():
+    calls = []
+
+    def fetcher(symbol, period, interval):
+        calls.append(symbol)
+        raise ValueError(f"Invalid period '{period}'")
+
+    s = scheduler(fetcher, failure_threshold=1)
+    with pytest.raises(ValueError):
+        s.fetch("AAPL", "7weeks", "1d")
+    assert calls == ["AAPL"]
+    assert s.status()["stats"]["retries"] == 0
+    assert not s.breaker.is_open()
+
+
+def test_server_errors_are_transient_but_client_errors_are_not():
+    def http_error(status):
+        response = requests.Response()
+        response.status_code = status
+        return requests.HTTPError(f"{status}", response=response)
+
+    assert fetch_scheduler._is_transient_error(http_error(503))
+    assert not fetch_scheduler._is_transient_error(http_error(400))
+    assert fetch_scheduler._is_transient_error(TimeoutError())
+    assert not fetch_scheduler._is_transient_error(KeyError("Close"))
+
+
+def test_exhausted_retries_open_the_circuit():
+    def fetcher(symbol, period, interval):
+        raise TimeoutError("upstream timed out")
+
+    s = scheduler(fetcher, max_retries=1, failure_threshold=1)
+    with pytest.raises(TimeoutError):
+        s.fetch("AAPL", "1mo", "1d")
+    with pytest.raises(CircuitOpenError):
+        s.submit("MSFT", "1mo", "1d", Priority.BATCH)
+
+
+def test_identical_fetches_are_coalesced():
+    import threading
+    release = threading.Event()
+    calls = []
+
+    def fetcher(symbol, period, interval):
+        calls.append(symbol)
+        release.wait(5)
+        return pd.DataFrame({"Close": [1.0]})
+
+    s = scheduler(fetcher)
+    first = s.submit("aapl", "1mo", "1d", Priority.BULK)
+    second = s.submit("AAPL", "1mo", "1d", Priority.INTERACTIVE)
+    release.set()
+    assert first.result(5) is second.result(5)
+    assert calls == ["AAPL"]
+    assert s.status()["stats"]["deduplicated"] == 1
+
+
+def test_bulk_closes_since_start_download_only_new_bars(monkeypatch):
+    calls = []
+
+    def download(tickers, **kwargs):
+        calls.append(kwargs)
+        index = pd.date_range("2024-01-02 10:00", periods=3, freq="1min")
+        return pd.concat({"Close": pd.DataFrame({t: [1.0, 2.0, 3.0] for t in tickers}, index=index)}, axis=1)
+
+    monkeypatch.setattr(fetch_scheduler.yf, "download", download)
+    s = scheduler(None)
+    start = pd.Timestamp("2024-01-02 10:00")
+    closes = s.fetch_closes(["msft", "AAPL"], "5d", "1m", start=start)
+    assert list(closes.columns) == ["MSFT", "AAPL"]
+    assert calls[0]["start"] == start and "period" not in calls[0]
+
+    s.fetch_closes(["MSFT", "AAPL"], "5d", "1m")
+    assert calls[1]["period"] == "5d" and "start" not in calls[1]
+
+
+
+def test_refresh_does_not_join_a_plain_fetch_in_flight():
+    import threading
+    release = threading.Event()
+    calls = []
+
+    def fetcher(symbol, period, interval):
+        calls.append(symbol)
+        release.wait(5)
+        return pd.DataFrame({"Close": [float(len(calls))]})
+
+    s = scheduler(fetcher, workers=2)
+    plain = s.submit("AAPL", "1mo", "1d", Priority.BULK)
+    refresh = s.submit("AAPL", "1mo", "1d", Priority.BULK, refresh=True)
+    assert refresh is not plain
+    assert s.submit("AAPL", "1mo", "1d", refresh=True) is refresh
+    release.set()
+    assert plain.result(5) is not refresh.result(5)
+    assert calls == ["AAPL", "AAPL"]
+    assert s.status()["stats"]["deduplicated"] == 1
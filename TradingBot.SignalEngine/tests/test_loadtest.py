@@ -0,0 +1,40 @@
+from loadtest.run import RequestMix, limiter_bound, parse_args, summarize
+from loadtest.stub_server import StubMarketDataServer
+
+
+def test_launched_engine_defaults_measure_the_app_not_the_limiter():
+    args = parse_args([])
+    assert args.upstream_rate_limit >= 100
+    assert not args.no_shared_cache
+
+
+def test_limiter_bound_detection():
+    upstream = {"rate_per_second": 1.8, "queued": {"interactive": 0, "batch": 0, "bulk": 0}}
+    assert limiter_bound(upstream, upstream_requests=17, elapsed=10.0)
+    assert not limiter_bound(upstream, upstream_requests=5, elapsed=10.0)
+    assert limiter_bound(dict(upstream, queued={"interactive": 0, "batch": 3, "bulk": 0}), 5, 10.0)
+    assert not limiter_bound(dict(upstream, rate_per_second=900.0), 47, 10.0)
+
+
+def test_request_mix_and_summary():
+    mix = RequestMix(symbols=10, zipf=1.0, batch_fraction=0.5, batch_size=4,
+                     strategy="basic", timeframe="1d", period="1y", seed=1)
+    requests = [mix.next_request() for _ in range(200)]
+    assert {endpoint for endpoint, _ in requests} == {"/signal", "/signals/batch"}
+    assert all(len(body["symbols"]) <= 4 for endpoint, body in requests if endpoint == "/signals/batch")
+
+    report = summarize("stage", [("/signal", "200", 0.010), ("/signal", "503", 0.030)], elapsed=2.0)
+    assert report["overall"]["throughput_rps"] == 1.0
+    assert report["overall"]["error_rate"] == 0.5
+
+
+def test_stub_response_cache_is_bounded():
+    stub = StubMarketDataServer(cache_size=2).start()
+    try:
+        first = stub.handle("/history?symbol=AAA&period=5d&interval=1d")
+        for symbol in ["BBB", "AAA", "CCC"]:
+            assert stub.handle(f"/history?symbol={symbol}&period=5d&interval=1d")[0] == 200
+        assert list(stub._cache) == [("AAA", "5d", "1d"), ("CCC", "5d", "1d")]
+        assert stub.handle("/history?symbol=aaa&period=5d&interval=1d") == first
+    finally:
+        stub.stop()
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_bars
+from strategies.local_model import (FEATURE_LOOKBACK, FEATURE_NAMES, LocalModel, _ewm_mean, build_feature_matrix,
+                                    stack_frames)
+
+
+@pytest.mark.parametrize("span", [9, 12, 26])
+def test_ewm_mean_matches_pandas(span):
+    values = np.random.default_rng(0).normal(100, 5, (80, 3))
+    values[:7, 1] = np.nan
+    values[30, 2] = np.nan
+    expected = pd.DataFrame(values).ewm(span=span).mean().to_numpy()
+    np.testing.assert_allclose(_ewm_mean(values, span), expected, rtol=1e-12)
+
+
+def pandas_features(df: pd.DataFrame) -> pd.Series:
+    """The features for the last bar, one symbol at a time with pandas"""
+    close, volume = df["Close"], df["Volume"]
+    sma_20, sma_50 = close.rolling(20).mean(), close.rolling(50).mean()
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    macd = close.ewm(span=12).mean() - close.ewm(span=26).mean()
+    signal = macd.ewm(span=9).mean()
+    std_20 = close.rolling(20).std()
+    last = close.iloc[-1]
+    return pd.Series([
+        last / close.iloc[-2] - 1,
+        volume.iloc[-1] / volume.iloc[-10:].mean(),
+        (100 - 100 / (1 + gain.iloc[-1] / loss.iloc[-1])) / 100,
+        last / sma_20.iloc[-1] - 1,
+        last / sma_50.iloc[-1] - 1,
+        sma_20.iloc[-1] / sma_20.iloc[-2] - 1,
+        sma_50.iloc[-1] / sma_50.iloc[-2] - 1,
+        macd.iloc[-1] / last,
+        signal.iloc[-1] / last,
+        (macd.iloc[-1] - signal.iloc[-1]) / last,
+        (last - (sma_20.iloc[-1] - 2 * std_20.iloc[-1])) / (4 * std_20.iloc[-1])
+    ], index=FEATURE_NAMES)
+
+
+def test_feature_matrix_matches_per_symbol_pandas():
+    frames = {f"S{i}": make_bars(rows=120, seed=i) for i in range(4)}
+    close, volume = stack_frames(frames, 120)
+    features = build_feature_matrix(close, volume, list(frames))
+    for symbol, df in frames.items():
+        np.testing.assert_allclose(features.loc[symbol].to_numpy(), pandas_features(df).to_numpy(), rtol=1e-9)
+
+
+def test_short_histories_get_nan_features():
+    frames = {"LONG": make_bars(rows=100), "SHORT": make_bars(rows=FEATURE_LOOKBACK - 1)}
+    close, volume = stack_frames(frames, 60)
+    assert close.shape == (60, 2)
+    assert np.isnan(close[:60 - FEATURE_LOOKBACK + 1, 1]).all()
+    features = build_feature_matrix(close, volume, list(frames))
+    assert features.loc["SHORT"].isna().all()
+    assert features.loc["LONG"].notna().all()
+
+
+def test_linear_model_softmax():
+    model = LocalModel({
+        "type": "linear", "features": ["return_1", "rsi_14"], "mean": [0.0, 0.5], "scale": [0.01, 0.1],
+        "weights": [[1.0, 0.0, -1.0], [0.5, 0.0, -0.5]], "bias": [0.0, 0.2, 0.0], "classes": ["Buy", "Hold", "Sell"]
+    })
+    features = pd.DataFrame({"return_1": [0.02, -0.03, np.nan], "rsi_14": [0.6, 0.3, 0.5]}, index=["A", "B", "C"])
+    action, confidence = model.predict(features)
+
+    X = (features.to_numpy()[:2] - [0.0, 0.5]) / [0.01, 0.1]
+    raw = X @ np.array([[1.0, 0.0, -1.0], [0.5, 0.0, -0.5]]) + [0.0, 0.2, 0.0]
+    probability = np.exp(raw) / np.exp(raw).sum(axis=1, keepdims=True)
+    assert list(action) == ["Buy", "Sell", "Hold"]
+    np.testing.assert_allclose(confidence[:2], probability.max(axis=1), atol=1e-4)
+    assert confidence[2] == 0.5
+
+
+def test_tree_ensemble_matches_a_row_by_row_walk():
+    trees = [
+        {"feature": [0, 1, -1, -1, -1], "threshold": [0.0, 0.5, 0, 0, 0],
+         "left": [1, 3, -1, -1, -1], "right": [2, 4, -1, -1, -1], "value": [0, 0, 1.0, -0.5, 0.25]},
+        {"feature": [1, -1, -1], "threshold": [0.4, 0, 0],
+         "left": [1, -1, -1], "right": [2, -1, -1], "value": [0, -0.2, 0.3]}
+    ]
+    model = LocalModel({"type": "tree_ensemble", "features": ["return_1", "rsi_14"],
+                        "base_score": [0.1], "trees": trees})
+    X = np.random.default_rng(1).normal([0, 0.5], [0.01, 0.2], (50, 2))
+
+    def walk(tree, row):
+        node = 0
+        while tree["left"][node] != -1:
+            go_left = row[tree["feature"][node]] <= tree["threshold"][node]
+            node = tree["left"][node] if go_left else tree["right"][node]
+        return tree["value"][node]
+
+    expected = [0.1 + sum(walk(tree, row) for tree in trees) for row in X]
+    np.testing.assert_allclose(model.scores(X)[:, 0], expected)
+
+
+def test_single_output_uses_probability_thresholds():
+    model = LocalModel({"type": "linear", "features": ["return_1"], "weights": [[100.0]]})
+    features = pd.DataFrame({"return_1": [0.01, -0.01, 0.001]})
+    action, confidence = model.predict(features, buy_threshold=0.6, sell_threshold=0.4)
+    assert list(action) == ["Buy", "Sell", "Hold"]
+    assert confidence[0] == pytest.approx(1 / (1 + np.exp(-1)), abs=1e-4)
+
+
+@pytest.mark.parametrize("spec", [
+    {"type": "linear", "features": ["unknown"], "weights": [[1.0]]},
+    {"type": "linear", "features": ["return_1"], "weights": [[1.0]], "classes": ["Up"]},
+    {"type": "linear", "features": ["return_1"], "weights": [[1.0]], "mean": [0.0, 1.0]},
+    {"type": "svm", "features": ["return_1"]}
+])
+def test_invalid_models_are_rejected(spec):
+    with pytest.raises(ValueError):
+        LocalModel(spec)
+
+
+def test_ai_strategy_scores_a_batch_with_the_local_model(tmp_path):
+    from strategies.ai_strategy import AIStrategy
+
+    path = tmp_path / "model.json"
+    path.write_text('{"type": "linear", "features": ["return_1"], "weights": [[1000.0]]}')
+    strategy = AIStrategy({"mode": "local", "model_path": str(path), "openai_api_key": ""})
+    assert strategy.batch_scoring
+
+    frames = {f"S{i}": make_bars(rows=80, seed=i) for i in range(5)}
+    frames["NEW"] = make_bars(rows=20)
+    signals = strategy.generate_signals(frames)
+    for symbol, df in frames.items():
+        if symbol == "NEW":
+            continue
+        single = strategy.generate_signal(df, symbol)
+        assert (signals[symbol].action, signals[symbol].confidence) == (single.action, single.confidence)
+        up = df["Close"].iloc[-1] / df["Close"].iloc[-2] - 1
+        assert signals[symbol].action == ("Buy" if up > 0 else "Sell")
+    assert signals["NEW"].action == "Hold"
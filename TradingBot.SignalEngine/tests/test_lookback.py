@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+import lookback
+from conftest import make_bars
+from strategies.ai_strategy import AIStrategy
+from strategies.basic import BasicStrategy
+from strategies.moving_average import MovingAverageStrategy
+
+
+@pytest.mark.parametrize("period, days", [
+    ("max", None),
+    ("1d", 1.0),
+    ("5d", 5.0),
+    ("10d", 10 * 5 / 7),
+    ("1wk", 5.0),
+    ("1mo", 21.0),
+    ("3mo", 63.0),
+    ("2y", 504.0),
+    ("bogus", None)
+])
+def test_period_trading_days(period, days):
+    assert lookback.period_trading_days(period) == days
+
+
+def test_ytd_counts_weekdays_so_far():
+    assert lookback.period_trading_days("ytd") == date.today().timetuple().tm_yday * 5 / 7
+
+
+@pytest.mark.parametrize("interval, bars", [
+    ("1m", 375),
+    ("5m", 75),
+    ("15m", 25),
+    ("1h", 6),
+    ("90m", 4),
+    ("1d", 1.0),
+    ("1wk", 0.2),
+    ("1mo", 1 / 21)
+])
+def test_bars_per_day(interval, bars):
+    assert lookback.bars_per_day(interval) == pytest.approx(bars)
+
+
+def test_unknown_interval_is_rejected():
+    with pytest.raises(ValueError):
+        lookback.bars_per_day("1x")
+
+
+def test_window_adds_the_margin():
+    assert lookback.window_bars(51) == 51 + lookback.LOOKBACK_MARGIN_BARS
+
+
+@pytest.mark.parametrize("requested, interval, bars, period", [
+    ("max", "1d", 61, "6mo"),      # 61 bars * 1.1 slack = 68 trading days
+    ("1y", "1d", 61, "6mo"),
+    ("max", "1d", 57, "3mo"),      # 63 days exactly
+    ("max", "1m", 61, "5d"),       # one session plus today's
+    ("max", "1h", 61, "1mo"),      # 12 sessions plus today
+    ("max", "1wk", 61, "2y"),
+    ("max", "1d", 5000, "max"),    # longer than any standard period
+    ("10y", "1d", 5000, "10y")
+])
+def test_fetch_period(requested, interval, bars, period):
+    assert lookback.fetch_period(requested, interval, bars) == period
+
+
+@pytest.mark.parametrize("requested", ["1mo", "5d", "3mo"])
+def test_fetch_period_is_capped_at_the_requested_period(requested):
+    assert lookback.fetch_period(requested, "1d", 61) == requested
+
+
+def test_strategy_lookbacks():
+    assert MovingAverageStrategy().required_lookback() == 51
+    assert BasicStrategy().required_lookback() == 16
+    assert MovingAverageStrategy({"long_period": 100}).required_lookback() == 101
+
+
+def strategies():
+    return [MovingAverageStrategy(), BasicStrategy(), AIStrategy({"openai_api_key": "", "mode": "llm"})]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_trimmed_and_full_history_give_the_same_signal(seed):
+    bars = make_bars(rows=400, seed=seed)
+    for strategy in strategies():
+        trimmed = bars.iloc[-lookback.window_bars(strategy.required_lookback()):]
+        full = strategy.generate_signal(bars, "TEST")
+        short = strategy.generate_signal(trimmed, "TEST")
+        assert (short.action, short.target, short.stop_loss) == (full.action, full.target, full.stop_loss), \
+            type(strategy).__name__
+        assert short.confidence == pytest.approx(full.confidence, abs=1e-9)
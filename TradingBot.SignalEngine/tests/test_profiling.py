@@ -0,0 +1,112 @@
+import contextvars
+import time
+
+import pytest
+
+import profiling
+from profiling import ProfileStore, RequestProfile
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "sekrit")
+    monkeypatch.setattr(profiling, "PROFILING_ALWAYS", False)
+
+
+def test_profile_flag_is_removed_from_the_stored_query():
+    profile = profiling.start_profile("POST", "/signal", "profile=sekrit&symbol=AAPL&x=")
+    assert profile.query == "symbol=AAPL&x="
+    assert "sekrit" not in str(profile.summary())
+
+
+def test_token_is_required_for_profiling_and_debug_access(enabled):
+    assert profiling.is_profiling_requested({"X-Profile": "sekrit"}, {})
+    assert not profiling.is_profiling_requested({"X-Profile": "guess"}, {})
+    assert profiling.is_debug_access_allowed({}, {"profile": "sekrit"})
+    assert not profiling.is_debug_access_allowed({}, {})
+    assert not profiling.is_debug_access_allowed({"X-Profile": "1"}, {})
+
+
+def test_debug_access_without_a_token_is_limited_to_localhost(enabled, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "")
+    flag = {"X-Profile": "1"}
+    assert profiling.is_debug_access_allowed(flag, {}, "127.0.0.1")
+    assert profiling.is_debug_access_allowed(flag, {}, "::1")
+    assert profiling.is_debug_access_allowed(flag, {}, "localhost")
+    assert not profiling.is_debug_access_allowed(flag, {}, "203.0.113.7")
+    assert not profiling.is_debug_access_allowed(flag, {}, None)
+    assert not profiling.is_debug_access_allowed({}, {}, "127.0.0.1")
+
+
+def test_always_on_profiling_does_not_open_debug_access(enabled, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ALWAYS", True)
+    assert profiling.is_profiling_requested({}, {})
+    assert not profiling.is_debug_access_allowed({}, {})
+
+
+@profiling.profiled
+def slow_handler_for_profiling(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_sampler_records_the_handler_stack():
+    def request():
+        profile = profiling.start_profile("POST", "/signal")
+        slow_handler_for_profiling(0.2)
+        return profile
+
+    # A copied context keeps the profile from leaking into later tests
+    profile = contextvars.copy_context().run(request)
+    assert profile.summary()["samples"] > 5
+    assert "slow_handler_for_profiling (test_profiling.py:" in profile.collapsed()
+
+
+def test_store_keeps_the_slowest_and_the_most_recent():
+    store = ProfileStore(slowest_n=2, recent_n=2)
+    profiles = []
+    for duration in [5.0, 50.0, 1.0, 20.0]:
+        profile = RequestProfile("GET", "/x")
+        profile.duration_ms = duration
+        store.add(profile)
+        profiles.append(profile)
+    assert [p["duration_ms"] for p in store.slowest()] == [50.0, 20.0]
+    assert store.get(profiles[2].id) is profiles[2]     # recent
+    assert store.get(profiles[0].id) is None           # neither recent nor among the slowest
+
+
+class TestDebugEndpoints:
+    @pytest.fixture
+    def client(self, enabled):
+        pytest.importorskip("pandas_ta")
+        from fastapi.testclient import TestClient
+        import main
+        return TestClient(main.app, raise_server_exceptions=False)
+
+    def test_listing_needs_the_token_and_never_shows_it(self, client):
+        assert client.get("/debug/profiles").status_code == 403
+        assert client.get("/strategies?profile=sekrit").status_code == 200
+        response = client.get("/debug/profiles", headers={"X-Profile": "sekrit"})
+        assert response.status_code == 200
+        assert "sekrit" not in response.text
+
+    def test_listing_without_a_token_refuses_remote_clients(self, client, monkeypatch):
+        monkeypatch.setattr(profiling, "PROFILING_TOKEN", "")
+        response = client.get("/debug/profiles", headers={"X-Profile": "1"})
+        assert response.status_code == 403
+        assert "PROFILING_TOKEN" in response.json()["detail"]
+
+    def test_single_profile_needs_the_token(self, client):
+        profile_id = client.get("/strategies", headers={"X-Profile": "sekrit"}).headers["X-Profile-Id"]
+        assert client.get(f"/debug/profiles/{profile_id}").status_code == 403
+        assert client.get(f"/debug/profiles/{profile_id}", headers={"X-Profile": "sekrit"}).status_code == 200
+
+    def test_failing_handler_still_finishes_its_profile(self, client, monkeypatch):
+        import main
+        monkeypatch.setattr(main, "STRATEGIES", None)  # /strategies now raises
+        response = client.get("/strategies", headers={"X-Profile": "sekrit"})
+        assert response.status_code == 500
+        assert any(p["path"] == "/strategies" and p["status_code"] == 500
+                   for p in profiling.profile_store.slowest())
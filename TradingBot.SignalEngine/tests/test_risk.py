@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fetch_scheduler import FetchScheduler
+from risk import RiskService, RollingCovariance
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA"]
+
+
+class ClosesScheduler(FetchScheduler):
+    """Serves a fixed frame of closes and records every fetch_closes call"""
+
+    def __init__(self, closes: pd.DataFrame):
+        super().__init__(fetcher=lambda *args: None)
+        self.closes = closes
+        self.calls = []
+
+    def fetch_closes(self, symbols, period, interval, priority=None, start=None):
+        self.calls.append((period, start))
+        closes = self.closes if start is None else self.closes[self.closes.index >= start]
+        return closes.reindex(columns=symbols)
+
+
+def minute_closes(rows: int, end: pd.Timestamp, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, (rows, len(SYMBOLS))), axis=0))
+    return pd.DataFrame(prices, columns=SYMBOLS, index=pd.date_range(end=end, periods=rows, freq="1min"))
+
+
+@pytest.fixture
+def returns():
+    return np.random.default_rng(0).normal(0, 0.01, (130, len(SYMBOLS)))
+
+
+def test_rolling_covariance_matches_np_cov(returns):
+    matrix = RollingCovariance(SYMBOLS, window=50)
+    for i, row in enumerate(returns):
+        matrix.update(row)
+        if i >= 1:
+            window = returns[max(0, i - 49):i + 1]
+            np.testing.assert_allclose(matrix.covariance(), np.cov(window, rowvar=False), atol=1e-15)
+
+    subset = np.array([2, 0])
+    np.testing.assert_allclose(matrix.covariance(subset), np.cov(returns[-50:, [2, 0]], rowvar=False), atol=1e-15)
+    np.testing.assert_allclose(matrix.correlation(), np.corrcoef(returns[-50:], rowvar=False), atol=1e-12)
+
+
+def test_nan_returns_count_as_zero():
+    matrix = RollingCovariance(["A", "B"], window=5)
+    matrix.update([0.01, np.nan])
+    matrix.update([0.02, 0.01])
+    np.testing.assert_allclose(matrix.covariance(), np.cov([[0.01, 0.0], [0.02, 0.01]], rowvar=False))
+
+
+def service_with(returns) -> RiskService:
+    service = RiskService(ClosesScheduler(pd.DataFrame()), SYMBOLS, window=50)
+    for row in returns:
+        service.matrix.update(row)
+    return service
+
+
+def test_value_at_risk_matches_the_delta_normal_formula(returns):
+    service = service_with(returns)
+    result = service.value_at_risk({"aapl": 10_000, "NVDA": -5_000, "TSLA": 1_000}, 0.99, horizon_bars=4)
+
+    weights = np.array([10_000, -5_000])
+    cov = np.cov(returns[-50:, [0, 2]], rowvar=False)
+    expected = 2.3263478740 * np.sqrt(weights @ cov @ weights) * 2
+    assert result["var"] == pytest.approx(expected, rel=1e-8)
+    assert sum(result["components"].values()) == pytest.approx(expected, abs=0.02)
+    assert list(result["components"]) == ["AAPL", "NVDA"]
+    assert result["missing_symbols"] == ["TSLA"]
+
+
+@pytest.mark.parametrize("positions", [{}, {"TSLA": 1_000}])
+def test_value_at_risk_needs_a_watchlist_position(returns, positions):
+    with pytest.raises(ValueError):
+        service_with(returns).value_at_risk(positions)
+
+
+def test_refresh_applies_the_newest_completed_bar():
+    # The last bar started two minutes ago, so it is complete
+    closes = minute_closes(60, pd.Timestamp.now().floor("min") - pd.Timedelta(minutes=2))
+    service = RiskService(ClosesScheduler(closes), SYMBOLS, window=50)
+
+    assert service.refresh() == 51
+    assert service.as_of == closes.index[-1]
+    assert service.matrix.count == 50
+    expected = np.cov(closes.pct_change().to_numpy()[-50:], rowvar=False)
+    np.testing.assert_allclose(service.matrix.covariance(), expected, rtol=1e-9)
+
+
+def test_refresh_skips_a_forming_bar():
+    closes = minute_closes(60, pd.Timestamp.now().floor("min"))
+    service = RiskService(ClosesScheduler(closes), SYMBOLS, window=50)
+
+    assert service.refresh() == 51
+    assert service.as_of == closes.index[-2]
+
+
+def test_refresh_fetches_only_bars_since_as_of():
+    closes = minute_closes(70, pd.Timestamp.now().floor("min") - pd.Timedelta(minutes=2))
+    scheduler = ClosesScheduler(closes.iloc[:60])
+    service = RiskService(scheduler, SYMBOLS, window=50)
+    service.refresh()
+    assert scheduler.calls[0][1] is None
+
+    scheduler.closes = closes
+    assert service.refresh() == 10
+    assert scheduler.calls[1][1] == closes.index[59]
+    expected = np.cov(closes.pct_change().to_numpy()[-50:], rowvar=False)
+    np.testing.assert_allclose(service.matrix.covariance(), expected, rtol=1e-9)
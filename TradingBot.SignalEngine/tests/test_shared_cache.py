@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pytest
+
+import shared_cache
+from conftest import make_bars
+from shared_cache import SharedCache, SharedTokenBucket
+
+fork = multiprocessing.get_context("fork")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedCache(str(tmp_path), ttl=60.0)
+
+
+@pytest.mark.parametrize("tz", [None, "America/New_York", "Asia/Kolkata"])
+def test_frame_round_trip(cache, tz):
+    bars = make_bars(rows=50, freq="5min", start="2024-03-10 00:00", tz=tz)
+    cache.put_frame(("AAPL", "5d", "5m"), bars)
+    restored = cache.get_frame(("AAPL", "5d", "5m"))
+    assert restored.index.equals(bars.index)
+    assert str(restored.index.tz) == str(bars.index.tz)
+    assert list(restored.columns) == list(bars.columns)
+    np.testing.assert_array_equal(restored.to_numpy(), bars.to_numpy())
+
+
+def test_blob_round_trip_and_listing(cache):
+    cache.put_blob(("signal", "basic", "AAPL"), b"payload")
+    assert cache.get_blob(("signal", "basic", "AAPL")) == b"payload"
+    assert cache.get_frame(("signal", "basic", "AAPL")) is None
+    assert [(key, kind, value) for key, kind, _, value in cache.entries()] == \
+        [(("signal", "basic", "AAPL"), "blob", b"payload")]
+
+
+def test_entries_expire_after_the_ttl(cache):
+    cache.put_frame(("AAPL", "1mo", "1d"), make_bars(rows=5), created_at=time.time() - 61)
+    assert cache.get_frame(("AAPL", "1mo", "1d")) is None
+    assert cache.get_frame(("AAPL", "1mo", "1d"), ttl=120) is not None
+    assert cache.contains(("AAPL", "1mo", "1d"))
+    cache.put_frame(("AAPL", "1mo", "1d"), make_bars(rows=5))
+    assert cache.get_frame(("AAPL", "1mo", "1d")) is not None
+
+
+def test_prune_evicts_the_oldest_entries_and_their_locks(tmp_path):
+    cache = SharedCache(str(tmp_path))
+    blob = b"x" * 900
+    for i in range(5):
+        with cache.fetch_lock(("K", i)):
+            cache.put_blob(("K", i), blob)
+        path = os.path.join(cache.directory, cache._filename(("K", i)))
+        os.utime(path, (1000 + i, 1000 + i))
+    cache.max_bytes = 3000
+    cache._prune()
+
+    kept = [i for i in range(5) if cache.contains(("K", i))]
+    assert kept == [3, 4]
+    assert cache.stats["evictions"] == 3
+    locks = sorted(name for name in os.listdir(cache.directory) if name.endswith(".lock"))
+    assert locks == sorted(cache._filename(("K", i)) + ".lock" for i in kept)
+
+
+def test_prune_sweeps_orphaned_temp_and_lock_files(cache):
+    old = time.time() - 120
+    for name in ("crashed.1.2.tmp", "gone.lock"):
+        path = os.path.join(cache.directory, name)
+        open(path, "w").close()
+        os.utime(path, (old, old))
+    open(os.path.join(cache.directory, "writing.1.2.tmp"), "w").close()
+    cache._prune()
+    assert sorted(os.listdir(cache.directory)) == ["writing.1.2.tmp"]
+
+
+def test_held_locks_are_not_removed(cache):
+    with cache.fetch_lock(("AAPL",)):
+        path = os.path.join(cache.directory, cache._filename(("AAPL",)) + ".lock")
+        os.utime(path, (0, 0))
+        cache._prune()
+        assert os.path.exists(path)
+
+
+def test_writes_do_not_scan_the_directory_every_time(cache, monkeypatch):
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(shared_cache.os, "listdir", lambda path: scans.append(path) or listdir(path))
+    for i in range(shared_cache._PRUNE_EVERY_WRITES + 1):
+        cache.put_blob(("K", i), b"x")
+    assert len(scans) == 2  # the first write, then after _PRUNE_EVERY_WRITES
+
+
+def test_crossing_max_bytes_triggers_a_scan(tmp_path):
+    cache = SharedCache(str(tmp_path), max_bytes=5000)
+    for i in range(20):
+        cache.put_blob(("K", i), b"x" * 900)
+    assert cache.status()["bytes"] <= 5000
+
+
+def fetch_once(directory, counter):
+    cache = SharedCache(directory)
+    key = ("AAPL", "1mo", "1d")
+    with cache.fetch_lock(key):
+        if cache.get_frame(key) is None:
+            with counter.get_lock():
+                counter.value += 1
+            time.sleep(0.2)
+            cache.put_frame(key, make_bars(rows=5))
+
+
+def test_only_one_process_fetches_a_key(tmp_path):
+    counter = fork.Value("i", 0)
+    workers = [fork.Process(target=fetch_once, args=(str(tmp_path), counter)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert counter.value == 1
+
+
+def reserve_tokens(path, waits):
+    bucket = SharedTokenBucket(path, rate=10.0, capacity=2.0)
+    for _ in range(2):
+        waits.put(bucket.reserve())
+
+
+def test_token_bucket_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "upstream.bucket")
+    waits = fork.Queue()
+    workers = [fork.Process(target=reserve_tokens, args=(path, waits)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+    reserved = sorted(waits.get(timeout=5) for _ in range(8))
+
+    # One burst of 2 for all processes; the other 6 reservations queue at 10/s
+    assert reserved[:2] == [0.0, 0.0]
+    assert reserved[2] > 0
+    assert reserved[-1] == pytest.approx(0.6, abs=0.1)
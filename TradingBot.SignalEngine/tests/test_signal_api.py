@@ -0,0 +1,190 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas_ta")
+from fastapi.testclient import TestClient
+
+import main
+from conftest import make_bars
+from fetch_scheduler import CircuitOpenError, FetchScheduler, Priority
+
+
+class RecordingScheduler(FetchScheduler):
+    """Serves synthetic bars and records the priority of every submit"""
+
+    def __init__(self, bars_by_symbol=None, **kwargs):
+        super().__init__(fetcher=self._fetch, rate=1000.0, burst=1000.0, workers=2, timeout=5.0, **kwargs)
+        self.bars_by_symbol = bars_by_symbol or {}
+        self.priorities = []
+
+    def _fetch(self, symbol, period, interval):
+        return self.bars_by_symbol.get(symbol, make_bars(seed=len(symbol)))
+
+    def submit(self, symbol, period, interval, priority=Priority.INTERACTIVE, refresh=False):
+        self.priorities.append((symbol, priority))
+        return super().submit(symbol, period, interval, priority, refresh)
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = RecordingScheduler()
+    monkeypatch.setattr(main, "fetch_scheduler", scheduler)
+    monkeypatch.setattr(main, "last_signals", {})
+    return scheduler
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_batch_with_open_circuit_fails_symbols_instead_of_fetching_interactively(scheduler, client, monkeypatch):
+    calls = []
+
+    def submit(symbol, period, interval, priority=Priority.INTERACTIVE, refresh=False):
+        calls.append((symbol, priority))
+        raise CircuitOpenError("open")
+
+    monkeypatch.setattr(scheduler, "submit", submit)
+    response = client.post("/signals/batch", json={"symbols": ["AAPL", "MSFT", "NVDA"], "strategy": "basic"})
+    assert response.status_code == 200
+    assert response.json()["summary"]["failed"] == 3
+    assert all(priority == Priority.BATCH for _, priority in calls)
+    assert [symbol for symbol, _ in calls] == ["AAPL", "MSFT", "NVDA"]
+
+
+def test_batch_fetches_at_batch_priority(scheduler, client):
+    response = client.post("/signals/batch", json={"symbols": ["AAPL", "MSFT"], "strategy": "basic"})
+    assert response.status_code == 200
+    assert response.json()["summary"]["successful"] == 2
+    assert {priority for _, priority in scheduler.priorities} == {Priority.BATCH}
+
+
+def test_latest_signals_are_served_without_fetching(scheduler, client):
+    client.post("/signals/batch", json={"symbols": ["AAPL", "msft"], "strategy": "basic"})
+    fetched = len(scheduler.priorities)
+
+    response = client.get("/signals/latest", params={"strategy": "basic", "symbols": "msft"})
+    assert response.status_code == 200
+    assert [signal["symbol"] for signal in response.json()["signals"]] == ["msft"]
+    assert len(client.get("/signals/latest", params={"strategy": "basic"}).json()["signals"]) == 2
+    assert len(scheduler.priorities) == fetched
+
+
+def test_open_circuit_serves_last_signal_flagged_stale(scheduler, client, monkeypatch):
+    assert client.post("/signal", json={"symbol": "AAPL", "strategy": "basic"}).status_code == 200
+
+    def fetch(*args, **kwargs):
+        raise CircuitOpenError("open")
+
+    monkeypatch.setattr(scheduler, "fetch", fetch)
+    response = client.post("/signal", json={"symbol": "aapl", "strategy": "basic"})
+    assert response.status_code == 200
+    assert response.json()["metadata"]["stale"] is True
+    assert client.post("/signal", json={"symbol": "MSFT", "strategy": "basic"}).status_code == 503
+
+
+def test_var_without_watchlist_positions_is_rejected(scheduler, client, monkeypatch):
+    service = main.RiskService(scheduler, ["AAPL", "MSFT"], window=10)
+    for row in np.random.default_rng(0).normal(0, 0.01, (10, 2)):
+        service.matrix.update(row)
+    monkeypatch.setattr(main, "risk_service", service)
+
+    assert client.post("/risk/var", json={"positions": {}}).status_code == 400
+    assert client.post("/risk/var", json={"positions": {"TSLA": 1000}}).status_code == 400
+    response = client.post("/risk/var", json={"positions": {"aapl": 1000}})
+    assert response.status_code == 200
+    assert list(response.json()["components"]) == ["AAPL"]
+
+
+@pytest.fixture
+def cursors(monkeypatch):
+    monkeypatch.setattr(main, "cursor_store", main.CursorStore())
+
+
+def test_batch_poll_returns_only_changed_signals(scheduler, client, cursors):
+    body = {"symbols": ["AAPL", "MSFT"], "strategy": "basic"}
+    first = client.post("/signals/batch", json=body)
+    cursor = first.json()["cursor"]
+    assert first.json()["delta"] is False
+    assert len(first.json()["signals"]) == 2
+    assert first.headers["etag"] == f'"{cursor}"'
+
+    unchanged = client.post("/signals/batch", json=dict(body, cursor=cursor)).json()
+    assert unchanged["delta"] is True
+    assert unchanged["signals"] == []
+    assert unchanged["cursor"] == cursor
+    assert unchanged["summary"]["unchanged"] == 2
+
+    scheduler.bars_by_symbol["MSFT"] = make_bars(seed=99)
+    changed = client.post("/signals/batch", json=dict(body, cursor=cursor)).json()
+    assert [signal["symbol"] for signal in changed["signals"]] == ["MSFT"]
+    assert changed["cursor"] != cursor
+
+
+def test_batch_poll_by_etag_gets_304(scheduler, client, cursors):
+    body = {"symbols": ["AAPL", "MSFT"], "strategy": "basic"}
+    etag = client.post("/signals/batch", json=body).headers["etag"]
+
+    response = client.post("/signals/batch", json=body, headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    unknown = client.post("/signals/batch", json=body, headers={"If-None-Match": '"unknown"'})
+    assert unknown.status_code == 200
+    assert unknown.json()["delta"] is False
+
+
+def test_failed_symbols_keep_their_cursor_state(scheduler, client, cursors):
+    body = {"symbols": ["AAPL", "MSFT"], "strategy": "basic"}
+    cursor = client.post("/signals/batch", json=body).json()["cursor"]
+
+    scheduler.bars_by_symbol["MSFT"] = make_bars().iloc[:0]
+    partial = client.post("/signals/batch", json=dict(body, cursor=cursor)).json()
+    assert partial["summary"]["failed"] == 1
+    assert partial["signals"] == []
+    assert partial["cursor"] == cursor
+
+
+def test_signal_reports_its_lookback(scheduler, client):
+    response = client.post("/signal", json={"symbol": "AAPL", "strategy": "basic", "period": "1y"})
+    assert response.status_code == 200
+    assert response.json()["metadata"] == {
+        "lookback_bars": 16,
+        "bars_used": 26,
+        "requested_period": "1y",
+        "fetched_period": "3mo"
+    }
+
+
+def test_cached_signal_keeps_the_requested_symbol_spelling(client, monkeypatch, tmp_path):
+    from shared_cache import SharedCache
+
+    scheduler = RecordingScheduler(cache=SharedCache(str(tmp_path)))
+    monkeypatch.setattr(main, "fetch_scheduler", scheduler)
+    monkeypatch.setattr(main, "last_signals", {})
+    first = client.post("/signal", json={"symbol": "aapl", "strategy": "basic"}).json()
+    second = client.post("/signal", json={"symbol": "AAPL", "strategy": "basic"}).json()
+    assert (first["symbol"], second["symbol"]) == ("aapl", "AAPL")
+    assert scheduler.cache.stats["hits"] >= 2
+
+
+def test_signal_from_bars_awaiting_revalidation_is_flagged_stale(client, monkeypatch, tmp_path):
+    from shared_cache import SharedCache
+
+    scheduler = RecordingScheduler(cache=SharedCache(str(tmp_path), ttl=60.0))
+    monkeypatch.setattr(main, "fetch_scheduler", scheduler)
+    monkeypatch.setattr(main, "last_signals", {})
+    scheduler.cache.put_frame(("AAPL", "3mo", "1d"), make_bars(), created_at=time.time() - 600)
+    release = threading.Event()
+    scheduler.fetcher = lambda *args: release.wait(5) and make_bars(seed=9)
+    revalidation = scheduler.submit("AAPL", "3mo", "1d", Priority.BULK, refresh=True)
+
+    request = {"symbol": "AAPL", "strategy": "basic", "period": "1y"}
+    assert client.post("/signal", json=request).json()["metadata"]["stale"] is True
+    release.set()
+    revalidation.result(timeout=5)
+    assert "stale" not in client.post("/signal", json=request).json()["metadata"]
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_bars
+from simulator import PaperTradingSimulator
+from strategies.ai_strategy import AIStrategy
+from strategies.base import BaseStrategy
+from strategies.basic import BasicStrategy
+from strategies.moving_average import MovingAverageStrategy
+
+
+class ScriptedStrategy(BaseStrategy):
+    """Emits a fixed action per bar"""
+
+    def __init__(self, actions, target=0.0, stop_loss=0.0):
+        super().__init__()
+        self.actions = actions
+        self.target = target
+        self.stop_loss = stop_loss
+
+    def generate_signal(self, df, symbol):
+        raise NotImplementedError
+
+    def generate_signal_frame(self, df):
+        actions = (list(self.actions) + ["Hold"] * len(df))[:len(df)]
+        return pd.DataFrame({"action": actions, "confidence": 0.7, "target": self.target,
+                             "stop_loss": self.stop_loss}, index=df.index)
+
+
+def flat_bars(opens, freq="D", low=None, high=None):
+    opens = np.asarray(opens, dtype=float)
+    return pd.DataFrame({
+        "Open": opens,
+        "High": opens + 0.5 if high is None else high,
+        "Low": opens - 0.5 if low is None else low,
+        "Close": np.full(len(opens), 100.0),
+        "Volume": 1000.0
+    }, index=pd.date_range("2024-01-02", periods=len(opens), freq=freq))
+
+
+def test_market_round_trip_fills_at_next_open():
+    bars = flat_bars([100, 101, 102, 103, 104, 105])
+    result = PaperTradingSimulator(ScriptedStrategy(["Buy", "Hold", "Sell"])).run({"AAA": bars})
+    ledger = result.ledger
+    assert list(ledger["side"]) == ["Buy", "Sell"]
+    assert list(ledger["price"]) == [101.0, 103.0]
+    assert ledger["quantity"].iloc[0] == 20          # 2% of 100k at the signal close of 100
+    assert ledger["pnl"].iloc[1] == pytest.approx(40.0)
+    assert result.summary["final_equity"] == pytest.approx(100040.0)
+
+
+def test_stop_loss_gap_fills_at_the_open():
+    opens = [100, 100, 90, 91]
+    bars = flat_bars(opens, low=np.array([99.5, 99.5, 89.0, 90.5]))
+    result = PaperTradingSimulator(ScriptedStrategy(["Buy"], stop_loss=95.0)).run({"AAA": bars})
+    exit_row = result.ledger.iloc[-1]
+    assert (exit_row["side"], exit_row["order_type"], exit_row["price"]) == ("Sell", "stop_loss", 90.0)
+
+
+def test_target_fills_at_the_target():
+    bars = flat_bars([100, 100, 100, 100], high=np.array([100.5, 100.5, 106.0, 100.5]))
+    result = PaperTradingSimulator(ScriptedStrategy(["Buy"], target=105.0)).run({"AAA": bars})
+    assert list(result.ledger["order_type"]) == ["market", "target"]
+    assert result.ledger["price"].iloc[-1] == 105.0
+
+
+def test_daily_trade_limit_rejects_the_signal_exit():
+    bars = flat_bars([100, 100, 100, 100, 100], freq="h")
+    simulator = PaperTradingSimulator(ScriptedStrategy(["Buy", "Hold", "Sell"]), {"max_daily_trades": 1})
+    result = simulator.run({"AAA": bars})
+    assert list(result.ledger["side"]) == ["Buy"]
+    assert list(result.rejections["reason"]) == ["Max daily trades exceeded."]
+    assert result.summary["open_positions"] == 1
+
+
+def test_signal_exit_at_the_open_wins_over_a_stop_later_in_the_bar():
+    bars = flat_bars([100, 100, 100, 100], low=np.array([99.5, 99.5, 94.0, 99.5]))
+    result = PaperTradingSimulator(ScriptedStrategy(["Buy", "Sell"], stop_loss=95.0)).run({"AAA": bars})
+    exit_row = result.ledger.iloc[-1]
+    assert (exit_row["order_type"], exit_row["price"]) == ("market", 100.0)
+    assert exit_row["timestamp"] == bars.index[2]
+
+
+def test_protective_exits_are_not_blocked_by_the_daily_limits():
+    bars = flat_bars([100, 100, 100, 100], freq="h", low=np.array([99.5, 99.5, 94.0, 99.5]))
+    simulator = PaperTradingSimulator(ScriptedStrategy(["Buy"], stop_loss=95.0), {"max_daily_trades": 1})
+    result = simulator.run({"AAA": bars})
+    assert list(result.ledger["order_type"]) == ["market", "stop_loss"]
+    assert result.rejections.empty
+
+
+def test_rejections_are_in_time_order():
+    never_fills = flat_bars([100] * 6, freq="h")
+    fills_and_is_rejected = flat_bars([100] * 6, freq="h", low=np.array([99.5, 98.0, 99.5, 99.5, 99.5, 99.5]))
+    simulator = PaperTradingSimulator(ScriptedStrategy(["Buy"]), {
+        "entry_order": "limit", "limit_offset": 0.01, "limit_ttl_bars": 3, "max_daily_buy_amount": 1000.0
+    })
+    result = simulator.run({"AAA": never_fills, "BBB": fills_and_is_rejected})
+    assert list(result.rejections["symbol"]) == ["BBB", "AAA"]
+    assert result.rejections["timestamp"].is_monotonic_increasing
+
+
+def test_daily_buy_amount_limit():
+    bars = flat_bars([100, 100, 100])
+    simulator = PaperTradingSimulator(ScriptedStrategy(["Buy"]), {"max_daily_buy_amount": 1000.0})
+    result = simulator.run({"AAA": bars})
+    assert result.ledger.empty
+    assert result.rejections["reason"].iloc[0] == "Max daily buy amount exceeded."
+
+
+def test_unfilled_limit_entry_expires():
+    bars = flat_bars([100, 100, 100, 100, 100])
+    simulator = PaperTradingSimulator(ScriptedStrategy(["Buy"]), {
+        "entry_order": "limit", "limit_offset": 0.01, "limit_ttl_bars": 2
+    })
+    result = simulator.run({"AAA": bars})
+    assert result.ledger.empty
+    assert result.rejections["reason"].iloc[0] == "Limit order expired."
+
+
+def test_limit_entry_fills_at_the_limit():
+    bars = flat_bars([100, 100, 100, 100], low=np.array([99.5, 99.5, 98.0, 99.5]))
+    simulator = PaperTradingSimulator(ScriptedStrategy(["Buy"]), {"entry_order": "limit", "limit_offset": 0.01})
+    result = simulator.run({"AAA": bars})
+    assert (result.ledger["order_type"].iloc[0], result.ledger["price"].iloc[0]) == ("limit", 99.0)
+
+
+@pytest.mark.parametrize("strategy", [MovingAverageStrategy(), BasicStrategy()], ids=lambda s: s.name)
+def test_vectorized_signal_frames_match_per_bar_replay(strategy):
+    df = make_bars(rows=150, seed=3)
+    vectorized = strategy.generate_signal_frame(df)
+    replayed = BaseStrategy.generate_signal_frame(strategy, df)
+    pd.testing.assert_series_equal(vectorized["action"], replayed["action"])
+    for column in ["confidence", "target", "stop_loss"]:
+        np.testing.assert_allclose(vectorized[column], replayed[column])
+
+
+def test_ai_strategy_replay_never_calls_the_llm():
+    calls = []
+
+    class RecordingClient:
+        class ChatCompletion:
+            @staticmethod
+            def create(**kwargs):
+                calls.append(kwargs)
+                raise RuntimeError("no network in tests")
+
+    strategy = AIStrategy()
+    strategy.openai_client = RecordingClient()
+    df = make_bars(rows=120, seed=5)
+    pd.testing.assert_frame_equal(strategy.generate_signal_frame(df),
+                                  strategy.fallback_strategy.generate_signal_frame(df))
+    assert calls == []
@@ -0,0 +1,163 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from conftest import make_bars
+from fetch_scheduler import FetchScheduler, Priority
+from risk import RiskService
+from shared_cache import SharedCache
+from warm_state import WarmStateSnapshotter, _is_secret, strategy_fingerprints
+
+
+class Strategy:
+    def __init__(self, **config):
+        self.default_config = config
+
+
+STRATEGIES = strategy_fingerprints({"basic": Strategy(period=14)})
+SIGNAL = {"symbol": "AAPL", "action": "BUY", "timestamp": datetime.now().isoformat()}
+
+
+@pytest.fixture
+def snapshotter(tmp_path):
+    return WarmStateSnapshotter(str(tmp_path / "snapshot.npz"))
+
+
+def cache(tmp_path, name):
+    return SharedCache(str(tmp_path / name), ttl=60.0)
+
+
+def test_round_trip_restores_cache_and_last_signals(tmp_path, snapshotter):
+    source = cache(tmp_path, "a")
+    bars = make_bars(rows=50, freq="1min", tz="America/New_York")
+    source.put_frame(("AAPL", "1d", "1m"), bars)
+    source.put_blob(("signal", "basic", "AAPL", "1d"), b"{}")
+    assert snapshotter.save(source, {("basic", "AAPL", "1d"): SIGNAL}, STRATEGIES)
+
+    target = cache(tmp_path, "b")
+    state, stale = snapshotter.restore(target, STRATEGIES)
+    assert stale == []
+    assert state.last_signals == {("basic", "AAPL", "1d"): SIGNAL}
+    restored = target.get_frame(("AAPL", "1d", "1m"))
+    np.testing.assert_allclose(restored.to_numpy(), bars.to_numpy())
+    assert restored.index.equals(bars.index)
+    assert target.get_blob(("signal", "basic", "AAPL", "1d")) == b"{}"
+
+
+def test_expired_bars_stay_expired_and_are_returned_for_revalidation(tmp_path, snapshotter):
+    source = cache(tmp_path, "a")
+    old = time.time() - 600
+    source.put_frame(("AAPL", "5d", "1m"), make_bars(rows=10), old)
+    source.put_frame(("closes", "abc", "5d", "1m"), make_bars(rows=10), old)
+    snapshotter.save(source, {}, STRATEGIES)
+
+    target = cache(tmp_path, "b")
+    _, stale = snapshotter.restore(target, STRATEGIES)
+    assert stale == [("AAPL", "5d", "1m")]
+    assert target.get_frame(("AAPL", "5d", "1m")) is None
+    assert [created_at for key, _, created_at, _ in target.entries()] == [old]
+    # Bulk closes cannot be refetched per symbol, so expired ones are dropped
+    assert not target.contains(("closes", "abc", "5d", "1m"))
+
+
+def test_expired_bars_are_served_stale_until_revalidated(tmp_path):
+    shared = cache(tmp_path, "a")
+    shared.put_frame(("AAPL", "5d", "1m"), make_bars(rows=5), time.time() - 600)
+    release = threading.Event()
+    scheduler = FetchScheduler(fetcher=lambda *args: release.wait(5) and make_bars(rows=8),
+                               rate=100.0, burst=100.0, cache=shared)
+    revalidation = scheduler.submit("AAPL", "5d", "1m", Priority.BULK, refresh=True)
+
+    served = scheduler.submit("AAPL", "5d", "1m").result(timeout=5)
+    assert len(served) == 5 and served.attrs["stale"]
+    release.set()
+    revalidation.result(timeout=5)
+    fresh = scheduler.submit("AAPL", "5d", "1m").result(timeout=5)
+    assert len(fresh) == 8 and "stale" not in fresh.attrs
+    assert scheduler.status()["stats"]["stale_hits"] == 1
+
+
+def test_saves_keep_merged_signals_in_memory(tmp_path, snapshotter):
+    snapshotter.save(None, {("basic", "AAPL", "1d"): SIGNAL}, STRATEGIES, force=True)
+    restarted = WarmStateSnapshotter(snapshotter.path)
+    restarted.restore(None, STRATEGIES)
+
+    msft = dict(SIGNAL, symbol="MSFT")
+    restarted.save(None, {("basic", "MSFT", "1d"): msft}, STRATEGIES, force=True)
+    assert restarted.load(STRATEGIES).last_signals == {("basic", "AAPL", "1d"): SIGNAL, ("basic", "MSFT", "1d"): msft}
+
+
+def test_signals_older_than_max_age_are_dropped(snapshotter):
+    old = dict(SIGNAL, timestamp=(datetime.now() - timedelta(days=2)).isoformat())
+    snapshotter.save(None, {("basic", "AAPL", "1d"): SIGNAL, ("basic", "GONE", "1d"): old}, STRATEGIES)
+    assert list(snapshotter.load(STRATEGIES).last_signals) == [("basic", "AAPL", "1d")]
+
+
+def test_changed_config_drops_its_signals(tmp_path, snapshotter):
+    source = cache(tmp_path, "a")
+    source.put_blob(("signal", "basic", "AAPL", "1d"), b"{}")
+    snapshotter.save(source, {("basic", "AAPL", "1d"): SIGNAL}, STRATEGIES)
+
+    changed = strategy_fingerprints({"basic": Strategy(period=21)})
+    target = cache(tmp_path, "b")
+    state, _ = snapshotter.restore(target, changed)
+    assert state.last_signals == {}
+    assert not target.contains(("signal", "basic", "AAPL", "1d"))
+
+
+def test_old_snapshot_is_discarded(tmp_path):
+    snapshotter = WarmStateSnapshotter(str(tmp_path / "snapshot.npz"), max_age=0)
+    snapshotter.save(None, {("basic", "AAPL", "1d"): SIGNAL}, STRATEGIES)
+    time.sleep(0.01)
+    assert snapshotter.load(STRATEGIES) is None
+
+
+@pytest.mark.parametrize("name, secret", [
+    ("openai_api_key", True),
+    ("access_token", True),
+    ("password", True),
+    ("max_tokens", False),
+    ("keyword_weight", False),
+    ("model", False)
+])
+def test_is_secret(name, secret):
+    assert _is_secret(name) == secret
+
+
+def test_max_tokens_is_part_of_the_fingerprint():
+    short = strategy_fingerprints({"ai": Strategy(max_tokens=100, openai_api_key="a")})["ai"]
+    long = strategy_fingerprints({"ai": Strategy(max_tokens=500, openai_api_key="b")})["ai"]
+    assert "openai_api_key" not in short["config"]
+    assert short["fingerprint"] != long["fingerprint"]
+
+
+def test_risk_window_round_trip(tmp_path, snapshotter):
+    rng = np.random.default_rng(0)
+    service = RiskService(FetchScheduler(fetcher=lambda *args: None), ["AAPL", "MSFT"], window=20)
+    for _ in range(30):
+        service.matrix.update(rng.normal(0, 0.01, 2))
+    service.as_of = make_bars(rows=1).index[0]
+    snapshotter.save(None, {}, STRATEGIES, streams={"risk": service.snapshot_state()})
+
+    state = snapshotter.load(STRATEGIES)
+    restored = RiskService(FetchScheduler(fetcher=lambda *args: None), ["AAPL", "MSFT"], window=20)
+    assert restored.restore_state(*state.streams["risk"])
+    np.testing.assert_allclose(restored.matrix.covariance(), service.matrix.covariance())
+    assert restored.as_of == service.as_of
+
+    other = RiskService(FetchScheduler(fetcher=lambda *args: None), ["AAPL", "NVDA"], window=20)
+    assert not other.restore_state(*state.streams["risk"])
+
+
+def test_refresh_bypasses_the_cache(tmp_path):
+    shared = cache(tmp_path, "a")
+    shared.put_frame(("AAPL", "5d", "1m"), make_bars(rows=5))
+    fresh = make_bars(rows=8, seed=1)
+    scheduler = FetchScheduler(fetcher=lambda *args: fresh, rate=100.0, burst=100.0, cache=shared)
+
+    assert len(scheduler.submit("AAPL", "5d", "1m", Priority.BULK).result(timeout=5)) == 5
+    assert len(scheduler.submit("AAPL", "5d", "1m", Priority.BULK, refresh=True).result(timeout=5)) == 8
+    assert len(shared.get_frame(("AAPL", "5d", "1m"))) == 8
@@ -0,0 +1,329 @@
+"""
+Warm-state snapshots so a restarted engine does not start cold.
+
+The engine periodically writes its hot state to SNAPSHOT_PATH and restores
+it on startup, before uvicorn starts accepting connections:
+
+- cached bars and computed signals from the shared cache (shared_cache.py)
+- the last signal per (strategy, symbol, timeframe)
+- streaming indicator state, e.g. the risk service's rolling covariance
+  window, so it resumes instead of replaying its whole window
+- the effective config of every strategy, used to validate the rest
+
+A snapshot is discarded when its format version differs, when it is older
+than SNAPSHOT_MAX_AGE_SECONDS or when it cannot be read. Signals produced
+by a strategy whose config changed since the snapshot, and signals older
+than SNAPSHOT_MAX_AGE_SECONDS, are dropped. Bars past the cache TTL are
+restored with their original fetch time; their keys are returned for
+revalidation as paced bulk fetches, and the fetch scheduler serves the
+expired copy (flagged stale) until its revalidation completes.
+
+Snapshots are .npz files (no pickles); with several workers only one of
+them writes at a time and only one restores into the shared cache.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from shared_cache import SharedCache
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "tradingbot-warm-state"
+SNAPSHOT_VERSION = 1
+
+# (strategy, SYMBOL, timeframe) -> signal as a JSON-compatible dict
+LastSignals = Dict[Tuple[str, str, str], dict]
+
+
+_SECRET_WORDS = {"key", "apikey", "secret", "token", "password", "passwd", "credentials"}
+
+
+def _is_secret(name: str) -> bool:
+    """Config names like openai_api_key or access_token (but not max_tokens)"""
+    return any(word in _SECRET_WORDS for word in re.split(r"[^a-z0-9]+", name.lower()))
+
+
+def strategy_fingerprints(strategies: dict) -> Dict[str, dict]:
+    """Effective config (secrets left out) and its hash for every registered strategy"""
+    fingerprints = {}
+    for name, strategy in strategies.items():
+        config = getattr(strategy, "default_config", None) or strategy.config
+        config = {k: v for k, v in config.items() if not _is_secret(k)}
+        encoded = json.dumps({"class": type(strategy).__name__, "config": config}, sort_keys=True, default=str)
+        fingerprints[name] = {
+            "class": type(strategy).__name__,
+            "config": json.loads(encoded)["config"],
+            "fingerprint": hashlib.sha1(encoded.encode()).hexdigest()
+        }
+    return fingerprints
+
+
+# name -> (JSON metadata, {field: array}) of a streaming indicator's state
+Streams = Dict[str, Tuple[dict, Dict[str, np.ndarray]]]
+
+
+class WarmState:
+    def __init__(self, created_at: float, frames: list, blobs: list, last_signals: LastSignals,
+                 streams: Optional[Streams] = None):
+        self.created_at = created_at
+        self.frames = frames  # [(key, created_at, DataFrame)]
+        self.blobs = blobs    # [(key, created_at, bytes)]
+        self.last_signals = last_signals
+        self.streams = streams or {}
+
+
+class WarmStateSnapshotter:
+    def __init__(self, path: str, interval: float = 300.0, max_age: float = 86400.0):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_saved_at: Optional[float] = None
+        self.last_restore: Optional[dict] = None
+        # Restored and saved last signals, merged; written by every save
+        self._signals: LastSignals = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["WarmStateSnapshotter"]:
+        """Snapshotter configured from SNAPSHOT_* variables, or None if disabled"""
+        path = os.getenv("SNAPSHOT_PATH")
+        if not path:
+            return None
+        return cls(
+            path,
+            interval=float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300")),
+            max_age=float(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "86400"))
+        )
+
+    @contextmanager
+    def _exclusive(self, blocking: bool):
+        """Snapshot lock shared by all workers; yields False if busy and non-blocking"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "a") as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    # -- saving --------------------------------------------------------------
+
+    def save(self, cache: Optional[SharedCache], last_signals: LastSignals,
+             strategies: Dict[str, dict], force: bool = False, streams: Optional[Streams] = None) -> bool:
+        """
+        Write a snapshot. Returns False if another worker is writing one or
+        (unless force) has written one within the last half interval.
+        """
+        with self._exclusive(blocking=False) as acquired:
+            if not acquired:
+                return False
+            if not force and os.path.exists(self.path) and \
+                    time.time() - os.path.getmtime(self.path) < self.interval / 2:
+                return False
+
+            merged = self._merge_signals(last_signals)
+
+            arrays = {}
+            entries = []
+            for key, kind, created_at, value in (cache.entries() if cache is not None else []):
+                prefix = f"e{len(entries)}"
+                entry = {"key": list(key), "kind": kind, "created_at": created_at}
+                if kind == "frame":
+                    index = pd.DatetimeIndex(value.index)
+                    entry["tz"] = str(index.tz) if index.tz is not None else None
+                    if index.tz is not None:
+                        index = index.tz_convert("UTC").tz_localize(None)
+                    entry["columns"] = [str(c) for c in value.columns]
+                    arrays[f"{prefix}_index"] = index.to_numpy(dtype="datetime64[ns]").view(np.int64)
+                    arrays[f"{prefix}_values"] = value.to_numpy(dtype=np.float64)
+                else:
+                    arrays[f"{prefix}_blob"] = np.frombuffer(value, dtype=np.uint8)
+                entries.append(entry)
+
+            stream_manifest = {}
+            for name, (meta, stream_arrays) in (streams or {}).items():
+                for field, values in stream_arrays.items():
+                    arrays[f"s_{name}_{field}"] = values
+                stream_manifest[name] = {"meta": meta, "arrays": list(stream_arrays)}
+
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "created_at": time.time(),
+                "strategies": strategies,
+                "entries": entries,
+                "last_signals": [[list(key), signal] for key, signal in merged.items()],
+                "streams": stream_manifest
+            }
+            arrays["manifest"] = np.frombuffer(json.dumps(manifest).encode(), dtype=np.uint8)
+
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temp_path, self.path)
+            self.last_saved_at = manifest["created_at"]
+            logger.info(f"Saved warm-state snapshot: {len(entries)} cache entries, {len(merged)} last signals")
+            return True
+
+    def _merge_signals(self, last_signals: LastSignals) -> LastSignals:
+        """Keep the newest signal per key; symbols nobody asked about for max_age drop out"""
+        for key, signal in last_signals.items():
+            if key not in self._signals or self._signals[key].get("timestamp", "") <= signal.get("timestamp", ""):
+                self._signals[key] = signal
+        self._signals = {key: signal for key, signal in self._signals.items() if self._is_recent(signal)}
+        return self._signals
+
+    def _is_recent(self, signal: dict) -> bool:
+        try:
+            generated_at = datetime.fromisoformat(signal.get("timestamp", "")).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return time.time() - generated_at <= self.max_age
+
+    # -- loading -------------------------------------------------------------
+
+    def load(self, strategies: Dict[str, dict], quiet: bool = False) -> Optional[WarmState]:
+        """Read and validate the snapshot; None if missing, stale or incompatible"""
+        def discard(reason: str):
+            if not quiet:
+                logger.warning(f"Discarding warm-state snapshot {self.path}: {reason}")
+            return None
+
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                manifest = json.loads(data["manifest"].tobytes())
+                if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+                    return discard(f"incompatible version {manifest.get('version')}")
+                age = time.time() - manifest["created_at"]
+                if age > self.max_age or age < -60:
+                    return discard(f"snapshot is {age:.0f}s old")
+
+                # Signals are only valid for the strategy config that produced them
+                saved = manifest.get("strategies", {})
+                valid = {name for name, info in strategies.items()
+                         if saved.get(name, {}).get("fingerprint") == info["fingerprint"]}
+
+                frames, blobs = [], []
+                for i, entry in enumerate(manifest["entries"]):
+                    key = tuple(entry["key"])
+                    if key and key[0] == "signal" and (len(key) < 2 or key[1] not in valid):
+                        continue
+                    prefix = f"e{i}"
+                    if entry["kind"] == "blob":
+                        blobs.append((key, entry["created_at"], data[f"{prefix}_blob"].tobytes()))
+                        continue
+                    values = data[f"{prefix}_values"]
+                    index = data[f"{prefix}_index"]
+                    if values.ndim != 2 or values.shape != (len(index), len(entry["columns"])):
+                        continue
+                    timestamps = pd.DatetimeIndex(index.view("datetime64[ns]"))
+                    if entry.get("tz"):
+                        timestamps = timestamps.tz_localize("UTC").tz_convert(entry["tz"])
+                    frames.append((key, entry["created_at"],
+                                   pd.DataFrame(values, columns=entry["columns"], index=timestamps)))
+
+                last_signals = {tuple(key): signal for key, signal in manifest.get("last_signals", [])
+                                if key[0] in valid and self._is_recent(signal)}
+                streams = {name: (info["meta"], {field: data[f"s_{name}_{field}"] for field in info["arrays"]})
+                           for name, info in manifest.get("streams", {}).items()}
+        except (OSError, ValueError, KeyError, TypeError, zipfile.BadZipFile) as e:
+            return discard(f"unreadable ({e})")
+
+        return WarmState(manifest["created_at"], frames, blobs, last_signals, streams)
+
+    def restore(self, cache: Optional[SharedCache], strategies: Dict[str, dict]) -> Tuple[Optional[WarmState], List[tuple]]:
+        """
+        Load the snapshot and copy its entries into the shared cache. Entries
+        past the cache TTL keep their fetch time, so they stay expired; their
+        keys are returned so the caller can revalidate them.
+        """
+        started = time.perf_counter()
+        with self._exclusive(blocking=True):
+            state = self.load(strategies)
+            if state is None:
+                return None, []
+
+            restored, stale = 0, []
+            now = time.time()
+            if cache is not None:
+                for key, created_at, df in state.frames:
+                    # Another worker restored it already, or it was fetched since
+                    if cache.contains(key):
+                        continue
+                    if now - created_at > cache.ttl:
+                        # Only per-symbol bars (symbol, period, interval) can be refetched
+                        if len(key) != 3 or key[0] == "closes":
+                            continue
+                        stale.append(key)
+                    cache.put_frame(key, df, created_at)
+                    restored += 1
+                for key, created_at, data in state.blobs:
+                    if cache.contains(key):
+                        continue
+                    # Signals are keyed by the bars they were computed from, so never go stale
+                    if key and key[0] == "signal":
+                        created_at = now
+                    cache.put_blob(key, data, created_at)
+                    restored += 1
+            self._merge_signals(state.last_signals)
+
+        self.last_restore = {
+            "snapshot_age_seconds": round(now - state.created_at, 1),
+            "restored_entries": restored,
+            "stale_bars": len(stale),
+            "last_signals": len(state.last_signals),
+            "streams": sorted(state.streams),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        logger.info(f"Restored warm state: {self.last_restore}")
+        return state, stale
+
+    # -- periodic snapshots -------------------------------------------------------
+
+    def start(self, capture: Callable[[bool], bool]):
+        """Call capture(force=False) every interval on a daemon thread"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.interval):
+                try:
+                    capture(False)
+                except Exception as e:
+                    logger.error(f"Warm-state snapshot failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="warm-state-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        return {
+            "path": self.path,
+            "interval_seconds": self.interval,
+            "last_saved_at": self.last_saved_at,
+            "last_restore": self.last_restore
+        }